@@ -1,8 +1,17 @@
 import streamlit as st
 import json
 import os
-import requests
+import time
+from app.utils.request_scheduler import request_priority, PRIORITY_INTERACTIVE
 from app.utils.bitrix_api import load_connection_config, save_connection_config, is_streamlit_cloud, extract_biconnector_info, extract_rest_info
+from app.utils.bitrix_api import check_connection, get_connection_history, get_connection_breaker
+from app.utils.bitrix_api import peek_deal_snapshot, deal_snapshot_key
+from app.utils.warmup import start_warmup, WARMUP_COLUMNS
+from app.utils.kpis import get_kpis
+from app.utils.deal_events import start_event_receiver
+from app.components.warmup_status import show_warmup_status
+from app.components.connection_status import show_connection_status
+from app.components.metrics import MetricsDisplay
 
 # Configuração da página
 st.set_page_config(
@@ -129,27 +138,16 @@ if not config:
             
             if account_name and token:
                 if save_connection_config(account_name, token, api_type_value):
-                    # Testar conexão antes de prosseguir
-                    try:
-                        test_url = ""
-                        if api_type_value == "rest":
-                            test_url = f"https://{account_name}.bitrix24.com.br/rest/{token}/profile"
-                        else:
-                            test_url = f"https://{account_name}.bitrix24.com.br/bitrix/tools/biconnector/pbi.php?token={token}&table=b_user"
-                        
-                        response = requests.get(test_url)
-                        if response.status_code == 200:
-                            st.success("Conexão testada com sucesso!")
-                            st.success("Configuração salva!")
-                            st.rerun()
-                        else:
-                            st.error(f"Erro ao testar conexão (HTTP {response.status_code}). Verifique suas credenciais.")
-                            if response.text:
-                                st.error(response.text[:200] + '...' if len(response.text) > 200 else response.text)
-                    except Exception as e:
-                        st.error(f"Erro ao testar conexão: {str(e)}")
-                        st.warning("Configuração salva, mas a conexão não pôde ser testada.")
+                    # Testar conexão antes de prosseguir (sem baixar tabelas)
+                    # Ação do usuário: passa à frente das cargas em andamento
+                    with request_priority(PRIORITY_INTERACTIVE):
+                        health = check_connection(st.session_state.bitrix_config, force=True)
+                    if health.ok:
+                        st.success("Conexão testada com sucesso!")
+                        st.success("Configuração salva!")
                         st.rerun()
+                    else:
+                        st.error(f"Erro ao testar conexão: {health.message}. Verifique suas credenciais.")
             else:
                 st.error("Preencha todos os campos para salvar a configuração.")
 else:
@@ -168,31 +166,37 @@ else:
     st.sidebar.write(f"**Conta conectada:** {config['account_name']}")
     st.sidebar.write(f"**Tipo de API:** {api_type_label}")
     
+    # Configuração lida do arquivo guarda só conta e tipo de API (sem o token
+    # não há URLs): nesse caso nada é carregado do Bitrix24
+    has_urls = "urls" in config
+    
+    # Pré-carregar os negócios em segundo plano, para que as páginas de
+    # dados já encontrem o snapshot em memória
+    show_warmup_status(start_warmup(config) if has_urls else None)
+    
+    # Receptor de eventos de saída do Bitrix24 (ativo com BITRIX_EVENTS_PORT e BITRIX_EVENTS_TOKEN):
+    # negócios alterados no portal são aplicados ao snapshot sem novo download
+    event_receiver = start_event_receiver(config) if has_urls else None
+    if event_receiver is not None:
+        st.sidebar.caption(f"Eventos do Bitrix24: {event_receiver.batcher_for(config).stats['events']} recebidos")
+    
     # Opção para testar conexão
-    if st.sidebar.button("Testar Conexão"):
+    test_clicked = st.sidebar.button("Testar Conexão")
+    if test_clicked:
         st.write("Testando conexão...")
-        try:
-            test_url = ""
-            if api_type == "rest":
-                # Usar token da configuração
-                token = config.get("token", "")
-                test_url = f"https://{config['account_name']}.bitrix24.com.br/rest/{token}/profile"
-            else:
-                # Para BI Connector, criar URL de teste
-                token = config.get("token", "")
-                test_url = f"https://{config['account_name']}.bitrix24.com.br/bitrix/tools/biconnector/pbi.php?token={token}&table=b_user"
-                
-            response = requests.get(test_url)
-            if response.status_code == 200:
-                st.success("Conexão testada com sucesso!")
-                st.write("Resposta:")
-                st.json(response.json() if response.text else {})
-            else:
-                st.error(f"Erro ao testar conexão (HTTP {response.status_code}).")
-                if response.text:
-                    st.error(response.text[:200] + '...' if len(response.text) > 200 else response.text)
-        except Exception as e:
-            st.error(f"Erro ao testar conexão: {str(e)}")
+        # Ação do usuário: passa à frente das cargas em andamento
+        with request_priority(PRIORITY_INTERACTIVE):
+            health = check_connection(config, force=True)
+        if health.ok:
+            st.success(f"Conexão testada com sucesso! ({health.latency * 1000:.0f} ms)")
+            st.caption(health.message)
+        else:
+            st.error(f"Erro ao testar conexão: {health.message}")
+    
+    # Estado da conexão: teste leve reaproveitado por alguns segundos e,
+    # depois disso, refeito em segundo plano sem atrasar a página
+    show_connection_status(check_connection(config, wait=False), get_connection_history(config),
+                           get_connection_breaker(config))
     
     # Opção para limpar configuração
     if st.sidebar.button("Limpar Configuração"):
@@ -213,16 +217,17 @@ else:
     # Mostrar gráficos ou estatísticas gerais
     st.write("### Estatísticas Gerais")
     
-    # Aqui você pode adicionar widgets, gráficos e dados
-    # que serão exibidos na página principal
-    
-    col1, col2, col3 = st.columns(3)
-    
-    with col1:
-        st.metric("Total de Leads", "250", "+12%")
-    
-    with col2:
-        st.metric("Processos Ativos", "145", "-5%")
-    
-    with col3:
-        st.metric("Conversão", "58%", "+2%") 
\ No newline at end of file
+    # Indicadores do snapshot do pré-carregamento (memória ou disco): a
+    # página inicial não dispara uma carga própria no Bitrix24
+    snapshot = peek_deal_snapshot(config, WARMUP_COLUMNS) if has_urls else None
+    if snapshot is None:
+        st.info("Os indicadores aparecem assim que os negócios forem carregados.")
+    else:
+        kpis, previous = get_kpis(snapshot, deal_snapshot_key(config, WARMUP_COLUMNS))
+        MetricsDisplay.kpi_metrics(kpis, previous[1] if previous else None)
+        
+        updated = time.strftime("%d/%m/%Y %H:%M", time.localtime(snapshot.loaded_at))
+        if previous:
+            st.caption(f"Dados de {updated}; variação em relação a {previous[0]:%d/%m/%Y}.")
+        else:
+            st.caption(f"Dados de {updated}; a variação aparece a partir do próximo dia registrado.")
@@ -0,0 +1,27 @@
+import statistics
+import streamlit as st
+from app.utils.circuit_breaker import OPEN
+
+def show_connection_status(health, history=(), breaker=None):
+    """
+    Exibe na barra lateral o resultado do último teste de conexão
+
+    Args:
+        health (ConnectionHealth): Último teste (None se ainda não houve)
+        history (list): Testes anteriores da conta, para a latência típica
+        breaker (dict): Estado do disjuntor do portal (CircuitBreaker.stats)
+    """
+    if breaker is not None and breaker["state"] == OPEN:
+        st.sidebar.warning(f"Bitrix24 fora do ar: requisições suspensas por "
+                           f"{breaker['retry_in']:.0f}s após falhas seguidas.")
+
+    if health is None:
+        return
+
+    if health.ok:
+        latencies = [item.latency for item in history if item.ok]
+        typical = f", mediana {statistics.median(latencies) * 1000:.0f} ms" if len(latencies) > 1 else ""
+        st.sidebar.caption(f"Conexão: ok em {health.latency * 1000:.0f} ms{typical} "
+                           f"(testada há {health.age:.0f}s)")
+    else:
+        st.sidebar.caption(f"Conexão: falhou há {health.age:.0f}s ({health.message})")
@@ -0,0 +1,154 @@
+import math
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import streamlit as st
+from app.utils.query_cache import QueryCache, cached_query
+from app.utils.portal_registry import add_snapshot_listener
+from app.utils.perf import span
+
+# Linhas exibidas por página
+DEFAULT_PAGE_SIZE = 100
+PAGE_SIZE_OPTIONS = [50, 100, 250, 500]
+
+# Rótulos da ordenação
+ASCENDING_LABEL = "Crescente"
+DESCENDING_LABEL = "Decrescente"
+
+# Ordens de linhas e páginas guardadas (cada ordem tem uma posição por linha
+# filtrada, então o limite é bem menor que o do cache de agregados)
+TABLE_CACHE_ENTRIES = 32
+
+# Cache próprio das tabelas, para não ocupar o cache compartilhado de agregados
+table_cache = QueryCache(max_entries=TABLE_CACHE_ENTRIES)
+add_snapshot_listener(lambda portal, key, old, new: table_cache.drop_version(old.version))
+
+def show_data_table(data, key, columns=None, column_labels=None, cache_key=None,
+                    search_columns=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Exibe uma tabela paginada, com busca e ordenação feitas no servidor
+
+    Apenas a página visível é convertida para Arrow e enviada ao navegador,
+    então o tempo de exibição não depende do número de linhas filtradas.
+    A ordem das linhas (busca + ordenação) e cada página já convertida ficam
+    em um cache pequeno e próprio das tabelas, pela chave do snapshot e dos
+    filtros.
+
+    Args:
+        data (pd.DataFrame): Linhas filtradas (não é alterado)
+        key (str): Prefixo das chaves dos controles e do cache (único por tabela)
+        columns (list): Colunas exibidas (None para todas)
+        column_labels (dict): Nome de exibição de cada coluna
+        cache_key (tuple): Chave de query_key (None para sempre calcular)
+        search_columns (list): Colunas usadas pela busca (None para as exibidas,
+            exceto datas)
+        page_size (int): Linhas por página inicial
+
+    Returns:
+        int: Número de linhas que atendem à busca
+    """
+    columns = [column for column in (columns or list(data.columns)) if column in data.columns]
+    column_labels = column_labels or {}
+    if search_columns is None:
+        search_columns = [column for column in columns
+                          if not pd.api.types.is_datetime64_any_dtype(data[column].dtype)]
+    search_columns = [column for column in search_columns if column in data.columns]
+
+    search_col, sort_col, order_col, size_col = st.columns([3, 2, 1, 1])
+    with search_col:
+        search = st.text_input("Buscar", key=f"{key}_busca").strip()
+    with sort_col:
+        sort_column = st.selectbox(
+            "Ordenar por",
+            options=[None] + columns,
+            format_func=lambda column: "—" if column is None else column_labels.get(column, column),
+            key=f"{key}_ordem_coluna"
+        )
+    with order_col:
+        ascending = st.selectbox("Ordem", [ASCENDING_LABEL, DESCENDING_LABEL], key=f"{key}_ordem") == ASCENDING_LABEL
+    with size_col:
+        page_size = st.selectbox(
+            "Linhas",
+            options=PAGE_SIZE_OPTIONS,
+            index=PAGE_SIZE_OPTIONS.index(page_size) if page_size in PAGE_SIZE_OPTIONS else 0,
+            key=f"{key}_tamanho"
+        )
+
+    # Posições das linhas na ordem de exibição, uma vez por (snapshot, filtros, busca, ordem)
+    order_name = f"table:{key}:{search}:{sort_column}:{ascending}"
+    with span("filter") as info:
+        positions = cached_query(cache_key, order_name,
+                                 lambda: _row_order(data, search, search_columns, sort_column, ascending),
+                                 cache=table_cache)
+        info["rows"] = len(positions)
+
+    total = len(positions)
+    pages = max(1, math.ceil(total / page_size))
+
+    # Uma busca ou filtro mais restritivo pode deixar a página atual fora do intervalo
+    page_key = f"{key}_pagina"
+    if st.session_state.get(page_key, 1) > pages:
+        st.session_state[page_key] = pages
+    page = st.number_input("Página", min_value=1, max_value=pages, step=1, key=page_key)
+
+    start = (page - 1) * page_size
+    window = positions[start:start + page_size]
+    with span("render", rows=len(window)):
+        chunk = cached_query(cache_key, f"{order_name}:{page_size}:{page}",
+                             lambda: _to_arrow(data, window, columns, column_labels), cache=table_cache)
+        st.dataframe(chunk, use_container_width=True, hide_index=True)
+
+    if total:
+        st.caption(f"Linhas {start + 1}–{start + len(window)} de {total} (página {page} de {pages})")
+    else:
+        st.caption("Nenhuma linha encontrada.")
+    return total
+
+def _row_order(data, search, search_columns, sort_column, ascending):
+    """
+    Posições (iloc) das linhas que atendem à busca, na ordem pedida
+
+    Args:
+        data (pd.DataFrame): Linhas filtradas
+        search (str): Texto procurado, sem diferenciar maiúsculas ("" para todas)
+        search_columns (list): Colunas em que o texto é procurado
+        sort_column (str): Coluna de ordenação (None para a ordem original)
+        ascending (bool): Ordem crescente
+
+    Returns:
+        numpy.ndarray: Posições das linhas
+    """
+    positions = np.arange(len(data))
+    if search and search_columns:
+        mask = np.zeros(len(data), dtype=bool)
+        for column in search_columns:
+            mask |= _contains(data[column], search)
+        positions = positions[mask]
+
+    if sort_column is not None:
+        values = data[sort_column].iloc[positions].reset_index(drop=True)
+        order = values.sort_values(ascending=ascending, kind="stable", na_position="last").index.to_numpy()
+        positions = positions[order]
+    return positions
+
+def _contains(values, search):
+    """
+    Máscara das linhas cujo texto contém a busca
+
+    Em colunas categóricas a busca é feita nas categorias e projetada pelos
+    códigos, sem converter cada linha para texto.
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        categories = values.cat.categories.astype("string")
+        matches = categories.str.contains(search, case=False, regex=False).fillna(False).to_numpy(dtype=bool)
+        codes = values.cat.codes.to_numpy()
+        return np.append(matches, False)[codes]
+    text = values.astype("string")
+    return text.str.contains(search, case=False, regex=False).fillna(False).to_numpy(dtype=bool)
+
+def _to_arrow(data, positions, columns, column_labels):
+    """
+    Converte as linhas de uma página em uma tabela Arrow pronta para exibição
+    """
+    page = data.iloc[positions][columns].rename(columns=column_labels)
+    return pa.Table.from_pandas(page, preserve_index=False)
@@ -1,5 +1,8 @@
 import streamlit as st
 import pandas as pd
+from app.utils.pendencias import pendencia_mask
+from app.utils.query_cache import cached_query
+from app.utils.kpis import conversion_rate
 
 class MetricsDisplay:
     """
@@ -25,7 +28,41 @@ class MetricsDisplay:
                 st.metric(title, value, delta)
     
     @staticmethod
-    def pendencias_metrics(data, pendencias_field, data_field):
+    def kpi_metrics(current, previous=None):
+        """
+        Exibe os indicadores gerais com a variação em relação ao período anterior
+        
+        Args:
+            current (dict): Agregados atuais (kpis.compute_kpis)
+            previous (dict): Agregados do período anterior (None sem histórico)
+        """
+        conversion = conversion_rate(current)
+        previous_conversion = conversion_rate(previous) if previous else None
+        
+        conversion_delta = None
+        if conversion is not None and previous_conversion is not None:
+            conversion_delta = f"{conversion - previous_conversion:+.1f} p.p."
+        
+        metrics_data = [
+            ("Total de Leads", current["total"],
+             MetricsDisplay._percent_change(current["total"], previous and previous["total"])),
+            ("Processos Ativos", current["active"],
+             MetricsDisplay._percent_change(current["active"], previous and previous["active"])),
+            ("Conversão", f"{conversion:.0f}%" if conversion is not None else "—", conversion_delta),
+        ]
+        MetricsDisplay.show_metrics_grid(metrics_data, num_columns=3)
+    
+    @staticmethod
+    def _percent_change(value, previous):
+        """
+        Variação percentual formatada para st.metric (None sem base de comparação)
+        """
+        if not previous:
+            return None
+        return f"{(value - previous) / previous * 100:+.1f}%"
+    
+    @staticmethod
+    def pendencias_metrics(data, pendencias_field, data_field, cache_key=None):
         """
         Exibe métricas específicas para pendências
         
@@ -33,11 +70,30 @@ class MetricsDisplay:
             data (pd.DataFrame): DataFrame com os dados
             pendencias_field (str): Nome do campo de pendências
             data_field (str): Nome do campo de data
+            cache_key (tuple): Chave de query_key para reaproveitar o cálculo
+                entre reruns (None para sempre calcular)
+        """
+        metrics_data = cached_query(
+            cache_key,
+            f"pendencias_metrics:{pendencias_field}:{data_field}",
+            lambda: MetricsDisplay._compute_pendencias_metrics(data, pendencias_field, data_field)
+        )
+        
+        # Exibir métricas
+        MetricsDisplay.show_metrics_grid(metrics_data)
+    
+    @staticmethod
+    def _compute_pendencias_metrics(data, pendencias_field, data_field):
+        """
+        Calcula as métricas de pendências exibidas por pendencias_metrics
+        
+        Returns:
+            list: Lista de tuplas (título, valor, delta)
         """
         # Calcular métricas
         total_registros = len(data)
-        pendencias_count = data[pendencias_field].notna().sum()
-        data_count = data[data_field].notna().sum()
+        pendencias_count = int(pendencia_mask(data, pendencias_field).sum())
+        data_count = int(data[data_field].notna().sum())
         
         if total_registros > 0:
             pendencias_percent = (pendencias_count / total_registros) * 100
@@ -47,18 +103,15 @@ class MetricsDisplay:
             data_percent = 0
         
         # Preparar dados das métricas
-        metrics_data = [
+        return [
             ("Total de Registros", total_registros, None),
             ("Registros com Pendências", pendencias_count, f"{pendencias_percent:.1f}%"),
             ("Registros com Data Marcada", data_count, f"{data_percent:.1f}%"),
             ("Percentual com Pendências", f"{pendencias_percent:.1f}%", None)
         ]
         
-        # Exibir métricas
-        MetricsDisplay.show_metrics_grid(metrics_data)
-        
     @staticmethod
-    def status_distribution(data, field_name, title="Distribuição por Status"):
+    def status_distribution(data, field_name, title="Distribuição por Status", cache_key=None):
         """
         Exibe um gráfico de barras com a distribuição de status
         
@@ -66,10 +119,27 @@ class MetricsDisplay:
             data (pd.DataFrame): DataFrame com os dados
             field_name (str): Nome do campo para contagem
             title (str): Título do gráfico
+            cache_key (tuple): Chave de query_key para reaproveitar o cálculo
+                entre reruns (None para sempre calcular)
         """
         st.subheader(title)
         
         if field_name in data.columns:
-            status_counts = data[field_name].value_counts().reset_index()
-            status_counts.columns = ['Status', 'Quantidade']
-            st.bar_chart(status_counts.set_index('Status')) 
\ No newline at end of file
+            status_counts = cached_query(
+                cache_key,
+                f"status_distribution:{field_name}",
+                lambda: MetricsDisplay._compute_status_counts(data, field_name)
+            )
+            st.bar_chart(status_counts)
+    
+    @staticmethod
+    def _compute_status_counts(data, field_name):
+        """
+        Conta os registros por valor do campo, no formato do gráfico
+        
+        Returns:
+            pd.DataFrame: Quantidade por Status (índice)
+        """
+        status_counts = data[field_name].value_counts().reset_index()
+        status_counts.columns = ['Status', 'Quantidade']
+        return status_counts.set_index('Status')
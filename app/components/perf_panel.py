@@ -0,0 +1,61 @@
+import streamlit as st
+import pandas as pd
+from app.utils.perf import rolling_stats
+
+def show_perf_panel(trace, portal=None):
+    """
+    Exibe na barra lateral o tempo de cada etapa do último rerun e as
+    estatísticas móveis do processo
+
+    Args:
+        trace (Trace): Medições do rerun (de finish_trace)
+        portal (Portal): Portal da conexão da sessão; os demais portais do
+            processo não são exibidos (None para nenhum)
+    """
+    if trace is None:
+        return
+
+    st.sidebar.markdown("### Desempenho")
+    st.sidebar.caption(f"Rerun: {trace.elapsed * 1000:.0f} ms")
+
+    breakdown = trace.breakdown()
+    if breakdown:
+        st.sidebar.dataframe(pd.DataFrame([{
+            "Etapa": entry["stage"],
+            "Chamadas": entry["calls"],
+            "Tempo (ms)": round(entry["self_seconds"] * 1000, 1),
+            "Linhas": entry["rows"],
+            "KB": round(entry["bytes"] / 1024, 1),
+        } for entry in breakdown]), hide_index=True, use_container_width=True)
+
+    stats = rolling_stats()
+    if stats:
+        with st.sidebar.expander("Estatísticas móveis (todas as sessões)"):
+            st.dataframe(pd.DataFrame([{
+                "Etapa": stage,
+                "Medições": values["count"],
+                "p50 (ms)": round(values["p50"] * 1000, 1),
+                "p95 (ms)": round(values["p95"] * 1000, 1),
+                "Máx. (ms)": round(values["max"] * 1000, 1),
+            } for stage, values in stats.items()]), hide_index=True, use_container_width=True)
+
+    # Memória e fila de requisições do portal da sessão, por prioridade
+    if portal is not None:
+        with st.sidebar.expander("Portal Bitrix24 (memória e fila de requisições)"):
+            portal_stats = portal.stats()
+            memory = portal_stats["memory"]
+            budget = "sem limite" if memory["max_bytes"] is None else f"{memory['max_bytes'] / 2**20:.0f} MB"
+            st.caption(f"{portal.host} ({portal.api_type}): {memory['snapshots']} snapshots, "
+                       f"{memory['bytes'] / 2**20:.1f} MB de {budget}, {memory['evictions']} descartes")
+            values = portal_stats["scheduler"]
+            rate = "sem limite" if values["rate"] is None else f"{values['rate']:.2f}/s"
+            st.caption(f"Taxa {rate}, {values['tokens']:.0f} fichas, "
+                       f"{values['limited']} erros de limite")
+            st.dataframe(pd.DataFrame([{
+                "Prioridade": lane,
+                "Na fila": lane_values["waiting"],
+                "Requisições": lane_values["requests"],
+                "Espera média (ms)": round(lane_values["wait_mean"] * 1000, 1),
+                "Espera p95 (ms)": round(lane_values["wait_p95"] * 1000, 1),
+                "Espera máx. (ms)": round(lane_values["wait_max"] * 1000, 1),
+            } for lane, lane_values in values["lanes"].items()]), hide_index=True, use_container_width=True)
@@ -0,0 +1,21 @@
+import streamlit as st
+
+def show_snapshot_status(snapshot):
+    """
+    Exibe na barra lateral a versão e a idade do snapshot de dados
+    
+    Args:
+        snapshot (Snapshot): Snapshot em exibição
+    """
+    if snapshot is None:
+        return
+    
+    minutes = int(snapshot.age // 60)
+    if minutes < 1:
+        age_label = "menos de 1 minuto"
+    elif minutes == 1:
+        age_label = "1 minuto"
+    else:
+        age_label = f"{minutes} minutos"
+    
+    st.sidebar.caption(f"Dados atualizados há {age_label} (versão {snapshot.version})")
@@ -0,0 +1,44 @@
+import streamlit as st
+
+# Intervalo (segundos) entre atualizações do andamento do pré-carregamento
+WARMUP_POLL_INTERVAL = 1.0
+
+def show_warmup_status(warmup):
+    """
+    Exibe na barra lateral o andamento do pré-carregamento dos negócios
+
+    Enquanto ele estiver em andamento, apenas a barra de progresso é
+    atualizada (a cada WARMUP_POLL_INTERVAL segundos); a página inteira é
+    refeita uma única vez, ao terminar, para exibir os dados carregados.
+
+    Args:
+        warmup (Warmup): Estado do pré-carregamento
+
+    Returns:
+        bool: True enquanto o pré-carregamento estiver em andamento
+    """
+    if warmup is None:
+        return False
+
+    if warmup.running:
+        # Fragmentos não escrevem na barra lateral de fora: ele é aberto dentro dela
+        with st.sidebar:
+            _warmup_progress(warmup)
+        return True
+
+    if warmup.error is not None:
+        st.sidebar.warning(f"Não foi possível pré-carregar os dados: {warmup.error}")
+    elif warmup.snapshot is not None:
+        st.sidebar.caption(f"{warmup.label}: {len(warmup.snapshot.data)} negócios em memória "
+                           f"(versão {warmup.snapshot.version})")
+    return False
+
+@st.fragment(run_every=WARMUP_POLL_INTERVAL)
+def _warmup_progress(warmup):
+    """
+    Barra de progresso do pré-carregamento, atualizada sem refazer a página
+    """
+    if warmup.running:
+        st.progress(warmup.progress, text=f"{warmup.label}... ({warmup.elapsed:.0f}s)")
+    else:
+        st.rerun()
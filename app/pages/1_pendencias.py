@@ -7,8 +7,15 @@ import os
 
 # Adiciona o diretório principal ao path para importação
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
-from app.utils.bitrix_api import get_bitrix_data, load_connection_config
+from app.utils.bitrix_api import get_deal_slice, get_deal_filter_options, load_connection_config, account_portal
+from app.utils.pendencias import pendencia_mask
+from app.utils.filter_index import get_filter_index, ALL_OPTION
+from app.utils.query_cache import query_key, cached_query
 from app.components.metrics import MetricsDisplay
+from app.components.snapshot_status import show_snapshot_status
+from app.components.data_table import show_data_table
+from app.components.perf_panel import show_perf_panel
+from app.utils.perf import start_trace, finish_trace, span
 
 # Configuração da página
 st.set_page_config(
@@ -17,90 +24,97 @@ st.set_page_config(
     layout="wide",
 )
 
+# Medição das etapas deste rerun (exibida no modo de depuração)
+start_trace("app_pendencias")
+
 # Título da página
 st.title("Pendências")
 st.write("Visualização de pendências e datas marcadas do Bitrix24")
 
+# Colunas usadas pela página (projeção enviada à API)
+DEAL_COLUMNS = ['ID', 'TITLE', 'CATEGORY_ID', 'STAGE_ID']
+PENDENCIAS_COLUMNS = ['UF_CRM_PENDENCIAS', 'UF_CRM_DATA_MARCADA']
+
+# Chaves dos filtros na sessão; o valor escolhido já está lá no início do
+# rerun, antes de os dados serem carregados
+CATEGORY_KEY = "app_pendencias_categoria"
+STAGE_KEY = "app_pendencias_estagio"
+
 # Função para carregar os dados
-@st.cache_data(ttl=3600)  # Cache por 1 hora
-def load_data():
+def load_data(selected_category, selected_stage):
     try:
         # Verifica se há configuração de conexão
         config = load_connection_config()
         
         if not config or "urls" not in config:
             st.error("Configuração de conexão não encontrada. Configure a conexão na página principal.")
-            return pd.DataFrame()
-        
-        # Carrega os dados do CRM Deal
-        crm_deal_url = config["urls"]["crm_deal"]
-        crm_deal_data = get_bitrix_data(crm_deal_url)
+            return None, {}
         
-        # Carrega os dados do CRM Deal UF
-        crm_deal_uf_url = config["urls"]["crm_deal_uf"]
-        crm_deal_uf_data = get_bitrix_data(crm_deal_uf_url)
-        
-        # Filtra apenas os campos necessários do CRM Deal UF
-        crm_deal_uf_filtered = crm_deal_uf_data[['DEAL_ID', 'UF_CRM_PENDENCIAS', 'UF_CRM_DATA_MARCADA']]
-        
-        # Merge dos dados com base no ID e DEAL_ID
-        merged_data = pd.merge(
-            crm_deal_data, 
-            crm_deal_uf_filtered,
-            left_on='ID',
-            right_on='DEAL_ID',
-            how='inner'
-        )
-        
-        return merged_data
+        # Snapshot compartilhado entre sessões; se estiver vencido, é
+        # devolvido na hora e atualizado em segundo plano. Com um funil
+        # selecionado, só ele é buscado no Bitrix24
+        columns = DEAL_COLUMNS + PENDENCIAS_COLUMNS
+        snapshot = get_deal_slice(config, columns, selected_category, selected_stage)
+        return snapshot, get_deal_filter_options(config, columns)
     except Exception as e:
         st.error(f"Erro ao carregar dados: {str(e)}")
-        return pd.DataFrame()
+        return None, {}
 
-# Carregar os dados
-data = load_data()
+# Carregar os dados do funil/estágio selecionado
+selected_category = st.session_state.get(CATEGORY_KEY, ALL_OPTION)
+selected_stage = st.session_state.get(STAGE_KEY, ALL_OPTION) if selected_category == 2 else ALL_OPTION
+snapshot, filter_options = load_data(selected_category, selected_stage)
+data = snapshot.data if snapshot is not None else pd.DataFrame()
 
-if not data.empty:
+# Um funil/estágio sem negócios ainda mostra os filtros, para trocar a seleção
+if not data.empty or (snapshot is not None and selected_category != ALL_OPTION):
+    show_snapshot_status(snapshot)
+    
     # Sidebar com filtros
     st.sidebar.header("Filtros")
     
     # Filtro de categoria
+    # Opções de todos os funis, mesmo quando o snapshot traz só o selecionado
     category_options = ["Todos"]
-    if 'CATEGORY_ID' in data.columns:
-        category_options.extend(data['CATEGORY_ID'].unique().tolist())
+    category_options.extend(filter_options)
     
     selected_category = st.sidebar.selectbox(
         "Categoria",
         options=category_options,
-        format_func=lambda x: "COMERCIAL" if x == 0 else "TRÂMITES ADMINISTRATIVO" if x == 2 else str(x)
+        format_func=lambda x: "COMERCIAL" if x == 0 else "TRÂMITES ADMINISTRATIVO" if x == 2 else str(x),
+        key=CATEGORY_KEY
     )
     
     # Filtro de estágio para Category_id = 2
     if selected_category == 2:
         stage_options = ["Todos"]
-        if 'STAGE_ID' in data.columns:
-            stage_options.extend(data[data['CATEGORY_ID'] == 2]['STAGE_ID'].unique().tolist())
+        stage_options.extend(filter_options.get(2, []))
         
         selected_stage = st.sidebar.selectbox(
             "Estágio",
             options=stage_options,
-            format_func=lambda x: "PENDENTE DOCUMENTOS" if x == "C2:PREPARATION" else str(x)
+            format_func=lambda x: "PENDENTE DOCUMENTOS" if x == "C2:PREPARATION" else str(x),
+            key=STAGE_KEY
         )
     else:
         selected_stage = "Todos"
     
-    # Aplicar filtros
-    filtered_data = data.copy()
+    # Posições de cada funil/estágio, pré-calculadas por snapshot
+    with span("filter"):
+        filter_index = get_filter_index(snapshot)
     
-    if selected_category != "Todos":
-        filtered_data = filtered_data[filtered_data['CATEGORY_ID'] == selected_category]
+    # Aplicar filtros pelo índice (o snapshot é compartilhado e não é alterado)
+    with span("filter") as info:
+        filtered_data = filter_index.select(data, selected_category, selected_stage)
+        info["rows"] = len(filtered_data)
     
-    if selected_stage != "Todos" and selected_category == 2:
-        filtered_data = filtered_data[filtered_data['STAGE_ID'] == selected_stage]
+    # Agregados calculados uma vez por (versão do snapshot, filtros)
+    cache_key = query_key(snapshot, selected_category, selected_stage)
     
     # Exibir métricas usando o componente
     st.header("Métricas")
-    MetricsDisplay.pendencias_metrics(filtered_data, 'UF_CRM_PENDENCIAS', 'UF_CRM_DATA_MARCADA')
+    with span("aggregate", rows=len(filtered_data)):
+        MetricsDisplay.pendencias_metrics(filtered_data, 'UF_CRM_PENDENCIAS', 'UF_CRM_DATA_MARCADA', cache_key=cache_key)
     
     # Exibir dados filtrados
     st.header("Dados Filtrados")
@@ -109,7 +123,8 @@ if not data.empty:
     columns_to_show = ['ID', 'TITLE', 'CATEGORY_ID', 'STAGE_ID', 'UF_CRM_PENDENCIAS', 'UF_CRM_DATA_MARCADA']
     columns_to_show = [col for col in columns_to_show if col in filtered_data.columns]
     
-    st.dataframe(filtered_data[columns_to_show], use_container_width=True)
+    # Só a página visível é enviada ao navegador
+    show_data_table(filtered_data, "app_pendencias_dados", columns=columns_to_show, cache_key=cache_key)
     
     # Gráficos
     st.header("Gráficos")
@@ -119,24 +134,43 @@ if not data.empty:
     with col1:
         st.subheader("Distribuição por Categoria")
         if 'CATEGORY_ID' in filtered_data.columns:
-            category_counts = filtered_data['CATEGORY_ID'].value_counts().reset_index()
-            category_counts.columns = ['Categoria', 'Quantidade']
-            # Mapear os valores de categoria para nomes legíveis
-            category_counts['Categoria'] = category_counts['Categoria'].map({
-                0: "COMERCIAL", 
-                2: "TRÂMITES ADMINISTRATIVO"
-            })
-            st.bar_chart(category_counts.set_index('Categoria'))
+            def count_categories():
+                category_counts = filtered_data['CATEGORY_ID'].value_counts().reset_index()
+                category_counts.columns = ['Categoria', 'Quantidade']
+                # Mapear os valores de categoria para nomes legíveis
+                category_counts['Categoria'] = category_counts['Categoria'].map({
+                    0: "COMERCIAL", 
+                    2: "TRÂMITES ADMINISTRATIVO"
+                })
+                return category_counts.set_index('Categoria')
+            
+            with span("aggregate", rows=len(filtered_data)):
+                category_counts = cached_query(cache_key, "category_counts", count_categories)
+            with span("render"):
+                st.bar_chart(category_counts)
     
     with col2:
         st.subheader("Distribuição por Status de Pendência")
-        pendencias_status = pd.DataFrame({
-            'Status': ['Com Pendências', 'Sem Pendências'],
-            'Quantidade': [
-                filtered_data['UF_CRM_PENDENCIAS'].notna().sum(),
-                filtered_data['UF_CRM_PENDENCIAS'].isna().sum()
-            ]
-        })
-        st.bar_chart(pendencias_status.set_index('Status'))
+        def count_pendencias_status():
+            pendencias_count = int(pendencia_mask(filtered_data).sum())
+            pendencias_status = pd.DataFrame({
+                'Status': ['Com Pendências', 'Sem Pendências'],
+                'Quantidade': [
+                    pendencias_count,
+                    len(filtered_data) - pendencias_count
+                ]
+            })
+            return pendencias_status.set_index('Status')
+        
+        with span("aggregate", rows=len(filtered_data)):
+            pendencias_status = cached_query(cache_key, "pendencias_status", count_pendencias_status)
+        with span("render"):
+            st.bar_chart(pendencias_status)
 else:
-    st.warning("Não foi possível carregar os dados. Verifique a conexão com o Bitrix24.") 
\ No newline at end of file
+    st.warning("Não foi possível carregar os dados. Verifique a conexão com o Bitrix24.")
+
+# Tempo de cada etapa deste rerun (também gravado no log de desempenho)
+perf_trace = finish_trace()
+if st.session_state.get('debug_mode'):
+    config = load_connection_config()
+    show_perf_panel(perf_trace, account_portal(config) if config and "urls" in config else None)
@@ -1,8 +1,31 @@
-import requests
 import pandas as pd
 import streamlit as st
 import json
 import os
+import threading
+import time
+import weakref
+from collections import deque
+from urllib.parse import urlencode, urlsplit, parse_qsl
+from app.utils.fetcher import fetch_in_order, DEFAULT_MAX_WORKERS
+from app.utils.http_client import bitrix_request, bitrix_json, BitrixAPIError
+from app.utils.deal_sync import DealStore
+from app.utils.stream_parser import read_table_stream
+from app.utils.snapshot_cache import DEFAULT_SNAPSHOT_TTL
+from app.utils.singleflight import SingleFlight
+from app.utils.schema import get_deal_fields, apply_deal_schema, stream_dtypes
+from app.utils.pendencias import add_pendencia_columns
+from app.utils.deal_join import DealUfJoin
+from app.utils.snapshot_store import store_name
+from app.utils.filter_index import get_filter_index, ALL_OPTION
+from app.utils.perf import span
+from app.utils.portal_registry import get_portal, add_snapshot_listener, add_memory_reporter
+
+# Tamanho fixo das páginas retornadas pelos métodos *.list da REST API
+BITRIX_PAGE_SIZE = 50
+
+# Número máximo de comandos aceitos em uma única chamada batch
+BITRIX_BATCH_LIMIT = 50
 
 # Detectar se estamos rodando no Streamlit Cloud
 def is_streamlit_cloud():
@@ -11,33 +34,888 @@ def is_streamlit_cloud():
     except:
         return False
 
-def get_bitrix_data(url):
+def is_rest_list_url(url):
     """
-    Função para buscar dados da API do Bitrix24
+    Verifica se a URL aponta para um método *.list da REST API
     
     Args:
         url (str): URL completa para a API do Bitrix24
         
     Returns:
-        pandas.DataFrame: DataFrame com os dados retornados pela API
+        bool: True se for um método de listagem paginado
+    """
+    path = urlsplit(url).path
+    return "/rest/" in path and path.rstrip("/").endswith(".list")
+
+def _split_rest_url(url):
+    """
+    Separa uma URL REST em URL base do webhook, método e parâmetros
+    
+    Args:
+        url (str): URL completa de um método REST (ex: .../rest/TOKEN/crm.deal.list)
+        
+    Returns:
+        tuple: (base_url, method, params)
+    """
+    parts = urlsplit(url)
+    path = parts.path.rstrip("/")
+    base_path, method = path.rsplit("/", 1)
+    base_url = f"{parts.scheme}://{parts.netloc}{base_path}"
+    params = parse_qsl(parts.query, keep_blank_values=True)
+    return base_url, method, params
+
+def get_bitrix_list(url, params=None, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Busca todos os registros de um método *.list da REST API
+    
+    A primeira página informa o total de registros; as páginas restantes
+    são agrupadas em chamadas batch de até 50 comandos cada, o que traz
+    cerca de 2.500 registros por requisição HTTP. Os batches são enviados
+    em paralelo e os registros são remontados na ordem dos offsets.
+    
+    Args:
+        url (str): URL completa do método de listagem (ex: crm.deal.list)
+        params (list): Lista de tuplas com parâmetros adicionais (select, filter, order)
+        max_workers (int): Número máximo de batches simultâneos
+        
+    Returns:
+        list: Lista de registros (dicts) na ordem retornada pela API
+    """
+    base_url, method, url_params = _split_rest_url(url)
+    params = list(url_params) + list(params or [])
+    
+    # Ordenação estável por ID para que os offsets não se sobreponham
+    if not any(key.startswith("order[") for key, _ in params):
+        params.append(("order[ID]", "ASC"))
+    
+    # Primeira página: descobre o total de registros
+    payload = bitrix_json("GET", f"{base_url}/{method}", params=params + [("start", 0)])
+    
+    records = list(payload.get("result", []))
+    total = int(payload.get("total", len(records)))
+    first_next = payload.get("next")
+    if first_next is None:
+        return records
+    
+    # Demais páginas: offsets conhecidos, agrupados em comandos batch
+    offsets = list(range(int(first_next), total, BITRIX_PAGE_SIZE))
+    groups = [offsets[i:i + BITRIX_BATCH_LIMIT] for i in range(0, len(offsets), BITRIX_BATCH_LIMIT)]
+    pages = fetch_in_order(
+        lambda group: _fetch_batch_pages(base_url, method, params, group),
+        groups,
+        max_workers=max_workers
+    )
+    for page in pages:
+        records.extend(page)
+    
+    return records
+
+def _fetch_batch_pages(base_url, method, params, offsets):
+    """
+    Busca várias páginas de um método *.list em uma única chamada batch
+    
+    Args:
+        base_url (str): URL base do webhook REST
+        method (str): Nome do método (ex: crm.deal.list)
+        params (list): Parâmetros comuns a todas as páginas
+        offsets (list): Offsets (start) das páginas a buscar
+        
+    Returns:
+        list: Registros das páginas, na ordem dos offsets
+    """
+    data = [("halt", 0)]
+    for start in offsets:
+        query = urlencode(params + [("start", start)])
+        data.append((f"cmd[p{start}]", f"{method}?{query}"))
+    
+    payload = bitrix_json("POST", f"{base_url}/batch", data=data)
+    
+    batch = payload.get("result", {})
+    errors = batch.get("result_error") or {}
+    if errors:
+        first = next(iter(errors.values())) if isinstance(errors, dict) else errors[0]
+        raise BitrixAPIError(first.get("error", "BATCH_ERROR"), first.get("error_description", ""))
+    
+    results = batch.get("result") or {}
+    records = []
+    for start in offsets:
+        records.extend(results.get(f"p{start}") or [])
+    return records
+
+def select_params(columns):
+    """
+    Converte uma lista de colunas em parâmetros select[] da REST API
+    
+    Args:
+        columns (list): Colunas desejadas (ID é sempre incluído)
+        
+    Returns:
+        list: Lista de tuplas ("select[]", coluna)
+    """
+    selected = ["ID"] + [column for column in columns if column != "ID"]
+    return [("select[]", column) for column in selected]
+
+# Buscas simultâneas iguais (mesma URL, projeção e filtro) compartilham uma única requisição
+_singleflight = SingleFlight()
+
+def get_fetch_stats():
+    """
+    Retorna as métricas de deduplicação de buscas ao Bitrix24
+    
+    Returns:
+        dict: requests, executions, shared (buscas economizadas) e in_flight
+    """
+    return _singleflight.stats()
+
+def _fetch_bitrix_frame(url, columns=None, dtypes=None):
+    """
+    Baixa os dados de uma URL do Bitrix24 como DataFrame
+    
+    Chamadas simultâneas para a mesma URL e projeção recebem o resultado
+    de um único download.
+    
+    Args:
+        url (str): URL completa para a API do Bitrix24
+        columns (list): Colunas necessárias (None para todas)
+        dtypes (dict): Tipos por coluna aplicados a cada bloco de uma tabela
+            do BI Connector (de stream_dtypes)
+        
+    Returns:
+        pandas.DataFrame: Dados retornados pela API
+    """
+    key = ("frame", url, tuple(columns) if columns else None)
+    return _singleflight.do(key, lambda: _download_bitrix_frame(url, columns, dtypes))
+
+def _download_bitrix_frame(url, columns=None, dtypes=None):
+    """
+    Executa o download de fato para _fetch_bitrix_frame
+    """
+    # Métodos de listagem da REST API são paginados (50 registros por página)
+    if is_rest_list_url(url):
+        params = select_params(columns) if columns else None
+        records = get_bitrix_list(url, params=params)
+        with span("build", rows=len(records)):
+            return pd.DataFrame(records)
+    
+    # Fazer a requisição à API sem carregar o corpo inteiro na memória
+    response = bitrix_request("GET", url, stream=True)
+    
+    # Verificar se a requisição foi bem-sucedida
+    if response.status_code != 200:
+        response.close()
+        raise RuntimeError(f"Erro na requisição: {response.status_code}")
+    
+    # Converter para DataFrame à medida que os dados chegam
+    return read_table_stream(response, columns=columns, dtypes=dtypes)
+
+def _sync_deals_frame(url, columns=None, force_full=False, filters=(), transform=None):
+    """
+    Busca negócios de forma incremental, usando DATE_MODIFY como marca d'água
+    
+    Na primeira chamada todos os negócios são baixados e guardados em um
+    armazenamento local do portal; as chamadas seguintes buscam apenas
+    os negócios alterados desde a última sincronização. Para URLs que não
+    são de listagem REST (ex: BI Connector) a tabela é baixada inteira.
+    Erros são propagados para quem chamou.
+    
+    Args:
+        url (str): URL completa do método de listagem (ou tabela do BI Connector)
+        columns (list): Colunas necessárias (None para todas)
+        force_full (bool): Se True, descarta o armazenamento local e baixa tudo
+        filters (tuple): Pares (campo, valor) enviados como filter[...] na
+            REST API; o armazenamento local guarda só esse recorte
+        transform (callable): Conversão aplicada aos registros ao entrarem no
+            armazenamento local (ex: _deal_transform); só na criação dele
+        
+    Returns:
+        pandas.DataFrame: Todos os negócios (do recorte), atualizados
+    """
+    if not is_rest_list_url(url):
+        return _fetch_bitrix_frame(url, columns)
+    
+    # Armazenamentos locais de negócios: um por URL de listagem, projeção e recorte, no portal da URL
+    stores = get_portal(url).deal_stores
+    key = (url, tuple(columns) if columns else None, tuple(filters))
+    store = stores.get(key)
+    if store is None:
+        store = stores.setdefault(key, DealStore(lambda extra: _fetch_deal_records(url, extra, columns),
+                                                       scope=filters, transform=transform))
+    return _singleflight.do(("sync",) + key + (force_full,), lambda: store.sync(force_full=force_full))
+
+def _fetch_deal_records(url, extra_params, columns=None):
+    """
+    Busca registros de listagem com parâmetros extras de filtro/seleção
+    
+    Args:
+        url (str): URL completa do método de listagem
+        extra_params (list): Tuplas de parâmetros extras; um select[] extra
+            substitui a seleção da URL
+        columns (list): Colunas necessárias (None para a seleção da URL)
+        
+    Returns:
+        list: Registros retornados pela API
+    """
+    base_url, method, params = _split_rest_url(url)
+    if columns:
+        params = [(key, value) for key, value in params if key != "select[]"] + select_params(columns)
+    
+    if any(key == "select[]" for key, _ in extra_params):
+        params = [(key, value) for key, value in params if key != "select[]"]
+    elif any(key == "select[]" for key, _ in params):
+        # A marca d'água depende de DATE_MODIFY e a mesclagem, de ID
+        params = params + [("select[]", column) for column in ("ID", "DATE_MODIFY")
+                           if ("select[]", column) not in params]
+    return get_bitrix_list(f"{base_url}/{method}", params=params + list(extra_params))
+
+def account_portal(config):
+    """
+    Retorna os recursos do portal de uma conexão (cache de snapshots, pool,
+    limite de requisições, disco)
+    
+    Snapshots de negócios são compartilhados por todas as sessões do
+    processo, mas cada portal tem o seu cache e o seu orçamento de memória.
+    
+    Args:
+        config (dict): Configuração de conexão (com "urls")
+        
+    Returns:
+        Portal: Portal da URL de negócios
+    """
+    return get_portal(config["urls"]["crm_deal"])
+
+def load_deals(config, columns=None, filters=()):
+    """
+    Carrega os negócios com seus campos personalizados
+    
+    Na REST API os campos UF_* vêm no próprio crm.deal.list; no BI Connector
+    eles ficam na tabela crm_deal_uf e são unidos pelo ID do negócio.
+    Erros são propagados para quem chamou.
+    
+    Args:
+        config (dict): Configuração de conexão (com "urls")
+        columns (list): Colunas necessárias (None para todas)
+        filters (tuple): Recorte (de deal_slice_filters) aplicado no Bitrix24;
+            só é aceito na REST API
+        
+    Returns:
+        pandas.DataFrame: Negócios com os campos personalizados
+    """
+    key = ("deals",) + deal_snapshot_key(config, columns, filters)
+    return _singleflight.do(key, lambda: _load_deals(config, columns, filters))
+
+def _load_deals(config, columns=None, filters=()):
+    """
+    Executa a carga de fato para load_deals
+    """
+    urls = config["urls"]
+    fields = get_deal_fields(config)
+    if "crm_deal_uf" not in urls:
+        key = deal_snapshot_key(config, columns, filters)
+        # O armazenamento já guarda os negócios tipados: uma sincronização sem
+        # alterações devolve o mesmo DataFrame e o snapshot mantém a versão
+        deals = _sync_deals_frame(urls["crm_deal"], columns=_key_columns(key), filters=filters,
+                                  transform=_deal_transform(fields))
+        if deals.empty and filters and columns:
+            # Recorte sem negócios: as colunas continuam disponíveis para as páginas
+            deals = add_pendencia_columns(pd.DataFrame(columns=_key_columns(key)))
+        return deals
+    if filters:
+        raise ValueError("O BI Connector não aceita filtros por funil ou estágio")
+    
+    deal_columns = [c for c in columns if not c.startswith("UF_")] if columns else None
+    uf_columns = ["DEAL_ID"] + [c for c in columns if c.startswith("UF_")] if columns else None
+    
+    # Os blocos da tabela já chegam tipados; apply_deal_schema completa as categorias de inteiros
+    crm_deal_data = _fetch_bitrix_frame(urls["crm_deal"], deal_columns, stream_dtypes(fields, deal_columns))
+    crm_deal_uf_data = _fetch_bitrix_frame(urls["crm_deal_uf"], uf_columns, stream_dtypes(fields, uf_columns))
+    with span("build", rows=len(crm_deal_data) + len(crm_deal_uf_data)):
+        crm_deal_data = apply_deal_schema(crm_deal_data, fields)
+        crm_deal_uf_data = apply_deal_schema(crm_deal_uf_data, fields)
+    if crm_deal_data.empty or crm_deal_uf_data.empty:
+        return crm_deal_data
+    
+    # Junção pelo índice de DEAL_ID, com chaves Int64 dos dois lados. O BI
+    # Connector sempre entrega as tabelas inteiras, então a junção é refeita
+    # a cada carga e não fica guardada junto do snapshot
+    with span("merge") as info:
+        merged = add_pendencia_columns(DealUfJoin(deal_columns, uf_columns).build(crm_deal_data, crm_deal_uf_data))
+        info["rows"] = len(merged)
+    return merged
+
+def _deal_transform(fields):
+    """
+    Conversão dos registros de negócios para o armazenamento incremental
+    
+    Aplica o esquema de tipos e as colunas derivadas de pendências assim que
+    os registros chegam, para que o armazenamento guarde só o frame tipado.
+    
+    Args:
+        fields (dict): Tipos dos campos (de get_deal_fields)
+        
+    Returns:
+        callable: Função DataFrame -> DataFrame
+    """
+    return lambda raw: add_pendencia_columns(apply_deal_schema(raw, fields))
+
+def deal_snapshot_key(config, columns=None, filters=()):
+    """
+    Monta a chave do snapshot de negócios para uma conexão e projeção
+    
+    Args:
+        config (dict): Configuração de conexão
+        columns (list): Colunas necessárias (None para todas)
+        filters (tuple): Recorte do snapshot (vazio para a tabela completa)
+        
+    Returns:
+        tuple: Chave do snapshot
+    """
+    key = (config.get("account_name"), config.get("api_type", "rest"), tuple(columns) if columns else None)
+    return key + (tuple(filters),) if filters else key
+
+def _key_filters(key):
+    """
+    Recorte de uma chave de snapshot (vazio para a tabela completa)
+    """
+    return key[3] if len(key) > 3 else ()
+
+def _key_columns(key):
+    """
+    Colunas buscadas para um snapshot; os campos do recorte entram na seleção
+    para que a sincronização incremental saiba o que saiu dele
+    """
+    columns = list(key[2]) if key[2] else None
+    if columns:
+        columns += [field for field, _ in _key_filters(key) if field not in columns]
+    return columns
+
+def deal_slice_filters(category=ALL_OPTION, stage=ALL_OPTION):
+    """
+    Converte a seleção de funil/estágio das páginas em um recorte de negócios
+    
+    Args:
+        category: Categoria selecionada (ou "Todos")
+        stage: Estágio selecionado (ou "Todos")
+        
+    Returns:
+        tuple: Pares (campo, valor), ex: (("CATEGORY_ID", "2"), ("STAGE_ID", "C2:PREPARATION"));
+            vazio quando não há filtro
+    """
+    if category == ALL_OPTION:
+        return ()
+    filters = (("CATEGORY_ID", str(category)),)
+    if stage != ALL_OPTION:
+        filters += (("STAGE_ID", str(stage)),)
+    return filters
+
+def get_deal_snapshot(config, columns=None, ttl=DEFAULT_SNAPSHOT_TTL, filters=()):
+    """
+    Retorna o snapshot de negócios compartilhado pelo processo
+    
+    Um snapshot vencido continua sendo devolvido na hora enquanto uma
+    thread em segundo plano busca a versão nova; só a primeira carga
+    espera pela rede.
+    
+    Args:
+        config (dict): Configuração de conexão (com "urls")
+        columns (list): Colunas necessárias (None para todas)
+        ttl (int): Idade (segundos) a partir da qual o snapshot é atualizado
+        filters (tuple): Recorte (de deal_slice_filters) buscado no Bitrix24;
+            cada recorte tem o seu snapshot
+        
+    Returns:
+        Snapshot: Snapshot com data, version e age, ou None se a primeira carga falhar
+    """
+    key = deal_snapshot_key(config, columns, filters)
+    try:
+        portal = account_portal(config)
+        # Após um reinício, o último snapshot em disco evita esperar pela rede
+        if portal.snapshots.peek(key) is None:
+            _singleflight.do(("restore",) + key, lambda: _restore_snapshot(portal, key))
+        return portal.snapshots.get(key, lambda: _load_and_persist(key, config, columns, filters), ttl=ttl)
+    except Exception as e:
+        st.error(f"Erro ao carregar dados do Bitrix24: {str(e)}")
+        return None
+
+def get_deal_slice(config, columns=None, category=ALL_OPTION, stage=ALL_OPTION, ttl=DEFAULT_SNAPSHOT_TTL):
+    """
+    Retorna o snapshot que cobre a seleção de funil/estágio das páginas
+    
+    Se a tabela completa já estiver em memória (ou em disco), ela é usada e
+    o filtro é aplicado localmente. Caso contrário, na REST API, apenas o
+    funil/estágio selecionado é buscado (filter[CATEGORY_ID], filter[STAGE_ID]);
+    a tabela completa só é baixada para "Todos". O BI Connector não filtra
+    por coluna e sempre usa a tabela completa.
+    
+    O snapshot devolvido pode conter mais linhas que a seleção: quem chama
+    continua aplicando o filtro (ex: FilterIndex.select).
+    
+    Args:
+        config (dict): Configuração de conexão (com "urls")
+        columns (list): Colunas necessárias (None para todas)
+        category: Categoria selecionada (ou "Todos")
+        stage: Estágio selecionado (ou "Todos")
+        ttl (int): Idade (segundos) a partir da qual o snapshot é atualizado
+        
+    Returns:
+        Snapshot: Snapshot da tabela completa ou do recorte, ou None se a carga falhar
+    """
+    filters = deal_slice_filters(category, stage)
+    if filters and "crm_deal_uf" not in config["urls"] and peek_deal_snapshot(config, columns) is None:
+        return get_deal_snapshot(config, columns, ttl=ttl, filters=filters)
+    return get_deal_snapshot(config, columns, ttl=ttl)
+
+def peek_deal_snapshot(config, columns=None):
+    """
+    Snapshot completo já em memória (restaurando do disco se preciso), sem ir à rede
+    
+    Args:
+        config (dict): Configuração de conexão
+        columns (list): Colunas do snapshot
+        
+    Returns:
+        Snapshot: Snapshot local, ou None se ainda não houver
+    """
+    key = deal_snapshot_key(config, columns)
+    portal = account_portal(config)
+    if portal.snapshots.peek(key) is None:
+        _singleflight.do(("restore",) + key, lambda: _restore_snapshot(portal, key))
+    return portal.snapshots.peek(key)
+
+def get_deal_filter_options(config, columns=None, ttl=DEFAULT_SNAPSHOT_TTL):
+    """
+    Retorna os funis e estágios oferecidos nos filtros das páginas
+    
+    Vêm do snapshot completo quando ele já está em memória; senão, da lista
+    de estágios do portal (get_deal_funnels), para que escolher um funil não
+    exija baixar todos os negócios. Sem nenhum dos dois, carrega o snapshot.
+    
+    Args:
+        config (dict): Configuração de conexão (com "urls")
+        columns (list): Colunas do snapshot usado pela página
+        ttl (int): Idade (segundos) a partir da qual os dados são atualizados
+        
+    Returns:
+        dict: Categoria -> lista de estágios (vazio se nada pôde ser carregado)
+    """
+    snapshot = peek_deal_snapshot(config, columns)
+    if snapshot is None:
+        funnels = get_deal_funnels(config, ttl=ttl)
+        if funnels is not None:
+            return funnels
+        snapshot = get_deal_snapshot(config, columns, ttl=ttl)
+        if snapshot is None:
+            return {}
+    return get_filter_index(snapshot).options()
+
+# Funis por URL de crm.status.list: (momento da busca, {categoria: estágios})
+_funnel_cache = {}
+
+def get_deal_funnels(config, ttl=DEFAULT_SNAPSHOT_TTL):
+    """
+    Lista os funis e seus estágios pela REST API, sem baixar os negócios
+    
+    Usa crm.status.list: os estágios do funil 0 têm ENTITY_ID DEAL_STAGE e
+    os do funil N, DEAL_STAGE_N. O resultado fica em cache por ttl segundos.
+    
+    Args:
+        config (dict): Configuração de conexão (com "urls")
+        ttl (int): Segundos para reaproveitar a última lista
+        
+    Returns:
+        dict: Categoria -> estágios na ordem do funil, ou None se indisponível
+            (BI Connector, configuração antiga ou falha na chamada)
     """
+    url = (config.get("urls") or {}).get("crm_status")
+    if not url:
+        return None
+    cached = _funnel_cache.get(url)
+    if cached and time.time() - cached[0] < ttl:
+        return cached[1]
+    
     try:
-        # Fazer a requisição à API
-        response = requests.get(url)
-        
-        # Verificar se a requisição foi bem-sucedida
-        if response.status_code == 200:
-            # Converter para DataFrame
-            data = pd.DataFrame(response.json())
-            return data
+        records = _singleflight.do(("funnels", url), lambda: get_bitrix_list(url))
+    except Exception:
+        return cached[1] if cached else None
+    
+    funnels = {}
+    for record in sorted(records, key=lambda record: int(record.get("SORT") or 0)):
+        entity = record.get("ENTITY_ID") or ""
+        if entity == "DEAL_STAGE":
+            category = 0
+        elif entity.startswith("DEAL_STAGE_") and entity[len("DEAL_STAGE_"):].isdigit():
+            category = int(entity[len("DEAL_STAGE_"):])
         else:
-            st.error(f"Erro na requisição: {response.status_code}")
-            return pd.DataFrame()
+            continue
+        funnels.setdefault(category, []).append(record.get("STATUS_ID"))
+    funnels = dict(sorted(funnels.items()))
+    _funnel_cache[url] = (time.time(), funnels)
+    return funnels
+
+def warm_deal_snapshot(config, columns=None, ttl=DEFAULT_SNAPSHOT_TTL, on_phase=None):
+    """
+    Garante um snapshot de negócios atualizado em memória, esperando a carga
+    
+    Usada pelo pré-carregamento em segundo plano: restaura o último snapshot
+    do disco e, se ele estiver vencido ou não existir, carrega a versão nova
+    antes de retornar. Erros são propagados para quem chamou.
+    
+    Args:
+        config (dict): Configuração de conexão (com "urls")
+        columns (list): Colunas necessárias (None para todas)
+        ttl (int): Idade (segundos) a partir da qual o snapshot é recarregado
+        on_phase (callable): Recebe a etapa atual ("restore" ou "download")
+        
+    Returns:
+        Snapshot: Snapshot atualizado
+    """
+    key = deal_snapshot_key(config, columns)
+    portal = account_portal(config)
+    notify = on_phase or (lambda phase: None)
+    if portal.snapshots.peek(key) is None:
+        notify("restore")
+        _singleflight.do(("restore",) + key, lambda: _restore_snapshot(portal, key))
+    
+    snapshot = portal.snapshots.peek(key)
+    if snapshot is not None and snapshot.age < ttl:
+        return snapshot
+    
+    notify("download")
+    return portal.snapshots.refresh(key, lambda: _load_and_persist(key, config, columns))
+
+def apply_deal_events(config, changed_ids=(), deleted_ids=()):
+    """
+    Atualiza os snapshots de negócios de uma conta a partir de eventos
+    
+    Na REST API apenas os negócios afetados são buscados (um único
+    crm.deal.list filtrado por ID, até 50 IDs por página) e mesclados ao
+    armazenamento local; cada snapshot da conta ganha uma nova versão. O BI
+    Connector não filtra por ID: recarregar a tabela a cada lote custaria mais
+    que a atualização periódica, então os eventos são ignorados e os
+    snapshots seguem a validade (ttl) normal. Erros são propagados para quem chamou.
+    
+    Args:
+        config (dict): Configuração de conexão (com "urls")
+        changed_ids (iterable): IDs de negócios criados ou alterados
+        deleted_ids (iterable): IDs de negócios excluídos
+        
+    Returns:
+        dict: patched (snapshots atualizados), fetched (registros buscados) e
+            ignored (eventos não aplicados, no BI Connector)
+    """
+    portal = account_portal(config)
+    account = (config.get("account_name"), config.get("api_type", "rest"))
+    keys = [key for key in portal.snapshots.keys() if key[:2] == account]
+    summary = {"patched": 0, "fetched": 0, "ignored": 0}
+    changed_ids = sorted({str(deal_id) for deal_id in changed_ids})
+    deleted_ids = {str(deal_id) for deal_id in deleted_ids}
+    
+    if "crm_deal_uf" in config["urls"]:
+        summary["ignored"] = len(changed_ids) + len(deleted_ids)
+        return summary
+    
+    url = config["urls"]["crm_deal"]
+    id_filter = [(f"filter[ID][{i}]", deal_id) for i, deal_id in enumerate(changed_ids)]
+    fetched = {}
+    for key in keys:
+        columns = _key_columns(key)
+        projection = tuple(columns) if columns else None
+        store = portal.deal_stores.get((url, projection, _key_filters(key)))
+        if store is None:
+            continue
+        # Um recorte (funil) recebe os mesmos registros e descarta os de fora dele
+        if projection not in fetched:
+            fetched[projection] = _fetch_deal_records(url, id_filter, columns) if changed_ids else []
+            summary["fetched"] += len(fetched[projection])
+        records = fetched[projection]
+        
+        # IDs alterados que não vieram na busca também deixaram de existir
+        found = {str(record.get("ID")) for record in records}
+        removed = deleted_ids | {deal_id for deal_id in changed_ids if deal_id not in found}
+        
+        data = store.apply_changes(records, removed)
+        if data is not None:
+            portal.snapshots.put(key, data)
+            summary["patched"] += 1
+    return summary
+
+# Último DataFrame gravado por chave (referência fraca, para não mantê-lo
+# vivo), para não regravar dados inalterados
+_persisted = {}
+
+def _restore_snapshot(portal, key):
+    """
+    Publica no cache o snapshot mais recente gravado em disco, se houver
+    
+    Os snapshots de cada portal ficam em app/data/snapshots/<portal>. O
+    snapshot mantém a data de gravação, então um arquivo antigo é
+    atualizado em segundo plano logo no primeiro acesso.
+    
+    Args:
+        portal (Portal): Portal da conexão
+        key (tuple): Chave do snapshot
+    """
+    if portal.snapshots.peek(key) is not None:
+        return
+    try:
+        restored = portal.store.load_latest(store_name(key))
+    except Exception:
+        # Um arquivo ilegível não deve impedir a carga pela rede
+        return
+    if restored is not None:
+        data, saved_at = restored
+        _persisted[key] = weakref.ref(data)
+        portal.snapshots.put(key, data, loaded_at=saved_at)
+
+def _forget_snapshot(portal, key, old, new):
+    """
+    Libera o estado auxiliar de um snapshot descartado pelo orçamento de memória
+    
+    Sem isso o armazenamento incremental manteria os dados vivos. A próxima
+    carga restaura o snapshot do disco e, na REST API, volta a sincronizar
+    o recorte do zero.
+    """
+    if new is not None:
+        return
+    _persisted.pop(key, None)
+    for store_key in _snapshot_store_keys(portal, key):
+        portal.deal_stores.pop(store_key, None)
+
+def _store_bytes(portal, key, snapshot):
+    """
+    Memória dos armazenamentos incrementais de um snapshot, para o orçamento
+    
+    Normalmente o armazenamento guarda o próprio DataFrame do snapshot e
+    não custa nada a mais; só um frame diferente (ex: sincronizado depois
+    de um snapshot restaurado do disco) é contado.
+    """
+    total = 0
+    for store_key in _snapshot_store_keys(portal, key):
+        store = portal.deal_stores.get(store_key)
+        data = store.data if store is not None else None
+        if data is not None and data is not snapshot.data:
+            total += int(data.memory_usage(index=True, deep=True).sum())
+    return total
+
+def _snapshot_store_keys(portal, key):
+    """
+    Chaves dos armazenamentos incrementais (portal.deal_stores) de um snapshot
+    """
+    columns = _key_columns(key)
+    scope = (tuple(columns) if columns else None, _key_filters(key))
+    return [store_key for store_key in list(portal.deal_stores) if store_key[1:] == scope]
+
+add_snapshot_listener(_forget_snapshot)
+add_memory_reporter(_store_bytes)
+
+def _load_and_persist(key, config, columns=None, filters=()):
+    """
+    Carrega os negócios pela rede e grava o resultado em disco
+    
+    Args:
+        key (tuple): Chave do snapshot
+        config (dict): Configuração de conexão
+        columns (list): Colunas necessárias (None para todas)
+        filters (tuple): Recorte do snapshot (vazio para a tabela completa)
+        
+    Returns:
+        pandas.DataFrame: Negócios carregados
+    """
+    data = load_deals(config, columns, filters)
+    persisted = _persisted.get(key)
+    if not data.empty and (persisted is None or persisted() is not data):
+        try:
+            account_portal(config).store.save(store_name(key), data)
+            _persisted[key] = weakref.ref(data)
+        except Exception:
+            # Falha ao gravar em disco não afeta os dados em memória
+            pass
+    return data
+
+# Validade (segundos) do último teste de conexão de cada conta
+HEALTH_TTL = 30
+
+# Testes de conexão guardados por conta para o histórico de latência
+HEALTH_HISTORY = 50
+
+# O teste não repete a requisição e desiste antes das cargas de dados
+HEALTH_TIMEOUT = (5, 15)
+
+# Bytes lidos do início da tabela no teste do BI Connector
+HEALTH_PROBE_BYTES = 256
+
+# Tabela pequena do BI Connector usada no teste (a de negócios obrigaria o
+# servidor a iniciar a consulta completa), limitada a uma linha
+HEALTH_PROBE_TABLE = "b_user"
+HEALTH_PROBE_LIMIT = 1
+
+class ConnectionHealth:
+    """
+    Resultado de um teste de conexão
+    """
+
+    def __init__(self, ok, latency, message, checked_at=None):
+        """
+        Args:
+            ok (bool): True se o portal respondeu como esperado
+            latency (float): Duração do teste em segundos
+            message (str): Descrição do resultado (ou do erro)
+            checked_at (float): Momento do teste (time.time())
+        """
+        self.ok = ok
+        self.latency = latency
+        self.message = message
+        self.checked_at = checked_at if checked_at is not None else time.time()
+
+    @property
+    def age(self):
+        """
+        Segundos desde o teste
+        """
+        return time.time() - self.checked_at
+
+# Último teste e histórico por conta: (conta, tipo de API) -> ConnectionHealth / deque
+_health = {}
+_health_history = {}
+
+# Contas com teste em segundo plano em andamento
+_health_probing = set()
+_health_lock = threading.Lock()
+
+def check_connection(config, ttl=HEALTH_TTL, force=False, wait=True):
+    """
+    Testa a conexão com o Bitrix24 usando a requisição mais barata da API
+    
+    Na REST API chama server.time; no BI Connector lê uma linha de uma
+    tabela pequena (HEALTH_PROBE_TABLE). O resultado fica em cache por ttl
+    segundos e entra no histórico de latência da conta. As falhas contam
+    para o disjuntor do portal; com ele aberto o teste falha na hora, sem
+    ir à rede.
+    
+    Args:
+        config (dict): Configuração de conexão (com "urls")
+        ttl (int): Segundos para reaproveitar o último teste
+        force (bool): Se True, testa mesmo com um resultado recente em cache
+        wait (bool): Se False, não bloqueia quem chamou (ex: renderização da
+            página): um teste vencido é refeito em segundo plano e o último
+            resultado é devolvido
+        
+    Returns:
+        ConnectionHealth: Resultado do teste (None com wait=False e nenhum teste ainda)
+    """
+    account = (config.get("account_name"), config.get("api_type", "rest"))
+    cached = _health.get(account)
+    if cached is not None and not force and cached.age < ttl:
+        return cached
+    if not wait:
+        _probe_in_background(config, account)
+        return cached
+    
+    health = _singleflight.do(("health",) + account, lambda: _probe_connection(config))
+    if _health.get(account) is not health:
+        _health[account] = health
+        _health_history.setdefault(account, deque(maxlen=HEALTH_HISTORY)).append(health)
+    return health
+
+def _probe_in_background(config, account):
+    """
+    Inicia um teste de conexão em uma thread, se ainda não houver um para a conta
+    """
+    with _health_lock:
+        if account in _health_probing:
+            return
+        _health_probing.add(account)
+    
+    def run():
+        try:
+            check_connection(config, force=True)
+        finally:
+            with _health_lock:
+                _health_probing.discard(account)
+    
+    threading.Thread(target=run, name="connection-probe", daemon=True).start()
+
+def get_connection_history(config):
+    """
+    Retorna os últimos testes de conexão de uma conta, do mais antigo ao mais recente
+    
+    Args:
+        config (dict): Configuração de conexão
+        
+    Returns:
+        list: Resultados (ConnectionHealth)
+    """
+    account = (config.get("account_name"), config.get("api_type", "rest"))
+    return list(_health_history.get(account, ()))
+
+def get_connection_breaker(config):
+    """
+    Retorna o estado do disjuntor do portal de uma conta
+    
+    Args:
+        config (dict): Configuração de conexão (com "urls")
+        
+    Returns:
+        dict: Métricas de CircuitBreaker.stats, ou None sem URLs configuradas
+    """
+    url = (config.get("urls") or {}).get("crm_deal")
+    return get_portal(url).breaker.stats() if url else None
+
+def _probe_connection(config):
+    """
+    Executa um teste de conexão (sem cache)
+    
+    Args:
+        config (dict): Configuração de conexão
+        
+    Returns:
+        ConnectionHealth: Resultado do teste
+    """
+    url = (config.get("urls") or {}).get("crm_deal")
+    if not url:
+        return ConnectionHealth(False, 0.0, "Configuração sem URLs de acesso")
+    
+    started = time.perf_counter()
+    try:
+        if "crm_deal_uf" in config["urls"]:
+            ok, message = _probe_biconnector(url)
+        else:
+            base_url, _, _ = _split_rest_url(url)
+            payload = bitrix_json("GET", f"{base_url}/server.time",
+                                  timeout=HEALTH_TIMEOUT, max_retries=0)
+            ok, message = True, f"Horário do portal: {payload.get('result')}"
     except Exception as e:
-        st.error(f"Erro ao conectar com o Bitrix24: {str(e)}")
-        return pd.DataFrame()
+        ok, message = False, str(e)
+    return ConnectionHealth(ok, time.perf_counter() - started, message)
+
+def _probe_biconnector(url):
+    """
+    Lê o início da tabela de teste do BI Connector (HEALTH_PROBE_TABLE)
+    
+    Args:
+        url (str): URL de uma tabela da conta (pbi.php), de onde vem o token
+        
+    Returns:
+        tuple: (ok, mensagem)
+    """
+    parts = urlsplit(url)
+    params = [(key, value) for key, value in parse_qsl(parts.query) if key not in ("table", "limit")]
+    params += [("table", HEALTH_PROBE_TABLE), ("limit", HEALTH_PROBE_LIMIT)]
+    probe_url = parts._replace(query=urlencode(params)).geturl()
+    response = bitrix_request("GET", probe_url, timeout=HEALTH_TIMEOUT, max_retries=0, stream=True)
+    try:
+        if response.status_code != 200:
+            return False, f"HTTP {response.status_code}"
+        head = next(response.iter_content(HEALTH_PROBE_BYTES), b"")
+    finally:
+        # Fecha a conexão sem ler o resto da tabela
+        response.close()
+    
+    # A tabela é uma lista JSON; um objeto indica erro (ex: token inválido)
+    if head.lstrip()[:1] == b"[":
+        return True, "BI Connector respondeu"
+    return False, f"Resposta inesperada do BI Connector: {head[:120].decode('utf-8', 'replace')}"
 
-def setup_bitrix_connection(account_name, token, api_type="rest"):
+def setup_bitrix_connection(account_name, token, api_type="rest", columns=None):
     """
     Configura as informações de conexão com o Bitrix24
     
@@ -45,17 +923,21 @@ def setup_bitrix_connection(account_name, token, api_type="rest"):
         account_name (str): Nome da conta Bitrix24
         token (str): Token de acesso
         api_type (str): Tipo de API (rest ou biconnector)
+        columns (list): Colunas de negócio necessárias; na REST API viram
+            select[] na URL de crm.deal.list (None para todas)
         
     Returns:
         dict: Dicionário com as URLs configuradas
     """
     if api_type == "rest":
         base_url = f"https://{account_name}.bitrix24.com.br/rest/{token}"
+        deal_query = f"?{urlencode(select_params(columns))}" if columns else ""
         
         # Configurar URLs para diferentes endpoints da REST API
         urls = {
-            "crm_deal": f"{base_url}/crm.deal.list",
-            "crm_deal_fields": f"{base_url}/crm.deal.fields"
+            "crm_deal": f"{base_url}/crm.deal.list{deal_query}",
+            "crm_deal_fields": f"{base_url}/crm.deal.fields",
+            "crm_status": f"{base_url}/crm.status.list"
         }
     else:  # biconnector
         base_url = f"https://{account_name}.bitrix24.com.br/bitrix/tools/biconnector/pbi.php?token={token}"
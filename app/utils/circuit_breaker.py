@@ -0,0 +1,113 @@
+import threading
+import time
+
+# Falhas seguidas que abrem o circuito de um portal
+FAILURE_THRESHOLD = 3
+
+# Tempo (segundos) com o circuito aberto antes de deixar passar uma tentativa
+COOLDOWN = 30.0
+
+# Estados do circuito
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitOpenError(RuntimeError):
+    """
+    Requisição recusada sem ir à rede porque o portal está fora do ar
+    """
+
+    def __init__(self, host, retry_in):
+        super().__init__(f"Bitrix24 indisponível ({host}); nova tentativa em {retry_in:.0f}s")
+        self.host = host
+        self.retry_in = retry_in
+
+class CircuitBreaker:
+    """
+    Disjuntor de um portal: após falhas seguidas, recusa requisições na hora
+
+    Com o circuito fechado tudo passa. Depois de FAILURE_THRESHOLD
+    requisições seguidas com falha (conexão, timeout, erro 5xx, contadas
+    uma vez cada, depois das novas tentativas) ele abre e as requisições
+    falham imediatamente com CircuitOpenError. Passado o cooldown, uma única
+    tentativa é liberada: se der certo o circuito fecha, senão abre de novo.
+    """
+
+    def __init__(self, host, threshold=FAILURE_THRESHOLD, cooldown=COOLDOWN):
+        """
+        Args:
+            host (str): Portal protegido (para as mensagens)
+            threshold (int): Falhas seguidas que abrem o circuito
+            cooldown (float): Segundos até a tentativa de reabertura
+        """
+        self.host = host
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.trips = 0
+        self.rejected = 0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def before_request(self):
+        """
+        Verifica se a requisição pode ir à rede
+
+        Raises:
+            CircuitOpenError: Se o circuito estiver aberto (ou com a tentativa
+                de reabertura em andamento)
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            remaining = self.opened_at + self.cooldown - time.monotonic()
+            if remaining <= 0 and not self._trial_running:
+                self.state = HALF_OPEN
+                self._trial_running = True
+                return
+            self.rejected += 1
+            raise CircuitOpenError(self.host, max(0.0, remaining))
+
+    def record_success(self):
+        """
+        Registra uma resposta do portal (inclusive erros 4xx: ele está no ar)
+        """
+        with self._lock:
+            self.failures = 0
+            self.state = CLOSED
+            self._trial_running = False
+
+    def record_failure(self):
+        """
+        Registra uma falha de conexão ou erro do servidor
+        """
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == HALF_OPEN or self.failures >= self.threshold:
+                if self.state != OPEN:
+                    self.trips += 1
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def stats(self):
+        """
+        Retorna o estado do disjuntor
+
+        Returns:
+            dict: state, failures, trips (aberturas), rejected (requisições recusadas)
+                e retry_in (segundos até a próxima tentativa, com o circuito aberto)
+        """
+        with self._lock:
+            retry_in = 0.0
+            if self.state == OPEN:
+                retry_in = max(0.0, self.opened_at + self.cooldown - time.monotonic())
+            return {
+                "state": self.state,
+                "failures": self.failures,
+                "trips": self.trips,
+                "rejected": self.rejected,
+                "retry_in": retry_in,
+            }
@@ -0,0 +1,279 @@
+import logging
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+from app.utils.bitrix_api import apply_deal_events
+from app.utils.request_scheduler import request_priority, PRIORITY_BACKGROUND
+
+# Eventos de saída do Bitrix24 tratados pelo receptor
+EVENT_ADD = "ONCRMDEALADD"
+EVENT_UPDATE = "ONCRMDEALUPDATE"
+EVENT_DELETE = "ONCRMDEALDELETE"
+DEAL_EVENTS = {EVENT_ADD, EVENT_UPDATE, EVENT_DELETE}
+
+# Tempo (segundos) que os eventos são acumulados antes de uma busca única
+EVENT_BATCH_DELAY = 1.0
+
+# Número de IDs que dispara a busca sem esperar o atraso (uma página da REST API)
+EVENT_BATCH_SIZE = 50
+
+# Variáveis de ambiente que ativam o receptor (porta e token da aplicação; as duas são obrigatórias)
+EVENTS_PORT_ENV = "BITRIX_EVENTS_PORT"
+EVENTS_TOKEN_ENV = "BITRIX_EVENTS_TOKEN"
+
+logger = logging.getLogger("jusgestante.events")
+
+def parse_deal_event(form):
+    """
+    Interpreta o corpo (form-encoded) de um evento de saída do Bitrix24
+
+    Args:
+        form (list): Pares (chave, valor) do corpo, ex: ("data[FIELDS][ID]", "42")
+
+    Returns:
+        tuple: (evento, ID do negócio, application_token, domínio do portal)
+            ou None se não for um evento de negócio
+    """
+    fields = dict(form)
+    event = fields.get("event", "").upper()
+    deal_id = fields.get("data[FIELDS][ID]")
+    if event not in DEAL_EVENTS or not deal_id:
+        return None
+    return event, str(deal_id), fields.get("auth[application_token]"), fields.get("auth[domain]")
+
+def event_domain(config):
+    """
+    Domínio que o Bitrix24 envia em auth[domain] para os eventos de uma conta
+
+    Args:
+        config (dict): Configuração de conexão (com "urls")
+
+    Returns:
+        str: Host da URL de negócios, sem porta (ex: conta.bitrix24.com.br)
+    """
+    return urlsplit(config["urls"]["crm_deal"]).hostname
+
+class DealEventBatcher:
+    """
+    Acumula eventos de negócios e os aplica aos snapshots em lotes
+
+    Eventos que chegam juntos (ex: uma automação alterando vários negócios)
+    viram uma única busca por ID. Um negócio alterado e depois excluído no
+    mesmo lote conta só como exclusão.
+    """
+
+    def __init__(self, config, delay=EVENT_BATCH_DELAY, batch_size=EVENT_BATCH_SIZE, apply_fn=apply_deal_events):
+        """
+        Args:
+            config (dict): Configuração de conexão da conta
+            delay (float): Segundos de espera por mais eventos antes de aplicar
+            batch_size (int): Número de IDs que dispara a aplicação imediata
+            apply_fn (callable): Recebe (config, changed_ids, deleted_ids)
+        """
+        self.config = config
+        self.delay = delay
+        self.batch_size = batch_size
+        self.apply_fn = apply_fn
+        self.stats = {"events": 0, "batches": 0, "fetched": 0, "errors": 0, "last_error": None}
+        self._changed = set()
+        self._deleted = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="deal-events", daemon=True)
+        self._thread.start()
+
+    def add(self, event, deal_id):
+        """
+        Registra um evento para o próximo lote
+        """
+        with self._lock:
+            self.stats["events"] += 1
+            if event == EVENT_DELETE:
+                self._changed.discard(deal_id)
+                self._deleted.add(deal_id)
+            else:
+                self._deleted.discard(deal_id)
+                self._changed.add(deal_id)
+            full = len(self._changed) + len(self._deleted) >= self.batch_size
+        if full:
+            self._wakeup.set()
+
+    def flush(self):
+        """
+        Aplica os eventos pendentes imediatamente
+
+        Returns:
+            dict: Resumo de apply_fn, ou None se não havia eventos
+        """
+        with self._lock:
+            changed, deleted = self._changed, self._deleted
+            self._changed, self._deleted = set(), set()
+        if not changed and not deleted:
+            return None
+        try:
+            summary = self.apply_fn(self.config, changed, deleted)
+            self.stats["batches"] += 1
+            self.stats["fetched"] += summary.get("fetched", 0)
+            return summary
+        except Exception as e:
+            # Os snapshots continuam válidos; a próxima sincronização traz a alteração
+            self.stats["errors"] += 1
+            self.stats["last_error"] = str(e)
+            return None
+
+    def _run(self):
+        with request_priority(PRIORITY_BACKGROUND):
+            while True:
+                self._wakeup.wait(self.delay)
+                self._wakeup.clear()
+                self.flush()
+
+class _EventHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length).decode("utf-8", errors="replace") if length else ""
+        parsed = parse_deal_event(parse_qsl(body, keep_blank_values=True))
+
+        server = self.server
+        if parsed is None:
+            self._reply(400)
+            return
+        event, deal_id, token, domain = parsed
+        if server.application_token and token != server.application_token:
+            self._reply(403)
+            return
+        # Cada portal tem seus lotes; eventos de um portal não cadastrado são recusados
+        batchers = server.batchers_for(domain)
+        if not batchers:
+            self._reply(404)
+            return
+        for batcher in batchers:
+            batcher.add(event, deal_id)
+        self._reply(200)
+
+    def _reply(self, status):
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+class DealEventReceiver(ThreadingHTTPServer):
+    """
+    Servidor HTTP que recebe os eventos de saída do Bitrix24
+
+    Roda no mesmo processo do Streamlit, para atualizar os snapshots em
+    memória que as páginas leem. O endereço http://HOST:PORTA/ deve ser
+    cadastrado no Bitrix24 como manipulador dos eventos ONCRMDEAL*.
+
+    Um único receptor atende vários portais: os eventos são separados pelo
+    domínio (auth[domain]) e cada conta cadastrada (REST ou BI Connector)
+    tem o seu lote.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, config=None, host="127.0.0.1", port=0, application_token=None, delay=EVENT_BATCH_DELAY):
+        super().__init__((host, port), _EventHandler)
+        self.application_token = application_token
+        self.delay = delay
+        self.batchers = {}
+        self._batchers_lock = threading.Lock()
+        if config is not None:
+            self.add_account(config)
+
+    def add_account(self, config):
+        """
+        Cadastra uma conta, ou atualiza a configuração usada pelos próximos lotes dela
+
+        Args:
+            config (dict): Configuração de conexão (com "urls")
+
+        Returns:
+            DealEventBatcher: Lote da conta
+        """
+        key = (event_domain(config), config.get("api_type", "rest"))
+        with self._batchers_lock:
+            batcher = self.batchers.get(key)
+            if batcher is None:
+                batcher = self.batchers[key] = DealEventBatcher(config, delay=self.delay)
+            else:
+                batcher.config = config
+        return batcher
+
+    def batchers_for(self, domain):
+        """
+        Lotes das contas de um domínio (REST e/ou BI Connector)
+        """
+        return [batcher for (batcher_domain, _), batcher in list(self.batchers.items()) if batcher_domain == domain]
+
+    def batcher_for(self, config):
+        """
+        Lote de uma conta cadastrada (ou None)
+        """
+        return self.batchers.get((event_domain(config), config.get("api_type", "rest")))
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="deal-event-receiver", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+# Receptor do processo (no máximo um)
+_receiver = None
+_receiver_lock = threading.Lock()
+_missing_token_logged = False
+
+def start_event_receiver(config, port=None, application_token=None, host=None):
+    """
+    Inicia o receptor de eventos do processo, se estiver configurado, e
+    cadastra nele a conta da configuração
+
+    O receptor precisa da porta (BITRIX_EVENTS_PORT) e do token da aplicação
+    (BITRIX_EVENTS_TOKEN). Ele escuta em todas as interfaces, para que o
+    Bitrix24 consiga entregar os eventos, e recusa os que vêm com outro
+    token; sem o token ninguém de fora deveria poder disparar buscas, então
+    o receptor não é iniciado (o motivo vai para o log uma vez).
+
+    Args:
+        config (dict): Configuração de conexão
+        port (int): Porta do receptor
+        application_token (str): Token esperado em auth[application_token]
+        host (str): Endereço de escuta (None para todas as interfaces)
+
+    Returns:
+        DealEventReceiver: Receptor em execução, ou None se desativado
+    """
+    global _receiver, _missing_token_logged
+    port = port or os.environ.get(EVENTS_PORT_ENV)
+    if not port:
+        return None
+    with _receiver_lock:
+        if _receiver is None:
+            token = application_token or os.environ.get(EVENTS_TOKEN_ENV) or None
+            if not token:
+                if not _missing_token_logged:
+                    _missing_token_logged = True
+                    logger.warning("Receptor de eventos não iniciado: %s definida sem %s",
+                                   EVENTS_PORT_ENV, EVENTS_TOKEN_ENV)
+                return None
+            _receiver = DealEventReceiver(host=host or "0.0.0.0", port=int(port),
+                                          application_token=token).start()
+    # Cada sessão cadastra a sua conta; uma conta reconfigurada vale para os próximos lotes
+    _receiver.add_account(config)
+    return _receiver
+
+def get_event_receiver():
+    """
+    Retorna o receptor de eventos do processo (ou None)
+    """
+    return _receiver
@@ -0,0 +1,104 @@
+import pandas as pd
+
+# Chaves da junção negócio x campos personalizados
+DEAL_KEY = "ID"
+UF_KEY = "DEAL_ID"
+
+def normalize_key(values):
+    """
+    Converte uma coluna de IDs para inteiro anulável (Int64)
+
+    O BI Connector envia IDs como texto e a REST API, como texto ou
+    número; com o mesmo tipo dos dois lados a junção compara inteiros.
+
+    Args:
+        values (pd.Series): IDs originais
+
+    Returns:
+        pandas.Series: IDs em Int64
+    """
+    if isinstance(values.dtype, pd.Int64Dtype):
+        return values
+    if pd.api.types.is_integer_dtype(values.dtype):
+        return values.astype("Int64")
+    return pd.to_numeric(values, errors="coerce").astype("Int64")
+
+class DealUfJoin:
+    """
+    Junção entre negócios (crm_deal) e campos personalizados (crm_deal_uf)
+
+    As colunas são projetadas antes da junção, as chaves são convertidas
+    para Int64 e os campos personalizados ficam indexados por DEAL_ID, de
+    modo que a junção é feita pelo índice. Não há junção incremental: o BI
+    Connector entrega as tabelas inteiras e a junção é refeita a cada carga.
+    """
+
+    def __init__(self, deal_columns=None, uf_columns=None, how="inner"):
+        """
+        Args:
+            deal_columns (list): Colunas de negócio a manter (None para todas)
+            uf_columns (list): Campos personalizados a manter (None para todos)
+            how (str): Tipo de junção ("inner" ou "left")
+        """
+        self.deal_columns = deal_columns
+        self.uf_columns = uf_columns
+        self.how = how
+        self.uf = None
+
+    def build(self, deals, uf):
+        """
+        Constrói a junção completa
+
+        Args:
+            deals (pd.DataFrame): Negócios
+            uf (pd.DataFrame): Campos personalizados (com DEAL_ID)
+
+        Returns:
+            pandas.DataFrame: Negócios com os campos personalizados
+        """
+        self.uf = self._index_uf(uf)
+        return self._join(self._project_deals(deals))
+
+    def _project_deals(self, deals):
+        """
+        Projeta as colunas de negócio e normaliza a chave
+        """
+        if self.deal_columns:
+            deals = deals[[c for c in self.deal_columns if c in deals.columns]]
+        return deals.assign(**{DEAL_KEY: normalize_key(deals[DEAL_KEY])})
+
+    def _index_uf(self, uf):
+        """
+        Projeta os campos personalizados e os indexa por DEAL_ID
+        """
+        columns = [c for c in (self.uf_columns or uf.columns) if c in uf.columns and c != UF_KEY]
+        keys = normalize_key(uf[UF_KEY])
+        valid = keys.notna()
+        # Sem nulos, o índice usa int64 do numpy, mais rápido de consultar
+        keys = keys[valid].astype("int64").rename(UF_KEY)
+        indexed = uf.loc[valid, columns].set_index(keys)
+        # Um registro por negócio; em caso de repetição vale o último
+        return indexed[~indexed.index.duplicated(keep="last")]
+
+    def _join(self, deals):
+        """
+        Junta negócios aos campos personalizados pelo índice
+
+        Como o índice de DEAL_ID é único, basta localizar a posição de cada
+        ID (get_indexer) e copiar as linhas correspondentes.
+        """
+        keys = deals[DEAL_KEY]
+        if keys.isna().any():
+            # Negócios sem ID nunca encontram campos personalizados
+            keys = keys.fillna(-1)
+        indexer = self.uf.index.get_indexer(keys.to_numpy(dtype="int64"))
+        if self.how == "inner":
+            found = indexer >= 0
+            deals = deals[found]
+            uf_rows = self.uf.iloc[indexer[found]]
+        else:
+            uf_rows = self.uf.reindex(deals[DEAL_KEY])
+        return pd.concat(
+            [deals.reset_index(drop=True), uf_rows.reset_index(drop=True)],
+            axis=1
+        )
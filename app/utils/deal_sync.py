@@ -0,0 +1,236 @@
+import threading
+import time
+import pandas as pd
+from app.utils.perf import span
+from app.utils.deal_join import normalize_key
+
+# Intervalo padrão entre reconciliações de negócios excluídos (segundos)
+RECONCILE_INTERVAL = 6 * 3600
+
+class DealStore:
+    """
+    Armazena localmente os negócios do Bitrix24 e os mantém atualizados
+
+    A primeira sincronização baixa todos os negócios. As seguintes buscam
+    apenas os negócios com DATE_MODIFY igual ou posterior à marca d'água
+    (o maior DATE_MODIFY já visto) e os mesclam pelo ID. Como exclusões
+    não alteram DATE_MODIFY, de tempos em tempos a lista completa de IDs
+    é comparada com a local para remover negócios excluídos.
+
+    Com um recorte (scope, ex: um funil), a carga completa e a reconciliação
+    são filtradas no Bitrix24. A busca incremental não é, para que negócios
+    que saíram do recorte também cheguem e sejam removidos localmente.
+
+    Com transform (ex: conversão de tipos), os registros são convertidos
+    assim que chegam e o armazenamento guarda apenas o frame convertido.
+    """
+
+    def __init__(self, fetch_fn, reconcile_interval=RECONCILE_INTERVAL, scope=(), transform=None):
+        """
+        Args:
+            fetch_fn (callable): Função que recebe uma lista de parâmetros extras
+                (filter, select) e retorna a lista de registros correspondentes
+            reconcile_interval (int): Segundos entre reconciliações de exclusões
+            scope (tuple): Pares (campo, valor) que os negócios devem atender;
+                os campos precisam estar entre as colunas buscadas
+            transform (callable): Recebe e retorna um DataFrame; aplicada aos
+                registros buscados antes de guardá-los (None para nenhuma)
+        """
+        self.fetch_fn = fetch_fn
+        self.transform = transform or (lambda frame: frame)
+        self.reconcile_interval = reconcile_interval
+        self.scope = tuple(scope)
+        self._scope_params = [(f"filter[{field}]", value) for field, value in self.scope]
+        self.data = None
+        self.watermark = None
+        self.last_sync = None
+        self.last_reconcile = None
+        self._lock = threading.Lock()
+
+    def sync(self, force_full=False):
+        """
+        Sincroniza o armazenamento local com o Bitrix24
+
+        Args:
+            force_full (bool): Se True, ignora a marca d'água e baixa tudo
+
+        Returns:
+            pandas.DataFrame: Todos os negócios, já atualizados
+        """
+        with self._lock:
+            now = time.time()
+            if self.data is None or force_full:
+                self._full_sync(now)
+            else:
+                self._incremental_sync()
+                if now - self.last_reconcile >= self.reconcile_interval:
+                    self._reconcile_deletions(now)
+            self.last_sync = now
+            return self.data
+
+    def apply_changes(self, changed, deleted_ids=()):
+        """
+        Aplica alterações já conhecidas (ex: recebidas por eventos do Bitrix24)
+
+        A marca d'água não avança: outros negócios alterados no mesmo período,
+        sem evento, continuam sendo trazidos pela próxima sincronização.
+
+        Args:
+            changed (list): Registros novos ou alterados
+            deleted_ids (iterable): IDs de negócios excluídos
+
+        Returns:
+            pandas.DataFrame: Negócios atualizados, ou None se ainda não houve sincronização
+        """
+        with self._lock:
+            if self.data is None:
+                return None
+            changed = pd.DataFrame(changed)
+            with span("merge", rows=len(changed)):
+                self.data = self._merge(self._convert(changed), deleted_ids)
+            return self.data
+
+    def _merge(self, changed, deleted_ids=()):
+        """
+        Mescla registros alterados; os que estão fora do recorte são removidos
+        """
+        data = self.data
+        removed = _id_keys(deleted_ids)
+        if self.scope and not changed.empty:
+            inside = _scope_mask(changed, self.scope)
+            removed = pd.concat([removed, normalize_key(changed.loc[~inside, "ID"])], ignore_index=True)
+            changed = changed[inside]
+        if not changed.empty:
+            data = merge_by_id(data, changed)
+        if not removed.empty and "ID" in data.columns:
+            keep = ~normalize_key(data["ID"]).isin(removed).to_numpy()
+            if not keep.all():
+                data = data[keep].reset_index(drop=True)
+        return data
+
+    def _convert(self, frame):
+        """
+        Aplica transform a registros recém-buscados (não vazios)
+        """
+        return self.transform(frame) if not frame.empty else frame
+
+    def _full_sync(self, now):
+        """
+        Baixa todos os negócios e define a marca d'água inicial
+        """
+        records = self.fetch_fn(list(self._scope_params))
+        with span("build", rows=len(records)):
+            raw = pd.DataFrame(records)
+            del records
+            # A marca d'água vem do texto original, que ainda tem o fuso do portal
+            self.watermark = _max_date_modify(raw)
+            self.data = self._convert(raw)
+        self.last_reconcile = now
+
+    def _incremental_sync(self):
+        """
+        Busca e mescla os negócios alterados desde a marca d'água
+        """
+        if self.watermark is None:
+            self._full_sync(time.time())
+            return
+
+        # ">=" em vez de ">" para não perder alterações no mesmo segundo;
+        # a mesclagem por ID torna a repetição inofensiva
+        changed = pd.DataFrame(self.fetch_fn([("filter[>=DATE_MODIFY]", self.watermark)]))
+        if changed.empty:
+            return
+
+        # Pelos registros buscados, e não pelos mantidos: alterações fora do
+        # recorte também avançam a marca d'água
+        watermark = _max_date_modify(changed)
+        with span("merge", rows=len(changed)):
+            self.data = self._merge(self._convert(changed))
+        self.watermark = watermark or self.watermark
+
+    def _reconcile_deletions(self, now):
+        """
+        Remove do armazenamento local os negócios que não existem mais no Bitrix24
+        """
+        current = pd.DataFrame(self.fetch_fn([("select[]", "ID")] + self._scope_params))
+        if "ID" in current.columns and "ID" in self.data.columns:
+            alive = normalize_key(self.data["ID"]).isin(normalize_key(current["ID"])).to_numpy()
+            # Sem exclusões o frame (e a versão do snapshot) continua o mesmo
+            if not alive.all():
+                self.data = self.data[alive].reset_index(drop=True)
+        self.last_reconcile = now
+
+def merge_by_id(data, changed, id_column="ID"):
+    """
+    Mescla registros alterados em um DataFrame, substituindo-os pelo ID
+
+    Args:
+        data (pd.DataFrame): Registros atuais
+        changed (pd.DataFrame): Registros novos ou alterados
+        id_column (str): Nome da coluna de ID
+
+    Returns:
+        pandas.DataFrame: Registros atualizados
+    """
+    if data is None or data.empty:
+        return changed.reset_index(drop=True)
+    if changed.empty:
+        return data
+
+    # Chaves inteiras (Int64): sem converter o frame inteiro para texto
+    changed_ids = normalize_key(changed[id_column])
+    kept = data[~normalize_key(data[id_column]).isin(changed_ids).to_numpy()]
+    kept, changed = _align_categories(kept, changed)
+    return pd.concat([kept, changed], ignore_index=True)
+
+def _align_categories(data, changed):
+    """
+    Unifica as categorias das colunas categóricas dos dois frames
+
+    pd.concat de categóricos com categorias diferentes vira object; com as
+    mesmas categorias dos dois lados a coluna continua categórica.
+    """
+    aligned = {}, {}
+    for column in data.columns.intersection(changed.columns):
+        left, right = data[column].dtype, changed[column].dtype
+        if (isinstance(left, pd.CategoricalDtype) and isinstance(right, pd.CategoricalDtype)
+                and left != right):
+            categories = left.categories.append(right.categories.difference(left.categories))
+            aligned[0][column] = data[column].cat.set_categories(categories)
+            aligned[1][column] = changed[column].cat.set_categories(categories)
+    if not aligned[0]:
+        return data, changed
+    return data.assign(**aligned[0]), changed.assign(**aligned[1])
+
+def _id_keys(ids):
+    """
+    Converte IDs (texto ou número) em uma Series Int64, como as chaves do frame
+    """
+    return normalize_key(pd.Series(list(ids), dtype=object))
+
+def _scope_mask(data, scope):
+    """
+    Máscara das linhas que atendem a todos os pares (campo, valor) do recorte
+    """
+    mask = pd.Series(True, index=data.index)
+    for field, value in scope:
+        mask &= data[field].astype(str) == str(value)
+    return mask
+
+def _max_date_modify(data):
+    """
+    Retorna o maior DATE_MODIFY do DataFrame no formato aceito pelos filtros
+
+    Args:
+        data (pd.DataFrame): Negócios
+
+    Returns:
+        str: Data/hora ISO 8601 ou None se não houver DATE_MODIFY
+    """
+    if data is None or data.empty or "DATE_MODIFY" not in data.columns:
+        return None
+    dates = pd.to_datetime(data["DATE_MODIFY"], errors="coerce", utc=True)
+    latest = dates.max()
+    if pd.isna(latest):
+        return None
+    return latest.isoformat()
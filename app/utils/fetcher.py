@@ -0,0 +1,39 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+# Número padrão de requisições simultâneas ao Bitrix24
+DEFAULT_MAX_WORKERS = 4
+
+def fetch_in_order(fetch_fn, tasks, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Executa buscas em paralelo com um número limitado de workers
+
+    Cada tarefa é passada para fetch_fn em uma thread do pool; os
+    resultados são devolvidos na mesma ordem das tarefas, independente
+    da ordem em que as respostas chegam. Se alguma busca falhar, a
+    exceção é propagada para quem chamou.
+
+    Args:
+        fetch_fn (callable): Função que recebe uma tarefa e retorna seu resultado
+        tasks (list): Lista de tarefas (ex: offsets ou grupos de offsets)
+        max_workers (int): Número máximo de requisições simultâneas
+
+    Returns:
+        list: Resultados de fetch_fn, na ordem das tarefas
+    """
+    tasks = list(tasks)
+    if not tasks:
+        return []
+
+    # Uma única tarefa não precisa de pool
+    if len(tasks) == 1 or max_workers <= 1:
+        return [fetch_fn(task) for task in tasks]
+
+    # Cada tarefa roda com uma cópia do contexto de quem chamou (ex: a
+    # prioridade das requisições definida por request_priority)
+    contexts = [contextvars.copy_context() for _ in tasks]
+
+    workers = min(max_workers, len(tasks))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bitrix-fetch") as executor:
+        # map preserva a ordem das tarefas
+        return list(executor.map(lambda context, task: context.run(fetch_fn, task), contexts, tasks))
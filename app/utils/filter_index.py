@@ -0,0 +1,112 @@
+import numpy as np
+
+# Valor das caixas de seleção que significa "sem filtro"
+ALL_OPTION = "Todos"
+
+class FilterIndex:
+    """
+    Índice de posições por categoria (funil) e estágio de um snapshot
+
+    Construído uma vez por snapshot: guarda as listas de opções dos
+    filtros, a contagem de cada grupo e as posições das linhas de cada
+    categoria e de cada (categoria, estágio). Aplicar um filtro passa a
+    ser uma consulta ao dicionário seguida de um iloc, sem varrer a tabela.
+    """
+
+    def __init__(self, data, category_field="CATEGORY_ID", stage_field="STAGE_ID"):
+        """
+        Args:
+            data (pd.DataFrame): Dados do snapshot
+            category_field (str): Coluna da categoria (funil)
+            stage_field (str): Coluna do estágio
+        """
+        self.total = len(data)
+        self.category_positions = {}
+        self.stage_positions = {}
+
+        if category_field in data.columns:
+            groups = data.groupby(category_field, observed=True, sort=True).indices
+            self.category_positions = {_plain(key): positions for key, positions in groups.items()}
+
+            if stage_field in data.columns:
+                pairs = data.groupby([category_field, stage_field], observed=True, sort=True).indices
+                for (category, stage), positions in pairs.items():
+                    self.stage_positions.setdefault(_plain(category), {})[_plain(stage)] = positions
+
+        self.category_options = list(self.category_positions)
+        self.stage_options = {category: list(stages) for category, stages in self.stage_positions.items()}
+        self.category_counts = {category: len(positions) for category, positions in self.category_positions.items()}
+        self.stage_counts = {
+            category: {stage: len(positions) for stage, positions in stages.items()}
+            for category, stages in self.stage_positions.items()
+        }
+
+    def positions(self, category=ALL_OPTION, stage=ALL_OPTION):
+        """
+        Retorna as posições das linhas que atendem ao filtro
+
+        Args:
+            category: Categoria selecionada (ou "Todos")
+            stage: Estágio selecionado (ou "Todos")
+
+        Returns:
+            numpy.ndarray: Posições das linhas, ou None se não houver filtro
+        """
+        if category == ALL_OPTION:
+            return None
+        if stage == ALL_OPTION:
+            return self.category_positions.get(category, _EMPTY)
+        return self.stage_positions.get(category, {}).get(stage, _EMPTY)
+
+    def select(self, data, category=ALL_OPTION, stage=ALL_OPTION):
+        """
+        Aplica o filtro ao DataFrame do snapshot
+
+        Args:
+            data (pd.DataFrame): Dados do snapshot usado para construir o índice
+            category: Categoria selecionada (ou "Todos")
+            stage: Estágio selecionado (ou "Todos")
+
+        Returns:
+            pandas.DataFrame: Linhas filtradas (o próprio data se não houver filtro)
+        """
+        positions = self.positions(category, stage)
+        if positions is None:
+            return data
+        return data.iloc[positions]
+
+    def options(self):
+        """
+        Opções dos filtros: cada categoria com a lista dos seus estágios
+
+        Returns:
+            dict: Categoria -> lista de estágios
+        """
+        return {category: self.stage_options.get(category, []) for category in self.category_options}
+
+    def count(self, category=ALL_OPTION, stage=ALL_OPTION):
+        """
+        Número de linhas que atendem ao filtro, sem materializá-las
+        """
+        positions = self.positions(category, stage)
+        return self.total if positions is None else len(positions)
+
+_EMPTY = np.array([], dtype=np.intp)
+
+def _plain(value):
+    """
+    Converte escalares numpy/pandas em tipos Python (int, str) para as opções
+    """
+    return value.item() if hasattr(value, "item") else value
+
+def get_filter_index(snapshot):
+    """
+    Retorna o índice de filtros do snapshot, construindo-o na primeira vez
+
+    Args:
+        snapshot (Snapshot): Snapshot de negócios
+
+    Returns:
+        FilterIndex: Índice do snapshot
+    """
+    return snapshot.derived("filter_index", lambda: FilterIndex(snapshot.data))
@@ -0,0 +1,255 @@
+import random
+import time
+import requests
+from app.utils.perf import span
+from app.utils.request_scheduler import current_priority
+from app.utils.portal_registry import get_portal
+
+# Timeout padrão (conexão, leitura) em segundos
+DEFAULT_TIMEOUT = (5, 60)
+
+# Número máximo de novas tentativas após a primeira requisição
+DEFAULT_MAX_RETRIES = 4
+
+# Limites do backoff exponencial (segundos)
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 20.0
+
+# Status HTTP que indicam falha temporária
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# Códigos de erro do Bitrix24 que indicam limite de requisições ou sobrecarga
+RATE_LIMIT_ERRORS = {"QUERY_LIMIT_EXCEEDED", "OPERATION_TIME_LIMIT", "INTERNAL_SERVER_ERROR"}
+
+# Códigos que indicam excesso de requisições do portal (reduzem a taxa do escalonador)
+QUERY_LIMIT_ERRORS = {"QUERY_LIMIT_EXCEEDED"}
+
+class BitrixAPIError(RuntimeError):
+    """
+    Erro retornado pela API do Bitrix24 (campo "error" da resposta)
+    """
+
+    def __init__(self, code, description=""):
+        super().__init__(f"{code}: {description}" if description else str(code))
+        self.code = code
+        self.description = description
+
+def get_session(url):
+    """
+    Retorna a sessão HTTP do portal de uma URL
+
+    Cada portal tem seu próprio pool de conexões keep-alive (ver
+    portal_registry), então um portal lento não ocupa as conexões dos outros.
+
+    Args:
+        url (str): URL de uma requisição ao Bitrix24
+
+    Returns:
+        requests.Session: Sessão HTTP do portal
+    """
+    return get_portal(url).session
+
+def _error_code(response):
+    """
+    Extrai o código de erro do Bitrix24 de uma resposta, se houver
+
+    Args:
+        response (requests.Response): Resposta HTTP
+
+    Returns:
+        str: Código de erro (ex: QUERY_LIMIT_EXCEEDED) ou None
+    """
+    if "json" not in response.headers.get("Content-Type", ""):
+        return None
+    try:
+        payload = response.json()
+    except ValueError:
+        return None
+    if isinstance(payload, dict):
+        return payload.get("error")
+    return None
+
+def _is_retryable(response):
+    """
+    Verifica se uma resposta indica falha temporária
+
+    Args:
+        response (requests.Response): Resposta HTTP
+
+    Returns:
+        bool: True se a requisição deve ser repetida
+    """
+    if response.status_code in RETRY_STATUS:
+        return True
+    if response.status_code >= 400:
+        return _error_code(response) in RATE_LIMIT_ERRORS
+    return False
+
+def _is_query_limit(response):
+    """
+    Verifica se uma resposta indica que o portal recusou por excesso de requisições
+
+    Args:
+        response (requests.Response): Resposta HTTP
+
+    Returns:
+        bool: True para 429 ou QUERY_LIMIT_EXCEEDED
+    """
+    if response.status_code == 429:
+        return True
+    return response.status_code >= 400 and _error_code(response) in QUERY_LIMIT_ERRORS
+
+def _retry_after(response):
+    """
+    Valor do cabeçalho Retry-After em segundos, se for numérico
+    """
+    try:
+        return float(response.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+def backoff_delay(attempt, retry_after=None):
+    """
+    Calcula a espera antes de uma nova tentativa (backoff exponencial com jitter)
+
+    Args:
+        attempt (int): Número da tentativa que falhou (0 para a primeira)
+        retry_after (str): Valor do cabeçalho Retry-After, se enviado pelo servidor
+
+    Returns:
+        float: Tempo de espera em segundos
+    """
+    if retry_after:
+        try:
+            return min(float(retry_after), BACKOFF_CAP)
+        except ValueError:
+            pass
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * (2 ** attempt)))
+
+def bitrix_request(method, url, params=None, data=None, timeout=DEFAULT_TIMEOUT,
+                   max_retries=DEFAULT_MAX_RETRIES, stream=False):
+    """
+    Executa uma requisição ao Bitrix24 pela sessão do portal
+
+    Falhas de conexão, timeouts, status 429/5xx e erros de limite do
+    Bitrix24 (QUERY_LIMIT_EXCEEDED) são repetidos com backoff exponencial.
+    Outras respostas, inclusive de erro, são devolvidas para quem chamou.
+
+    Cada tentativa usa o pool de conexões do portal e passa pelo escalonador
+    dele, na prioridade do contexto atual (request_priority); erros de
+    limite reduzem a taxa do portal.
+    Com o portal fora do ar (disjuntor aberto após falhas seguidas), a
+    requisição falha na hora com CircuitOpenError.
+
+    Args:
+        method (str): Método HTTP (GET ou POST)
+        url (str): URL completa
+        params (list|dict): Parâmetros da query string
+        data (list|dict): Corpo da requisição (form-encoded)
+        timeout (tuple): Timeout (conexão, leitura) em segundos
+        max_retries (int): Número máximo de novas tentativas
+        stream (bool): Se True, não lê o corpo da resposta antecipadamente
+
+    Returns:
+        requests.Response: Resposta HTTP da última tentativa
+    """
+    with span("fetch") as info:
+        response = _send_with_retries(method, url, params, data, timeout, max_retries, stream)
+        # Com stream=True o corpo ainda não foi lido; quem lê conta os bytes
+        if not stream:
+            info["bytes"] = len(response.content)
+        return response
+
+def _send_with_retries(method, url, params, data, timeout, max_retries, stream):
+    """
+    Laço de tentativas de bitrix_request
+
+    O disjuntor vê a requisição inteira: é consultado uma vez antes da
+    primeira tentativa e recebe um único resultado depois da última, de
+    modo que as novas tentativas de uma mesma requisição não o abrem sozinhas.
+    """
+    portal = get_portal(url)
+    breaker = portal.breaker
+    breaker.before_request()
+    try:
+        response = _attempts(portal, method, url, params, data, timeout, max_retries, stream)
+    except Exception:
+        # Tentativas esgotadas (conexão, timeout) ou outra falha (ex:
+        # ChunkedEncodingError); sem registrar, o disjuntor ficaria meio aberto
+        breaker.record_failure()
+        raise
+
+    # Limite de requisições não é falha: o portal está no ar, só sobrecarregado
+    if response.status_code >= 500 and not _is_query_limit(response):
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+    return response
+
+def _attempts(portal, method, url, params, data, timeout, max_retries, stream):
+    """
+    Executa as tentativas de uma requisição, com backoff entre elas
+
+    Returns:
+        requests.Response: Resposta da última tentativa
+    """
+    session = portal.session
+    scheduler = portal.scheduler
+    priority = current_priority()
+    attempt = 0
+    while True:
+        scheduler.acquire(priority)
+        try:
+            response = session.request(method, url, params=params, data=data,
+                                       timeout=timeout, stream=stream)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt >= max_retries:
+                raise
+            time.sleep(backoff_delay(attempt))
+            attempt += 1
+            continue
+
+        if _is_query_limit(response):
+            # Portal sobrecarregado: reduz a taxa do escalonador
+            scheduler.report_limited(_retry_after(response))
+        else:
+            scheduler.report_success()
+        
+        if attempt >= max_retries or not _is_retryable(response):
+            return response
+
+        delay = backoff_delay(attempt, response.headers.get("Retry-After"))
+        response.close()
+        time.sleep(delay)
+        attempt += 1
+
+def bitrix_json(method, url, params=None, data=None, **kwargs):
+    """
+    Executa uma requisição ao Bitrix24 e retorna o JSON da resposta
+
+    Args:
+        method (str): Método HTTP (GET ou POST)
+        url (str): URL completa
+        params (list|dict): Parâmetros da query string
+        data (list|dict): Corpo da requisição (form-encoded)
+
+    Returns:
+        dict|list: Conteúdo JSON da resposta
+
+    Raises:
+        BitrixAPIError: Se a API retornar um erro
+        requests.HTTPError: Se o status HTTP indicar falha sem erro do Bitrix24
+    """
+    response = bitrix_request(method, url, params=params, data=data, **kwargs)
+    try:
+        with span("parse", nbytes=len(response.content)) as info:
+            payload = response.json()
+            if isinstance(payload, dict) and isinstance(payload.get("result"), list):
+                info["rows"] = len(payload["result"])
+    except ValueError:
+        response.raise_for_status()
+        raise
+    if isinstance(payload, dict) and payload.get("error"):
+        raise BitrixAPIError(payload["error"], payload.get("error_description", ""))
+    response.raise_for_status()
+    return payload
@@ -0,0 +1,190 @@
+import json
+import os
+import threading
+from datetime import date, datetime, timedelta
+from app.utils.filter_index import get_filter_index
+from app.utils.snapshot_store import store_name
+
+# Diretório dos agregados diários dos indicadores
+KPI_STORE_DIR = "app/data/kpis"
+
+# Dias de agregados mantidos por snapshot
+KPI_HISTORY_DAYS = 90
+
+# Sufixos dos estágios finais do Bitrix24 (WON, C2:WON, LOSE, C2:APOLOGY...)
+WON_STAGES = {"WON"}
+LOST_STAGES = {"LOSE", "APOLOGY"}
+
+def stage_outcome(stage):
+    """
+    Classifica um estágio como ganho, perdido ou em andamento
+
+    Usa os estágios finais padrão do Bitrix24; estágios de falha criados
+    pelo usuário (ex: C2:1) contam como em andamento.
+
+    Args:
+        stage (str): STAGE_ID do negócio
+
+    Returns:
+        str: "won", "lost" ou None
+    """
+    suffix = str(stage).rsplit(":", 1)[-1]
+    if suffix in WON_STAGES:
+        return "won"
+    if suffix in LOST_STAGES:
+        return "lost"
+    return None
+
+def compute_kpis(snapshot):
+    """
+    Calcula os agregados dos indicadores de um snapshot, uma única vez
+
+    As contagens vêm do índice de filtros (uma contagem por estágio, já
+    usado pelas páginas), então uma nova versão do snapshot custa apenas a
+    soma dos grupos, sem percorrer as linhas para cada indicador.
+
+    Args:
+        snapshot (Snapshot): Snapshot de negócios
+
+    Returns:
+        dict: total, active (em andamento), won e lost
+    """
+    # O índice é obtido antes: derived não pode ser chamado de dentro de outro builder
+    index = get_filter_index(snapshot)
+    return snapshot.derived("kpis", lambda: _aggregate(index))
+
+def _aggregate(index):
+    """
+    Soma as contagens por estágio do índice em agregados
+    """
+    outcomes = {"won": 0, "lost": 0}
+    for stages in index.stage_counts.values():
+        for stage, count in stages.items():
+            outcome = stage_outcome(stage)
+            if outcome is not None:
+                outcomes[outcome] += count
+    return {
+        "total": index.total,
+        "active": index.total - outcomes["won"] - outcomes["lost"],
+        "won": outcomes["won"],
+        "lost": outcomes["lost"],
+    }
+
+def conversion_rate(aggregates):
+    """
+    Percentual de ganhos entre os negócios encerrados
+
+    Args:
+        aggregates (dict): Resultado de compute_kpis
+
+    Returns:
+        float: Conversão em % (None sem negócios encerrados)
+    """
+    closed = aggregates["won"] + aggregates["lost"]
+    return aggregates["won"] / closed * 100 if closed else None
+
+class KpiHistory:
+    """
+    Agregados diários dos indicadores de um snapshot, gravados em JSON
+
+    Cada dia guarda os agregados do último snapshot daquele dia; as
+    variações exibidas comparam o dia atual com o dia anterior registrado,
+    inclusive depois de um reinício do servidor.
+    """
+
+    def __init__(self, name, directory=KPI_STORE_DIR, keep_days=KPI_HISTORY_DAYS):
+        """
+        Args:
+            name (str): Nome do snapshot (ver store_name)
+            directory (str): Diretório dos arquivos
+            keep_days (int): Dias mantidos no arquivo
+        """
+        self.path = os.path.join(directory, f"{name}.json")
+        self.keep_days = keep_days
+        self._days = None
+        self._lock = threading.Lock()
+
+    def record(self, day, aggregates):
+        """
+        Registra os agregados de um dia, gravando o arquivo se mudaram
+
+        Args:
+            day (date): Dia dos agregados
+            aggregates (dict): Resultado de compute_kpis
+        """
+        with self._lock:
+            days = self._load()
+            if days.get(day.isoformat()) == aggregates:
+                return
+            days[day.isoformat()] = dict(aggregates)
+            oldest = (day - timedelta(days=self.keep_days)).isoformat()
+            for stale in [stored for stored in days if stored < oldest]:
+                del days[stale]
+            self._save(days)
+
+    def previous(self, day):
+        """
+        Agregados do último dia registrado antes de day
+
+        Args:
+            day (date): Dia atual
+
+        Returns:
+            tuple: (dia, agregados) ou None se não houver registro anterior
+        """
+        with self._lock:
+            days = self._load()
+            earlier = [stored for stored in days if stored < day.isoformat()]
+            if not earlier:
+                return None
+            latest = max(earlier)
+            return date.fromisoformat(latest), days[latest]
+
+    def _load(self):
+        if self._days is None:
+            try:
+                with open(self.path) as f:
+                    self._days = json.load(f)
+            except (OSError, ValueError):
+                self._days = {}
+        return self._days
+
+    def _save(self, days):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(days, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            # Sem disco (ex: Streamlit Cloud) os agregados ficam só em memória
+            pass
+
+# Históricos por snapshot, compartilhados por todas as sessões
+_histories = {}
+_lock = threading.Lock()
+
+def get_kpis(snapshot, key):
+    """
+    Retorna os indicadores de um snapshot e os do período anterior
+
+    Os agregados do snapshot são registrados no dia em que ele foi
+    carregado; a comparação é com o último dia registrado antes desse.
+
+    Args:
+        snapshot (Snapshot): Snapshot de negócios (já em memória)
+        key (tuple): Chave do snapshot, usada no nome do arquivo de histórico
+
+    Returns:
+        tuple: (agregados atuais, (dia, agregados) anteriores ou None)
+    """
+    name = store_name(key)
+    with _lock:
+        history = _histories.get(name)
+        if history is None:
+            history = _histories[name] = KpiHistory(name)
+
+    current = compute_kpis(snapshot)
+    day = datetime.fromtimestamp(snapshot.loaded_at).date()
+    history.record(day, current)
+    return current, history.previous(day)
@@ -0,0 +1,57 @@
+import pandas as pd
+
+# Campo personalizado com a descrição da pendência
+PENDENCIAS_FIELD = "UF_CRM_PENDENCIAS"
+
+# Colunas derivadas, calculadas uma vez na carga do snapshot
+HAS_PENDENCIA_COLUMN = "TEM_PENDENCIA"
+PENDENCIA_TYPE_COLUMN = "TIPO_PENDENCIA"
+
+def add_pendencia_columns(data, field=PENDENCIAS_FIELD):
+    """
+    Adiciona ao DataFrame a máscara de pendência e o tipo normalizado
+
+    TEM_PENDENCIA é True quando o campo tem texto além de espaços;
+    TIPO_PENDENCIA é o texto sem espaços nas pontas, como categórico
+    (nulo quando não há pendência). As páginas filtram e contam usando
+    essas colunas, sem percorrer as linhas em Python a cada rerun.
+
+    Args:
+        data (pd.DataFrame): Negócios
+        field (str): Nome do campo de pendências
+
+    Returns:
+        pandas.DataFrame: Novo DataFrame com as colunas derivadas
+    """
+    if data is None or field not in data.columns:
+        return data
+
+    text = data[field].astype("string").str.strip()
+    has_pendencia = (text.notna() & (text != "")).fillna(False).astype(bool)
+    pendencia_type = text.where(has_pendencia).astype("category")
+
+    return data.assign(**{
+        HAS_PENDENCIA_COLUMN: has_pendencia,
+        PENDENCIA_TYPE_COLUMN: pendencia_type,
+    })
+
+def pendencia_mask(data, field=PENDENCIAS_FIELD):
+    """
+    Retorna a máscara booleana de registros com pendência
+
+    Usa a coluna pré-calculada quando existir; caso contrário calcula a
+    máscara de forma vetorizada.
+
+    Args:
+        data (pd.DataFrame): Negócios
+        field (str): Nome do campo de pendências
+
+    Returns:
+        pandas.Series: True para registros com pendência
+    """
+    if HAS_PENDENCIA_COLUMN in data.columns:
+        return data[HAS_PENDENCIA_COLUMN]
+    if field not in data.columns:
+        return pd.Series(False, index=data.index)
+    text = data[field].astype("string").str.strip()
+    return (text.notna() & (text != "")).fillna(False).astype(bool)
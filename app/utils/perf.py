@@ -0,0 +1,226 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+
+# Etapas instrumentadas, na ordem do caminho dos dados
+STAGES = ["fetch", "parse", "build", "merge", "filter", "aggregate", "render"]
+
+# Número de medições mantidas por etapa para as estatísticas móveis
+ROLLING_WINDOW = 500
+
+# Intervalo (segundos) entre gravações das estatísticas móveis no log
+LOG_INTERVAL = 60
+
+# Log estruturado (uma linha JSON por evento)
+PERF_LOG_PATH = "app/data/logs/perf.jsonl"
+PERF_LOG_MAX_BYTES = 5 * 1024 * 1024
+PERF_LOG_BACKUPS = 3
+
+logger = logging.getLogger("jusgestante.perf")
+
+_local = threading.local()
+_samples = defaultdict(lambda: deque(maxlen=ROLLING_WINDOW))
+_samples_lock = threading.Lock()
+_last_log = time.monotonic()
+
+class Trace:
+    """
+    Medições de um rerun de página
+
+    Cada span registra o tempo total (com as etapas internas) e o tempo
+    próprio (sem as etapas internas), então a soma dos tempos próprios
+    mostra para onde foi o tempo do rerun sem contar nada duas vezes.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.started = time.perf_counter()
+        self.finished = None
+        self.spans = []
+
+    @property
+    def elapsed(self):
+        end = self.finished if self.finished is not None else time.perf_counter()
+        return end - self.started
+
+    def breakdown(self):
+        """
+        Soma os spans do rerun por etapa
+
+        Returns:
+            list: Um dict por etapa (stage, calls, seconds, self_seconds, rows, bytes)
+        """
+        totals = {}
+        for stage, seconds, self_seconds, rows, size in self.spans:
+            entry = totals.setdefault(stage, {
+                "stage": stage, "calls": 0, "seconds": 0.0, "self_seconds": 0.0, "rows": 0, "bytes": 0
+            })
+            entry["calls"] += 1
+            entry["seconds"] += seconds
+            entry["self_seconds"] += self_seconds
+            entry["rows"] += rows or 0
+            entry["bytes"] += size or 0
+        return sorted(totals.values(), key=lambda entry: _stage_order(entry["stage"]))
+
+def start_trace(name):
+    """
+    Inicia a medição de um rerun na thread atual
+
+    Args:
+        name (str): Nome da página
+
+    Returns:
+        Trace: Medições do rerun
+    """
+    _local.trace = Trace(name)
+    return _local.trace
+
+def current_trace():
+    """
+    Retorna as medições do rerun em andamento na thread atual (ou None)
+    """
+    return getattr(_local, "trace", None)
+
+def finish_trace():
+    """
+    Encerra a medição do rerun atual e grava o resumo no log
+
+    Returns:
+        Trace: Medições do rerun encerrado (ou None se não havia nenhum)
+    """
+    trace = current_trace()
+    if trace is None:
+        return None
+    _local.trace = None
+    trace.finished = time.perf_counter()
+    stages = [
+        {**entry, "seconds": round(entry["seconds"], 6), "self_seconds": round(entry["self_seconds"], 6)}
+        for entry in trace.breakdown()
+    ]
+    _log("rerun", page=trace.name, seconds=round(trace.elapsed, 4), stages=stages)
+    return trace
+
+@contextmanager
+def span(stage, rows=None, nbytes=None):
+    """
+    Mede o tempo de uma etapa
+
+    O dict devolvido pode receber "rows" e "bytes" dentro do bloco, quando
+    esses números só são conhecidos no fim. Spans em threads auxiliares
+    (ex: batches em paralelo) entram só nas estatísticas móveis.
+
+    Args:
+        stage (str): Etapa (ver STAGES)
+        rows (int): Linhas processadas
+        nbytes (int): Bytes transferidos
+
+    Yields:
+        dict: Contadores da etapa ("rows", "bytes")
+    """
+    info = {"rows": rows, "bytes": nbytes}
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    stack.append(0.0)
+    started = time.perf_counter()
+    try:
+        yield info
+    finally:
+        seconds = time.perf_counter() - started
+        child_seconds = stack.pop()
+        if stack:
+            stack[-1] += seconds
+        _record(stage, seconds, seconds - child_seconds, info["rows"], info["bytes"])
+
+def _record(stage, seconds, self_seconds, rows, size):
+    """
+    Guarda uma medição no rerun atual e nas estatísticas móveis
+    """
+    global _last_log
+    trace = current_trace()
+    if trace is not None:
+        trace.spans.append((stage, seconds, self_seconds, rows, size))
+
+    with _samples_lock:
+        _samples[stage].append((seconds, self_seconds, rows or 0, size or 0))
+        now = time.monotonic()
+        due = now - _last_log >= LOG_INTERVAL
+        if due:
+            _last_log = now
+    if due:
+        _log("rolling", stages=rolling_stats())
+
+def rolling_stats():
+    """
+    Estatísticas das últimas medições de cada etapa, em todas as sessões
+
+    Returns:
+        dict: Etapa -> count, p50, p95, max, self_mean (segundos), rows e bytes
+    """
+    with _samples_lock:
+        samples = {stage: list(values) for stage, values in _samples.items()}
+
+    stats = {}
+    for stage in sorted(samples, key=_stage_order):
+        values = samples[stage]
+        durations = sorted(value[0] for value in values)
+        stats[stage] = {
+            "count": len(values),
+            "p50": round(_percentile(durations, 0.50), 4),
+            "p95": round(_percentile(durations, 0.95), 4),
+            "max": round(durations[-1], 4),
+            "self_mean": round(sum(value[1] for value in values) / len(values), 4),
+            "rows": sum(value[2] for value in values),
+            "bytes": sum(value[3] for value in values),
+        }
+    return stats
+
+def reset_stats():
+    """
+    Descarta as estatísticas móveis
+    """
+    with _samples_lock:
+        _samples.clear()
+
+def _percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def _stage_order(stage):
+    return STAGES.index(stage) if stage in STAGES else len(STAGES)
+
+def _log(event, **fields):
+    """
+    Grava um evento como uma linha JSON no log de desempenho
+    """
+    _ensure_log_handler()
+    fields = {"event": event, "time": time.strftime("%Y-%m-%dT%H:%M:%S"), **fields}
+    logger.info(json.dumps(fields, ensure_ascii=False))
+
+_handler_lock = threading.Lock()
+
+def _ensure_log_handler():
+    """
+    Configura o arquivo do log na primeira gravação
+    """
+    if logger.handlers:
+        return
+    with _handler_lock:
+        if logger.handlers:
+            return
+        try:
+            os.makedirs(os.path.dirname(PERF_LOG_PATH), exist_ok=True)
+            handler = RotatingFileHandler(PERF_LOG_PATH, maxBytes=PERF_LOG_MAX_BYTES,
+                                          backupCount=PERF_LOG_BACKUPS, encoding="utf-8")
+        except OSError:
+            # Sem permissão de escrita (ex: Streamlit Cloud): descarta o log
+            handler = logging.NullHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
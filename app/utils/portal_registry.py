@@ -0,0 +1,215 @@
+import os
+import re
+import threading
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from app.utils.request_scheduler import (RequestScheduler, DEFAULT_RATE, DEFAULT_BURST,
+                                         request_priority, PRIORITY_BACKGROUND)
+from app.utils.circuit_breaker import CircuitBreaker
+from app.utils.snapshot_cache import SnapshotCache
+from app.utils.snapshot_store import SnapshotStore, DEFAULT_STORE_DIR
+from app.utils.query_cache import query_cache
+
+# Tamanho do pool de conexões de cada portal
+POOL_SIZE = 16
+
+# Orçamento de memória dos snapshots de cada portal, com o estado auxiliar deles (MB); 0 para ilimitado
+MEMORY_BUDGET_ENV = "BITRIX_PORTAL_MEMORY_MB"
+DEFAULT_MEMORY_BUDGET_MB = 1024
+
+# Tipos de API de um portal
+API_REST = "rest"
+API_BICONNECTOR = "biconnector"
+
+def portal_key(url):
+    """
+    Identifica o portal de uma URL: host e tipo de API
+
+    A REST API e o BI Connector de uma mesma conta têm limites e dados
+    próprios, então contam como portais distintos.
+
+    Args:
+        url (str): URL de uma requisição ao Bitrix24
+
+    Returns:
+        tuple: (host, "rest" ou "biconnector")
+    """
+    parts = urlsplit(url)
+    api_type = API_BICONNECTOR if "/biconnector/" in parts.path else API_REST
+    return parts.netloc, api_type
+
+def default_memory_budget():
+    """
+    Orçamento de memória padrão por portal, em bytes (None para ilimitado)
+    """
+    megabytes = int(os.environ.get(MEMORY_BUDGET_ENV) or DEFAULT_MEMORY_BUDGET_MB)
+    return megabytes * 1024 * 1024 if megabytes > 0 else None
+
+class Portal:
+    """
+    Recursos de um portal Bitrix24, isolados dos demais
+
+    Cada portal tem seu pool de conexões, seu escalonador de requisições,
+    seu disjuntor, seu cache de snapshots (com orçamento de memória próprio,
+    então um portal grande não descarta os dados de outro) e seu diretório
+    de snapshots em disco.
+    """
+
+    def __init__(self, key, rate=DEFAULT_RATE, burst=DEFAULT_BURST, memory_budget=None):
+        """
+        Args:
+            key (tuple): (host, tipo de API), de portal_key
+            rate (float): Requisições por segundo (None para não limitar)
+            burst (int): Rajada máxima de requisições
+            memory_budget (int): Bytes de snapshots em memória (None para ilimitado)
+        """
+        self.key = key
+        self.host, self.api_type = key
+        self.session = _new_session()
+        self.scheduler = RequestScheduler(rate, burst)
+        self.breaker = CircuitBreaker(self.host)
+        # Atualizações em segundo plano cedem a vez às cargas que alguém espera
+        self.snapshots = SnapshotCache(background_context=lambda: request_priority(PRIORITY_BACKGROUND),
+                                       max_bytes=memory_budget, attached_bytes=self._attached_bytes)
+        self.snapshots.add_listener(self._snapshot_replaced)
+        self.store = SnapshotStore(os.path.join(DEFAULT_STORE_DIR, self.name))
+        # Armazenamentos incrementais de negócios (deal_sync.DealStore) por URL, projeção e recorte
+        self.deal_stores = {}
+
+    @property
+    def name(self):
+        """
+        Nome seguro para arquivos e exibição (ex: conta_bitrix24_com_br_rest)
+        """
+        return re.sub(r"[^A-Za-z0-9_]+", "_", f"{self.host}_{self.api_type}")
+
+    def stats(self):
+        """
+        Retorna as métricas do portal
+
+        Returns:
+            dict: memory (uso do cache de snapshots, com o estado auxiliar),
+                scheduler, breaker e deal_stores
+        """
+        return {
+            "memory": self.snapshots.memory_usage(),
+            "scheduler": self.scheduler.stats(),
+            "breaker": self.breaker.stats(),
+            "deal_stores": len(self.deal_stores),
+        }
+
+    def _snapshot_replaced(self, key, old, new):
+        for callback in list(_snapshot_listeners):
+            callback(self, key, old, new)
+
+    def _attached_bytes(self, key, snapshot):
+        return sum(callback(self, key, snapshot) for callback in list(_memory_reporters))
+
+def _new_session():
+    """
+    Cria a sessão HTTP de um portal
+
+    A sessão mantém conexões keep-alive em um pool, de modo que as
+    chamadas seguintes ao portal reaproveitam o handshake TLS.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({
+        "Accept": "application/json",
+        "Accept-Encoding": "gzip, deflate",
+    })
+    return session
+
+# Funções chamadas quando um snapshot de qualquer portal é substituído ou descartado;
+# resultados calculados sobre um snapshot deixam de valer junto com ele
+_snapshot_listeners = [lambda portal, key, old, new: query_cache.drop_version(old.version)]
+
+def add_snapshot_listener(callback):
+    """
+    Registra uma função chamada quando um snapshot de qualquer portal muda
+
+    Args:
+        callback (callable): Recebe (portal, key, snapshot_antigo, snapshot_novo);
+            snapshot_novo é None quando o antigo é descartado pelo orçamento de memória
+    """
+    _snapshot_listeners.append(callback)
+
+# Funções que informam a memória mantida fora do cache para um snapshot
+_memory_reporters = []
+
+def add_memory_reporter(callback):
+    """
+    Registra uma função que informa a memória auxiliar de um snapshot
+
+    Esses bytes contam no orçamento de memória do portal e devem ser
+    liberados quando o snapshot é descartado (ver add_snapshot_listener).
+
+    Args:
+        callback (callable): Recebe (portal, key, snapshot) e retorna os bytes
+            mantidos para a chave fora do DataFrame do snapshot
+    """
+    _memory_reporters.append(callback)
+
+# Portais do processo e limites configurados, por (host, tipo de API)
+_portals = {}
+_settings = {}
+_lock = threading.Lock()
+
+def get_portal(url):
+    """
+    Retorna os recursos do portal de uma URL, criando-os na primeira vez
+
+    Args:
+        url (str): URL de uma requisição ao Bitrix24
+
+    Returns:
+        Portal: Portal da URL
+    """
+    key = portal_key(url)
+    portal = _portals.get(key)
+    if portal is None:
+        with _lock:
+            portal = _portals.get(key)
+            if portal is None:
+                settings = _settings.get(key, {})
+                portal = _portals[key] = Portal(
+                    key,
+                    rate=settings.get("rate", DEFAULT_RATE),
+                    burst=settings.get("burst", DEFAULT_BURST),
+                    memory_budget=settings.get("memory_budget", default_memory_budget()),
+                )
+    return portal
+
+def configure_portal(url, rate=DEFAULT_RATE, burst=DEFAULT_BURST, memory_budget=None):
+    """
+    Define os limites de um portal (ex: planos com limite maior, ou rate=None
+    para não limitar um servidor local de testes)
+
+    Os recursos do portal são recriados com os novos limites.
+
+    Args:
+        url (str): URL do portal (o caminho define o tipo de API)
+        rate (float): Requisições por segundo (None para não limitar)
+        burst (int): Rajada máxima
+        memory_budget (int): Bytes de snapshots em memória (None para o padrão)
+    """
+    key = portal_key(url)
+    with _lock:
+        _settings[key] = {
+            "rate": rate,
+            "burst": burst,
+            "memory_budget": memory_budget if memory_budget is not None else default_memory_budget(),
+        }
+        _portals.pop(key, None)
+
+def get_portals():
+    """
+    Retorna os portais já usados pelo processo
+
+    Returns:
+        list: Portais (Portal)
+    """
+    return list(_portals.values())
@@ -0,0 +1,113 @@
+import threading
+from collections import OrderedDict
+
+# Número máximo de resultados guardados
+DEFAULT_MAX_ENTRIES = 512
+
+class QueryCache:
+    """
+    Cache LRU de resultados de consultas sobre snapshots
+
+    As chaves começam pela versão do snapshot, seguida do estado dos
+    filtros e do nome do agregado. Como um snapshot nunca muda, um
+    resultado só deixa de valer quando chega uma versão nova; nesse
+    momento drop_version remove os resultados da versão antiga.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key, compute):
+        """
+        Retorna o resultado guardado para a chave ou o calcula
+
+        Args:
+            key (tuple): (versão do snapshot, categoria, estágio, ..., nome do agregado)
+            compute (callable): Função sem argumentos que calcula o resultado
+
+        Returns:
+            object: Resultado da consulta
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        value = compute()
+
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def drop_version(self, version):
+        """
+        Remove os resultados de uma versão de snapshot
+
+        Args:
+            version (int): Versão substituída
+        """
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == version]:
+                del self._entries[key]
+
+    def clear(self):
+        """
+        Remove todos os resultados
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Retorna as métricas do cache
+
+        Returns:
+            dict: entries, hits e misses
+        """
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+# Cache compartilhado por todas as sessões do processo
+query_cache = QueryCache()
+
+def query_key(snapshot, category, stage):
+    """
+    Monta o prefixo de chave de uma consulta sobre um snapshot filtrado
+
+    Args:
+        snapshot (Snapshot): Snapshot consultado (None para dados sem versão)
+        category: Categoria selecionada
+        stage: Estágio selecionado
+
+    Returns:
+        tuple: (versão, categoria, estágio) ou None se não houver snapshot
+    """
+    if snapshot is None:
+        return None
+    return (snapshot.version, category, stage)
+
+def cached_query(key, name, compute, cache=None):
+    """
+    Calcula um agregado uma única vez por snapshot e estado de filtros
+
+    Args:
+        key (tuple): Prefixo de query_key (None desativa o cache)
+        name (str): Nome do agregado (ex: "pendencias_metrics")
+        compute (callable): Função sem argumentos que calcula o agregado
+        cache (QueryCache): Cache usado (None para o compartilhado, query_cache)
+
+    Returns:
+        object: Resultado do agregado
+    """
+    if key is None:
+        return compute()
+    return (cache or query_cache).get_or_compute(tuple(key) + (name,), compute)
@@ -0,0 +1,220 @@
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Classes de prioridade (menor valor é atendido primeiro)
+PRIORITY_INTERACTIVE = 0   # ações do usuário (ex: "Testar Conexão")
+PRIORITY_FOREGROUND = 1    # carga que uma página está esperando
+PRIORITY_BACKGROUND = 2    # sincronizações, pré-carregamento, eventos
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_FOREGROUND: "foreground",
+    PRIORITY_BACKGROUND: "background",
+}
+
+# Limite da REST API do Bitrix24 por portal: 2 requisições/s, rajada de 50
+DEFAULT_RATE = 2.0
+DEFAULT_BURST = 50
+
+# Fichas que a classe não pode consumir: o segundo plano deixa uma reserva
+# para que um clique do usuário não espere a fila esvaziar
+LANE_RESERVE = {
+    PRIORITY_INTERACTIVE: 0,
+    PRIORITY_FOREGROUND: 0,
+    PRIORITY_BACKGROUND: 10,
+}
+
+# Adaptação a erros de limite: a taxa cai pela metade e volta aos poucos
+MIN_RATE = 0.25
+RECOVERY_STEP = 0.1
+
+# Pausa de todas as requisições do portal após um erro de limite sem Retry-After (segundos)
+LIMIT_PAUSE = 1.0
+
+# Esperas guardadas por classe para os percentis
+WAIT_WINDOW = 500
+
+# Prioridade das requisições feitas no contexto atual
+_priority = contextvars.ContextVar("bitrix_request_priority", default=PRIORITY_FOREGROUND)
+
+@contextmanager
+def request_priority(priority):
+    """
+    Define a prioridade das requisições feitas dentro do bloco
+
+    Vale para a thread atual e para as buscas paralelas que ela dispara
+    (fetch_in_order copia o contexto para os workers).
+
+    Args:
+        priority (int): PRIORITY_INTERACTIVE, PRIORITY_FOREGROUND ou PRIORITY_BACKGROUND
+    """
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+def current_priority():
+    """
+    Retorna a prioridade das requisições do contexto atual
+    """
+    return _priority.get()
+
+class RequestScheduler:
+    """
+    Balde de fichas (token bucket) de um portal, com filas por prioridade
+
+    Cada requisição consome uma ficha; as fichas são repostas à taxa do
+    portal até o tamanho da rajada. Quando faltam fichas, as requisições
+    esperam em fila e a de maior prioridade é liberada primeiro. Um erro
+    de limite do portal reduz a taxa pela metade e pausa o portal; cada
+    resposta bem-sucedida devolve um pouco da taxa até o valor configurado.
+    """
+
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST):
+        """
+        Args:
+            rate (float): Requisições por segundo (None para não limitar)
+            burst (int): Fichas acumuladas no máximo
+        """
+        self.base_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.paused_until = 0.0
+        self.limited = 0
+        self._updated = time.monotonic()
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+        self._lanes = {priority: _LaneStats() for priority in PRIORITY_NAMES}
+
+    def acquire(self, priority=PRIORITY_FOREGROUND):
+        """
+        Espera a vez da requisição e consome uma ficha
+
+        Args:
+            priority (int): Classe de prioridade da requisição
+
+        Returns:
+            float: Tempo de espera em segundos
+        """
+        lane = self._lanes[priority]
+        started = time.monotonic()
+        entry = (priority, next(self._sequence))
+        with self._cond:
+            heapq.heappush(self._waiters, entry)
+            lane.waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    delay = self._delay(entry, now)
+                    if delay <= 0:
+                        break
+                    self._cond.wait(delay)
+                if self.rate is not None:
+                    self.tokens -= 1
+            finally:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                lane.waiting -= 1
+                self._cond.notify_all()
+
+        waited = time.monotonic() - started
+        lane.record(waited)
+        return waited
+
+    def report_limited(self, retry_after=None):
+        """
+        Registra um erro de limite do portal (ex: QUERY_LIMIT_EXCEEDED)
+
+        Args:
+            retry_after (float): Segundos pedidos pelo portal (None para LIMIT_PAUSE)
+        """
+        with self._cond:
+            self.limited += 1
+            if self.rate is None:
+                return
+            self.rate = max(MIN_RATE, self.rate / 2)
+            self.tokens = 0.0
+            pause = retry_after if retry_after is not None else LIMIT_PAUSE
+            self.paused_until = max(self.paused_until, time.monotonic() + pause)
+
+    def report_success(self):
+        """
+        Registra uma resposta sem erro de limite, recuperando a taxa aos poucos
+        """
+        if self.rate is None or self.rate >= self.base_rate:
+            return
+        with self._cond:
+            self.rate = min(self.base_rate, self.rate + RECOVERY_STEP)
+
+    def stats(self):
+        """
+        Retorna as métricas do portal
+
+        Returns:
+            dict: rate, tokens, limited e, por classe (lanes), waiting
+                (profundidade da fila), requests, wait_mean, wait_p95 e wait_max
+        """
+        with self._cond:
+            self._refill(time.monotonic())
+            return {
+                "rate": self.rate,
+                "tokens": self.tokens,
+                "limited": self.limited,
+                "lanes": {PRIORITY_NAMES[priority]: lane.summary() for priority, lane in self._lanes.items()},
+            }
+
+    def _refill(self, now):
+        if self.rate is not None:
+            self.tokens = min(float(self.burst), self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _delay(self, entry, now):
+        """
+        Segundos até a requisição poder seguir (0 se já pode)
+        """
+        if self.rate is None:
+            return 0.0
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self._waiters[0] != entry:
+            # Alguém na frente; acorda quando ele sair da fila
+            return 1.0
+        reserve = min(LANE_RESERVE[entry[0]], self.burst - 1)
+        needed = 1 + reserve - self.tokens
+        return needed / self.rate if needed > 0 else 0.0
+
+class _LaneStats:
+    """
+    Métricas de espera de uma classe de prioridade
+    """
+
+    def __init__(self):
+        self.waiting = 0
+        self.requests = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.recent = deque(maxlen=WAIT_WINDOW)
+
+    def record(self, waited):
+        self.requests += 1
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+        self.recent.append(waited)
+
+    def summary(self):
+        recent = sorted(self.recent)
+        return {
+            "waiting": self.waiting,
+            "requests": self.requests,
+            "wait_mean": self.wait_total / self.requests if self.requests else 0.0,
+            "wait_p95": recent[min(len(recent) - 1, int(len(recent) * 0.95))] if recent else 0.0,
+            "wait_max": self.wait_max,
+        }
@@ -0,0 +1,207 @@
+import threading
+import time
+import pandas as pd
+from app.utils.http_client import bitrix_json
+
+# Tempo (segundos) que os metadados de campos ficam em cache
+FIELDS_TTL = 24 * 3600
+
+# Tipos conhecidos dos campos de negócio, usados quando crm.deal.fields
+# não está disponível (ex: BI Connector) ou não traz o campo
+DEFAULT_DEAL_FIELD_TYPES = {
+    "ID": "integer",
+    "DEAL_ID": "integer",
+    "CATEGORY_ID": "crm_category",
+    "STAGE_ID": "crm_status",
+    "STAGE_SEMANTIC_ID": "char",
+    "ASSIGNED_BY_ID": "user",
+    "CONTACT_ID": "crm_contact",
+    "COMPANY_ID": "crm_company",
+    "OPPORTUNITY": "double",
+    "CURRENCY_ID": "crm_currency",
+    "DATE_CREATE": "datetime",
+    "DATE_MODIFY": "datetime",
+    "BEGINDATE": "date",
+    "CLOSEDATE": "date",
+    "CLOSED": "char",
+    "UF_CRM_DATA_MARCADA": "datetime",
+}
+
+# Tipo do Bitrix24 -> conversão aplicada na carga
+_TYPE_CONVERSIONS = {
+    "integer": "int",
+    "user": "int",
+    "crm_contact": "int",
+    "crm_company": "int",
+    "crm_lead": "int",
+    "crm_category": "int_category",
+    "crm_status": "category",
+    "crm_currency": "category",
+    "char": "category",
+    "double": "float",
+    "datetime": "datetime",
+    "date": "datetime",
+}
+
+# Conversão -> tipo aplicado por bloco na leitura em stream (stream_parser);
+# categorias de inteiros chegam como Int64 e viram categóricas em apply_deal_schema
+_STREAM_DTYPES = {
+    "int": "Int64",
+    "int_category": "Int64",
+    "category": "category",
+    "float": "float64",
+    "datetime": "datetime64[ns]",
+}
+
+_fields_cache = {}
+_fields_lock = threading.Lock()
+
+def get_deal_fields(config):
+    """
+    Retorna os metadados dos campos de negócio (tipo de cada campo)
+
+    Na REST API os metadados vêm de crm.deal.fields e ficam em cache por
+    FIELDS_TTL; no BI Connector, ou se a chamada falhar, são usados os
+    tipos conhecidos de DEFAULT_DEAL_FIELD_TYPES.
+
+    Args:
+        config (dict): Configuração de conexão (com "urls")
+
+    Returns:
+        dict: Nome do campo -> tipo do Bitrix24 (ex: "integer", "crm_status")
+    """
+    fields = dict(DEFAULT_DEAL_FIELD_TYPES)
+    url = (config.get("urls") or {}).get("crm_deal_fields")
+    if not url:
+        return fields
+
+    with _fields_lock:
+        cached = _fields_cache.get(url)
+    if cached and time.time() - cached[0] < FIELDS_TTL:
+        fields.update(cached[1])
+        return fields
+
+    try:
+        payload = bitrix_json("GET", url)
+        remote = {
+            name: meta.get("type", "string")
+            for name, meta in (payload.get("result") or {}).items()
+            # Campos múltiplos chegam como listas e não são convertidos
+            if not meta.get("isMultiple")
+        }
+    except Exception:
+        # Sem metadados remotos: os tipos conhecidos continuam valendo
+        return fields
+
+    with _fields_lock:
+        _fields_cache[url] = (time.time(), remote)
+    fields.update(remote)
+    return fields
+
+def clear_deal_fields_cache():
+    """
+    Descarta os metadados de campos em cache (ex: para medir uma carga fria)
+    """
+    with _fields_lock:
+        _fields_cache.clear()
+
+def apply_deal_schema(data, fields=None):
+    """
+    Converte as colunas de um DataFrame de negócios para tipos nativos
+
+    IDs viram inteiros anuláveis (Int64), categoria e estágio viram
+    categóricos e campos de data viram datetime64. Colunas sem tipo
+    conhecido ficam como estão.
+
+    Args:
+        data (pd.DataFrame): Negócios como retornados pela API
+        fields (dict): Nome do campo -> tipo do Bitrix24 (None para os tipos conhecidos)
+
+    Returns:
+        pandas.DataFrame: Novo DataFrame com as colunas convertidas
+    """
+    if data is None or data.empty:
+        return data
+
+    fields = fields or DEFAULT_DEAL_FIELD_TYPES
+    converted = {}
+    for column in data.columns:
+        conversion = _TYPE_CONVERSIONS.get(fields.get(column))
+        if conversion is None:
+            continue
+        converted[column] = _convert(data[column], conversion)
+
+    if not converted:
+        return data
+    return data.assign(**converted)
+
+def stream_dtypes(fields=None, columns=None):
+    """
+    Tipos por coluna para ler uma tabela em blocos (read_table_stream)
+
+    Com eles cada bloco já chega convertido e a concatenação não passa por
+    colunas object; apply_deal_schema depois só completa o que faltar.
+
+    Args:
+        fields (dict): Nome do campo -> tipo do Bitrix24 (None para os tipos conhecidos)
+        columns (list): Colunas lidas (None para todas as do cabeçalho)
+
+    Returns:
+        dict: Nome da coluna -> tipo (ex: {"ID": "Int64"})
+    """
+    fields = fields or DEFAULT_DEAL_FIELD_TYPES
+    names = columns if columns is not None else fields
+    dtypes = {}
+    for name in names:
+        dtype = _STREAM_DTYPES.get(_TYPE_CONVERSIONS.get(fields.get(name)))
+        if dtype is not None:
+            dtypes[name] = dtype
+    return dtypes
+
+def _convert(values, conversion):
+    """
+    Aplica uma conversão de tipo a uma coluna
+
+    Args:
+        values (pd.Series): Coluna original
+        conversion (str): int, int_category, category, float ou datetime
+
+    Returns:
+        pandas.Series: Coluna convertida
+    """
+    if conversion == "int":
+        if pd.api.types.is_integer_dtype(values.dtype):
+            return values.astype("Int64")
+        return pd.to_numeric(values, errors="coerce").astype("Int64")
+    if conversion == "int_category":
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            return values
+        return pd.to_numeric(values, errors="coerce").astype("Int64").astype("category")
+    if conversion == "category":
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            return values
+        return values.replace("", None).astype("category")
+    if conversion == "float":
+        return pd.to_numeric(values, errors="coerce")
+    if conversion == "datetime":
+        if pd.api.types.is_datetime64_any_dtype(values.dtype):
+            return values
+        return to_local_datetime(values)
+    return values
+
+def to_local_datetime(values):
+    """
+    Converte datas do Bitrix24 em datetime64 sem fuso
+
+    A REST API envia datas com o fuso do portal (ex: +03:00) e o BI
+    Connector, sem fuso; o sufixo é removido para que ambos representem
+    o horário local do portal.
+
+    Args:
+        values (pd.Series): Datas como texto
+
+    Returns:
+        pandas.Series: Datas em datetime64[ns]
+    """
+    text = values.astype("string").str.replace(r"(Z|[+-]\d{2}:?\d{2})$", "", regex=True)
+    return pd.to_datetime(text, errors="coerce", format="mixed")
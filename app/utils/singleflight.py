@@ -0,0 +1,89 @@
+import threading
+
+class _Call:
+    """
+    Busca em andamento, compartilhada por todos que pediram a mesma chave
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """
+    Agrupa chamadas simultâneas para a mesma chave em uma única execução
+
+    A primeira chamada para uma chave executa a função; as que chegam
+    enquanto ela está em andamento esperam e recebem o mesmo resultado
+    (ou a mesma exceção). Depois que a execução termina, a próxima
+    chamada para a chave executa de novo.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.executions = 0
+        self.shared = 0
+
+    def do(self, key, fn):
+        """
+        Executa fn para a chave, ou espera a execução já em andamento
+
+        Args:
+            key (hashable): Identificador da busca (ex: conta, endpoint, projeção, filtro)
+            fn (callable): Função sem argumentos que faz a busca
+
+        Returns:
+            object: Resultado de fn
+        """
+        with self._lock:
+            self.requests += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self.executions += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result
+
+    def in_flight(self):
+        """
+        Número de buscas em andamento
+        """
+        return len(self._calls)
+
+    def stats(self):
+        """
+        Retorna as métricas de deduplicação
+
+        Returns:
+            dict: requests (chamadas recebidas), executions (buscas feitas)
+                e shared (buscas economizadas)
+        """
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "executions": self.executions,
+                "shared": self.shared,
+                "in_flight": len(self._calls),
+            }
@@ -0,0 +1,301 @@
+import itertools
+import threading
+import time
+from contextlib import nullcontext
+
+# Idade (segundos) a partir da qual um snapshot é atualizado em segundo plano
+DEFAULT_SNAPSHOT_TTL = 300
+
+# Contador global de versões, compartilhado por todas as chaves
+_versions = itertools.count(1)
+
+class Snapshot:
+    """
+    Versão imutável de um conjunto de dados carregado do Bitrix24
+
+    O DataFrame é compartilhado entre todas as sessões e não deve ser
+    alterado; filtros e colunas novas devem gerar outro DataFrame.
+    """
+
+    def __init__(self, data, version=None, loaded_at=None):
+        self.data = data
+        self.version = version if version is not None else next(_versions)
+        self.loaded_at = loaded_at if loaded_at is not None else time.time()
+        self.last_used = time.monotonic()
+        self._nbytes = None
+        self._derived = {}
+        self._derived_lock = threading.Lock()
+
+    def derived(self, name, builder):
+        """
+        Retorna uma estrutura derivada do snapshot, construída uma única vez
+
+        Índices e agregados que dependem apenas dos dados ficam guardados
+        no próprio snapshot e somem junto com ele.
+
+        Args:
+            name (str): Nome da estrutura (ex: "filter_index")
+            builder (callable): Função sem argumentos que constrói a estrutura
+
+        Returns:
+            object: Estrutura derivada
+        """
+        value = self._derived.get(name)
+        if value is None:
+            with self._derived_lock:
+                value = self._derived.get(name)
+                if value is None:
+                    value = builder()
+                    self._derived[name] = value
+        return value
+
+    @property
+    def age(self):
+        """
+        Idade do snapshot em segundos
+        """
+        return time.time() - self.loaded_at
+
+    @property
+    def nbytes(self):
+        """
+        Memória ocupada pelo DataFrame (calculada uma única vez)
+        """
+        if self._nbytes is None:
+            self._nbytes = int(self.data.memory_usage(index=True, deep=True).sum())
+        return self._nbytes
+
+class SnapshotCache:
+    """
+    Cache de snapshots por processo, no modelo stale-while-revalidate
+
+    Enquanto existir um snapshot para a chave ele é devolvido na hora,
+    mesmo que esteja vencido; nesse caso uma única thread em segundo plano
+    carrega a versão nova e a publica quando estiver pronta. Apenas a
+    primeira carga de uma chave bloqueia quem pediu.
+
+    Com um orçamento de memória, publicar um snapshot que o ultrapasse
+    descarta os snapshots de outras chaves usados há mais tempo. O estado
+    auxiliar mantido fora do cache para uma chave (ex: o armazenamento
+    incremental) conta no orçamento junto com o snapshot dela.
+    """
+
+    def __init__(self, ttl=DEFAULT_SNAPSHOT_TTL, background_context=None, max_bytes=None,
+                 attached_bytes=None):
+        """
+        Args:
+            ttl (int): Idade padrão a partir da qual o snapshot é atualizado
+            background_context (callable): Retorna um context manager aplicado
+                às atualizações em segundo plano (ex: prioridade das requisições)
+            max_bytes (int): Orçamento de memória dos snapshots (None para ilimitado)
+            attached_bytes (callable): Recebe (chave, snapshot) e retorna os bytes
+                mantidos fora do cache para a chave, liberados quando o snapshot
+                é descartado (None para nenhum)
+        """
+        self.ttl = ttl
+        self.background_context = background_context or nullcontext
+        self.max_bytes = max_bytes
+        self.attached_bytes = attached_bytes or (lambda key, snapshot: 0)
+        self.evictions = 0
+        self._snapshots = {}
+        self._refreshing = set()
+        self._errors = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def add_listener(self, callback):
+        """
+        Registra uma função chamada quando um snapshot é substituído
+
+        Args:
+            callback (callable): Recebe (key, snapshot_antigo, snapshot_novo);
+                snapshot_novo é None quando o antigo é descartado pelo orçamento
+        """
+        self._listeners.append(callback)
+
+    def get(self, key, loader, ttl=None):
+        """
+        Retorna o snapshot da chave, carregando-o se necessário
+
+        Args:
+            key (hashable): Identificador do conjunto de dados
+            loader (callable): Função sem argumentos que retorna o DataFrame
+            ttl (int): Idade máxima antes da atualização em segundo plano
+
+        Returns:
+            Snapshot: Snapshot atual (possivelmente vencido)
+
+        Raises:
+            Exception: Erro do loader, apenas na primeira carga da chave
+        """
+        ttl = self.ttl if ttl is None else ttl
+        snapshot = self._snapshots.get(key)
+        if snapshot is None:
+            return self.refresh(key, loader)
+
+        snapshot.last_used = time.monotonic()
+        if snapshot.age >= ttl:
+            self._refresh_in_background(key, loader)
+        return snapshot
+
+    def peek(self, key):
+        """
+        Retorna o snapshot da chave sem carregar nem atualizar
+
+        Args:
+            key (hashable): Identificador do conjunto de dados
+
+        Returns:
+            Snapshot: Snapshot atual ou None
+        """
+        snapshot = self._snapshots.get(key)
+        if snapshot is not None:
+            snapshot.last_used = time.monotonic()
+        return snapshot
+
+    def keys(self):
+        """
+        Retorna as chaves com snapshot publicado
+        """
+        return list(self._snapshots)
+
+    def put(self, key, data, loaded_at=None):
+        """
+        Publica um novo snapshot para a chave
+
+        Args:
+            key (hashable): Identificador do conjunto de dados
+            data (pd.DataFrame): Dados do novo snapshot
+            loaded_at (float): Momento em que os dados foram obtidos do
+                Bitrix24 (padrão: agora; ex: data de gravação em disco)
+
+        Returns:
+            Snapshot: Snapshot publicado
+        """
+        with self._lock:
+            # Cargas deduplicadas ou sincronizações sem alterações devolvem
+            # o mesmo DataFrame: mantém a versão e só renova a idade
+            current = self._snapshots.get(key)
+            if current is not None and current.data is data:
+                current.loaded_at = time.time()
+                return current
+            snapshot = Snapshot(data, loaded_at=loaded_at)
+            self._snapshots[key] = snapshot
+            self._errors.pop(key, None)
+
+        if current is not None:
+            self._notify(key, current, snapshot)
+        if self.max_bytes is not None:
+            self._enforce_budget(key)
+        return snapshot
+
+    def refresh(self, key, loader):
+        """
+        Carrega e publica um novo snapshot, bloqueando até terminar
+
+        Args:
+            key (hashable): Identificador do conjunto de dados
+            loader (callable): Função sem argumentos que retorna o DataFrame
+
+        Returns:
+            Snapshot: Snapshot publicado
+        """
+        return self.put(key, loader())
+
+    def invalidate(self, key=None):
+        """
+        Descarta o snapshot de uma chave (ou de todas)
+
+        Args:
+            key (hashable): Chave a descartar (None para todas)
+        """
+        with self._lock:
+            if key is None:
+                self._snapshots.clear()
+                self._errors.clear()
+            else:
+                self._snapshots.pop(key, None)
+                self._errors.pop(key, None)
+
+    def memory_usage(self):
+        """
+        Retorna o uso de memória dos snapshots
+
+        Returns:
+            dict: snapshots, bytes (snapshots e estado auxiliar), attached_bytes
+                (só o estado auxiliar), max_bytes e evictions (descartes pelo orçamento)
+        """
+        snapshots = list(self._snapshots.items())
+        attached = sum(self.attached_bytes(key, snapshot) for key, snapshot in snapshots)
+        return {
+            "snapshots": len(snapshots),
+            "bytes": sum(snapshot.nbytes for _, snapshot in snapshots) + attached,
+            "attached_bytes": attached,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+        }
+
+    def is_refreshing(self, key):
+        """
+        Indica se há uma atualização em segundo plano para a chave
+        """
+        return key in self._refreshing
+
+    def last_error(self, key):
+        """
+        Retorna o erro da última atualização em segundo plano que falhou
+        """
+        return self._errors.get(key)
+
+    def _notify(self, key, old, new):
+        for callback in self._listeners:
+            callback(key, old, new)
+
+    def _enforce_budget(self, keep):
+        """
+        Descarta os snapshots usados há mais tempo até caber no orçamento
+
+        O snapshot recém-publicado (keep) nunca é descartado, mesmo que
+        sozinho ultrapasse o orçamento.
+        """
+        # O tamanho é calculado fora da trava (percorre as colunas de texto)
+        sizes = {key: snapshot.nbytes + self.attached_bytes(key, snapshot)
+                 for key, snapshot in list(self._snapshots.items())}
+        evicted = []
+        with self._lock:
+            total = sum(sizes.get(key, 0) for key in self._snapshots)
+            candidates = [key for key in self._snapshots if key != keep and key not in self._refreshing]
+            candidates.sort(key=lambda key: self._snapshots[key].last_used)
+            for key in candidates:
+                if total <= self.max_bytes:
+                    break
+                snapshot = self._snapshots.pop(key)
+                self._errors.pop(key, None)
+                total -= sizes.get(key, snapshot.nbytes)
+                self.evictions += 1
+                evicted.append((key, snapshot))
+
+        for key, snapshot in evicted:
+            self._notify(key, snapshot, None)
+
+    def _refresh_in_background(self, key, loader):
+        """
+        Inicia a atualização da chave em uma thread, se ainda não houver uma
+        """
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def run():
+            try:
+                with self.background_context():
+                    self.refresh(key, loader)
+            except Exception as e:
+                # Mantém o último snapshot bom; o erro fica disponível para exibição
+                self._errors[key] = e
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=run, name="snapshot-refresh", daemon=True).start()
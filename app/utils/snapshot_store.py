@@ -0,0 +1,134 @@
+import hashlib
+import os
+import re
+import time
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+# Diretório padrão dos snapshots em disco
+DEFAULT_STORE_DIR = "app/data/snapshots"
+
+# Número de versões mantidas por conjunto de dados
+DEFAULT_KEEP = 3
+
+# Idade máxima (segundos) de um snapshot em disco para ser usado na partida
+DEFAULT_MAX_AGE = 24 * 3600
+
+_SUFFIX = ".arrow"
+
+class SnapshotStore:
+    """
+    Armazena snapshots de negócios em disco no formato Arrow IPC
+
+    Cada snapshot é gravado em um arquivo temporário e renomeado de forma
+    atômica, então um leitor nunca vê um arquivo pela metade. Na partida o
+    arquivo mais recente é aberto com memory-map, o que evita baixar tudo
+    do Bitrix24 de novo após um reinício do servidor.
+    """
+
+    def __init__(self, directory=DEFAULT_STORE_DIR, keep=DEFAULT_KEEP):
+        """
+        Args:
+            directory (str): Diretório dos arquivos
+            keep (int): Número de versões mantidas por conjunto de dados
+        """
+        self.directory = directory
+        self.keep = keep
+
+    def save(self, name, data, version=0):
+        """
+        Grava um snapshot e remove as versões mais antigas que o limite
+
+        Args:
+            name (str): Nome do conjunto de dados (ver store_name)
+            data (pd.DataFrame): Dados do snapshot
+            version (int): Versão do snapshot em memória
+
+        Returns:
+            str: Caminho do arquivo gravado
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        saved_at = time.time()
+        filename = f"{name}-{int(saved_at * 1000)}-{version}{_SUFFIX}"
+        path = os.path.join(self.directory, filename)
+        tmp_path = f"{path}.tmp"
+
+        table = pa.Table.from_pandas(data, preserve_index=False)
+
+        # Sem compressão, para que a leitura possa usar memory-map
+        with pa.OSFile(tmp_path, "wb") as sink:
+            with ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, path)
+
+        self._prune(name)
+        return path
+
+    def load_latest(self, name, max_age=DEFAULT_MAX_AGE):
+        """
+        Abre o snapshot mais recente de um conjunto de dados
+
+        Args:
+            name (str): Nome do conjunto de dados
+            max_age (int): Idade máxima em segundos (None para qualquer idade)
+
+        Returns:
+            tuple: (DataFrame, saved_at) ou None se não houver snapshot válido
+        """
+        for path in self._versions(name):
+            saved_at = _saved_at(path)
+            if max_age is not None and time.time() - saved_at > max_age:
+                return None
+            try:
+                with pa.memory_map(path, "r") as source:
+                    table = ipc.open_file(source).read_all()
+                return table.to_pandas(), saved_at
+            except (OSError, pa.ArrowInvalid):
+                # Arquivo corrompido: tenta a versão anterior
+                continue
+        return None
+
+    def _versions(self, name):
+        """
+        Lista os arquivos de um conjunto de dados, do mais novo para o mais antigo
+        """
+        if not os.path.isdir(self.directory):
+            return []
+        prefix = f"{name}-"
+        files = [
+            os.path.join(self.directory, filename)
+            for filename in os.listdir(self.directory)
+            if filename.startswith(prefix) and filename.endswith(_SUFFIX)
+        ]
+        return sorted(files, key=_saved_at, reverse=True)
+
+    def _prune(self, name):
+        """
+        Remove as versões além do limite configurado
+        """
+        for path in self._versions(name)[self.keep:]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+def _saved_at(path):
+    """
+    Extrai o instante de gravação do nome do arquivo (milissegundos)
+    """
+    match = re.search(r"-(\d+)-\d+" + re.escape(_SUFFIX) + "$", path)
+    return int(match.group(1)) / 1000 if match else 0.0
+
+def store_name(key):
+    """
+    Converte a chave de um snapshot em um nome de arquivo seguro
+
+    Args:
+        key (tuple): Chave do snapshot (ex: conta, tipo de API, colunas)
+
+    Returns:
+        str: Nome legível seguido de um hash da chave completa
+    """
+    readable = re.sub(r"[^A-Za-z0-9_]+", "_", "_".join(str(part) for part in key[:2]))
+    digest = hashlib.sha1(repr(key).encode()).hexdigest()[:12]
+    return f"{readable}_{digest}"
@@ -0,0 +1,231 @@
+import codecs
+import json
+import pandas as pd
+from pandas.api.types import union_categoricals
+from app.utils.perf import span
+from app.utils.schema import to_local_datetime
+
+# Número de linhas convertidas em DataFrame por vez
+DEFAULT_CHUNK_ROWS = 50000
+
+# Tamanho dos blocos lidos da resposta HTTP (bytes)
+READ_CHUNK_BYTES = 256 * 1024
+
+_WHITESPACE = " \t\r\n"
+
+class StreamFormatError(ValueError):
+    """
+    Resposta que não é um array JSON de linhas (ex: objeto de erro)
+    """
+
+    def __init__(self, payload):
+        super().__init__("A resposta não é uma lista de linhas")
+        self.payload = payload
+
+def iter_json_rows(chunks):
+    """
+    Itera sobre os elementos de um array JSON à medida que os bytes chegam
+
+    Apenas o elemento em processamento fica no buffer, então a memória
+    usada não depende do tamanho total da resposta.
+
+    Args:
+        chunks (iterable): Blocos de bytes da resposta (ex: response.iter_content())
+
+    Yields:
+        list|dict: Cada elemento do array externo
+
+    Raises:
+        StreamFormatError: Se o conteúdo não for um array JSON
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    chunks = iter(chunks)
+    buffer = ""
+    pos = 0
+    started = False
+    exhausted = False
+
+    while True:
+        # Pular espaços (e, dentro do array, as vírgulas entre elementos)
+        skip = _WHITESPACE + "," if started else _WHITESPACE
+        while pos < len(buffer) and buffer[pos] in skip:
+            pos += 1
+
+        if pos < len(buffer):
+            if not started:
+                if buffer[pos] != "[":
+                    # Não é um array: ler o restante e devolver como erro
+                    rest = buffer[pos:] + "".join(text_decoder.decode(c) for c in chunks)
+                    try:
+                        payload = json.loads(rest)
+                    except ValueError:
+                        payload = rest[:200]
+                    raise StreamFormatError(payload)
+                started = True
+                pos += 1
+                continue
+
+            if buffer[pos] == "]":
+                return
+
+            try:
+                element, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # Elemento incompleto: precisa de mais dados
+                if exhausted:
+                    raise
+            else:
+                # Um número no fim do buffer pode continuar no próximo bloco
+                if end < len(buffer) or exhausted or isinstance(element, (list, dict)):
+                    pos = end
+                    yield element
+                    continue
+        elif exhausted:
+            if started:
+                raise ValueError("Array JSON incompleto na resposta")
+            return
+
+        # Descartar o que já foi consumido e ler o próximo bloco
+        buffer = buffer[pos:]
+        pos = 0
+        try:
+            buffer += text_decoder.decode(next(chunks))
+        except StopIteration:
+            buffer += text_decoder.decode(b"", final=True)
+            exhausted = True
+
+def iter_table_chunks(rows, columns=None, dtypes=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Agrupa linhas de uma tabela do BI Connector em DataFrames tipados
+
+    A primeira linha é o cabeçalho e define o esquema; as demais são
+    convertidas em blocos de chunk_rows linhas. Apenas as colunas pedidas
+    são mantidas e os tipos informados são aplicados em cada bloco.
+
+    Args:
+        rows (iterable): Linhas da tabela (cabeçalho primeiro)
+        columns (list): Colunas a manter (None para todas)
+        dtypes (dict): Tipos por coluna (ex: {"ID": "Int64"})
+        chunk_rows (int): Número de linhas por bloco
+
+    Yields:
+        pandas.DataFrame: Blocos da tabela
+    """
+    rows = iter(rows)
+    try:
+        header = next(rows)
+    except StopIteration:
+        return
+
+    # Tabelas no formato de lista de objetos (sem cabeçalho)
+    if isinstance(header, dict):
+        records = [header]
+        for record in rows:
+            records.append(record)
+            if len(records) >= chunk_rows:
+                yield _typed_frame(pd.DataFrame.from_records(records, columns=columns), dtypes)
+                records = []
+        if records:
+            yield _typed_frame(pd.DataFrame.from_records(records, columns=columns), dtypes)
+        return
+
+    header = [str(name) for name in header]
+    if columns is None:
+        positions = list(range(len(header)))
+    else:
+        positions = [header.index(name) for name in columns if name in header]
+    names = [header[i] for i in positions]
+    keep_all = positions == list(range(len(header)))
+
+    buffer = []
+    for row in rows:
+        buffer.append(row if keep_all else [row[i] if i < len(row) else None for i in positions])
+        if len(buffer) >= chunk_rows:
+            yield _typed_frame(pd.DataFrame(buffer, columns=names), dtypes)
+            buffer = []
+
+    if buffer or names:
+        yield _typed_frame(pd.DataFrame(buffer, columns=names), dtypes)
+
+def read_table_stream(response, columns=None, dtypes=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Lê uma tabela do BI Connector diretamente do stream da resposta HTTP
+
+    Args:
+        response (requests.Response): Resposta aberta com stream=True
+        columns (list): Colunas a manter (None para todas)
+        dtypes (dict): Tipos por coluna
+        chunk_rows (int): Número de linhas por bloco
+
+    Returns:
+        pandas.DataFrame: Tabela completa
+    """
+    # Download e parse acontecem juntos, então o tempo desta etapa inclui a rede
+    with span("parse") as info:
+        try:
+            body = _counted(response.iter_content(chunk_size=READ_CHUNK_BYTES), info)
+            rows = iter_json_rows(body)
+            chunks = list(iter_table_chunks(rows, columns=columns, dtypes=dtypes, chunk_rows=chunk_rows))
+        finally:
+            response.close()
+
+        if not chunks:
+            return pd.DataFrame()
+        if len(chunks) > 1:
+            _unify_categories(chunks, dtypes)
+        data = chunks[0] if len(chunks) == 1 else pd.concat(chunks, ignore_index=True)
+        info["rows"] = len(data)
+    return data
+
+def _unify_categories(chunks, dtypes):
+    """
+    Dá às colunas categóricas de todos os blocos as mesmas categorias
+
+    Cada bloco já chega categórico, com as categorias que viu; com a união
+    delas em todos os blocos, pd.concat mantém a coluna categórica (com
+    categorias diferentes ela voltaria a ser object).
+    """
+    for name, dtype in (dtypes or {}).items():
+        if dtype != "category" or name not in chunks[0].columns:
+            continue
+        categories = union_categoricals([chunk[name] for chunk in chunks]).categories
+        for chunk in chunks:
+            chunk[name] = chunk[name].cat.set_categories(categories)
+
+def _counted(chunks, info):
+    """
+    Repassa os blocos da resposta somando os bytes em info["bytes"]
+    """
+    info["bytes"] = 0
+    for chunk in chunks:
+        info["bytes"] += len(chunk)
+        yield chunk
+
+def _typed_frame(frame, dtypes):
+    """
+    Aplica os tipos declarados às colunas de um bloco
+
+    Args:
+        frame (pd.DataFrame): Bloco da tabela
+        dtypes (dict): Tipos por coluna
+
+    Returns:
+        pandas.DataFrame: Bloco com as colunas convertidas
+    """
+    if not dtypes:
+        return frame
+    for name, dtype in dtypes.items():
+        if name not in frame.columns:
+            continue
+        if dtype == "category":
+            # Texto vazio conta como ausente; cada bloco guarda só os códigos
+            frame[name] = frame[name].replace("", None).astype("category")
+        if dtype in ("Int64", "Int32", "float64", "float32"):
+            frame[name] = pd.to_numeric(frame[name], errors="coerce").astype(dtype)
+        elif dtype == "datetime64[ns]":
+            # Sem o sufixo de fuso, como em apply_deal_schema
+            frame[name] = to_local_datetime(frame[name])
+        else:
+            frame[name] = frame[name].astype(dtype)
+    return frame
@@ -0,0 +1,158 @@
+import os
+import numpy as np
+import pandas as pd
+from app.utils.schema import apply_deal_schema
+from app.utils.pendencias import add_pendencia_columns
+from app.utils.deal_join import DealUfJoin
+
+# Semente padrão: a mesma semente (e a mesma data de referência) gera os mesmos dados
+DEFAULT_SEED = 42
+
+# Funis: COMERCIAL (0) e TRÂMITES ADMINISTRATIVO (2), com a participação de cada um
+CATEGORY_WEIGHTS = {0: 0.4, 2: 0.6}
+
+# Estágios de cada funil e a fração dos negócios em cada estágio
+STAGE_WEIGHTS = {
+    0: {"C0:NEW": 0.35, "C0:PREPARATION": 0.25, "C0:WON": 0.25, "C0:LOSE": 0.15},
+    2: {"C2:NEW": 0.20, "C2:PREPARATION": 0.35, "C2:EXECUTING": 0.25, "C2:WON": 0.12, "C2:LOSE": 0.08},
+}
+
+# Chance de um negócio ter pendência, pelo sufixo do estágio
+PENDENCIA_RATE = {"NEW": 0.40, "PREPARATION": 0.70, "EXECUTING": 0.30, "WON": 0.05, "LOSE": 0.10}
+
+# Tipos de pendência e a frequência de cada um
+PENDENCIA_WEIGHTS = {
+    "Pendência documento": 0.40,
+    "Pendência pagamento": 0.25,
+    "Pendência contrato": 0.20,
+    "Pendência assinatura": 0.15,
+}
+
+# Chance de um negócio ter data marcada, pelo sufixo do estágio
+DATA_MARCADA_RATE = {"NEW": 0.10, "PREPARATION": 0.45, "EXECUTING": 0.50, "WON": 0.20, "LOSE": 0.02}
+
+# Período coberto pelas datas de criação (dias antes da data de referência)
+HISTORY_DAYS = 730
+
+# Dias à frente em que as datas marcadas podem cair
+SCHEDULE_DAYS = 60
+
+DEAL_COLUMNS = ["ID", "TITLE", "CATEGORY_ID", "STAGE_ID", "DATE_CREATE", "DATE_MODIFY"]
+UF_COLUMNS = ["DEAL_ID", "UF_CRM_PENDENCIAS", "UF_CRM_DATA_MARCADA"]
+
+def generate_deals(num_deals, seed=DEFAULT_SEED, now=None):
+    """
+    Gera negócios (crm_deal) e seus campos personalizados (crm_deal_uf)
+
+    Tudo é calculado com operações vetorizadas do numpy, então milhões de
+    negócios são gerados em poucos segundos. As distribuições de funil,
+    estágio e pendência seguem as constantes deste módulo; as datas de
+    criação ficam mais concentradas no período recente.
+
+    Args:
+        num_deals (int): Número de negócios
+        seed (int): Semente do gerador aleatório
+        now (pd.Timestamp): Data de referência (None para o início do dia atual)
+
+    Returns:
+        tuple: (negócios, campos personalizados), já com os tipos de apply_deal_schema
+    """
+    rng = np.random.default_rng(seed)
+    now = pd.Timestamp(now) if now is not None else pd.Timestamp.now().normalize()
+    ids = np.arange(1, num_deals + 1, dtype=np.int64)
+
+    categories = np.array(list(CATEGORY_WEIGHTS), dtype=np.int64)
+    category = rng.choice(categories, size=num_deals, p=list(CATEGORY_WEIGHTS.values()))
+
+    # Estágio sorteado dentro do funil de cada negócio
+    stage_names = [stage for stages in STAGE_WEIGHTS.values() for stage in stages]
+    stage_code = np.empty(num_deals, dtype=np.int16)
+    offset = 0
+    for category_id, stages in STAGE_WEIGHTS.items():
+        mask = category == category_id
+        stage_code[mask] = offset + rng.choice(len(stages), size=int(mask.sum()), p=list(stages.values()))
+        offset += len(stages)
+    stage_suffix = [stage.split(":")[1] for stage in stage_names]
+
+    # Criação: beta(2, 1) concentra os negócios nos meses mais recentes
+    reference = np.datetime64(now, "s")
+    history = HISTORY_DAYS * 86400
+    created_offset = (rng.beta(2, 1, size=num_deals) * history).astype("timedelta64[s]")
+    date_create = reference - np.timedelta64(history, "s") + created_offset
+    # Última alteração: alguns dias depois da criação, nunca no futuro
+    modified_offset = rng.exponential(7 * 86400, size=num_deals).astype("timedelta64[s]")
+    date_modify = np.minimum(date_create + modified_offset, reference)
+
+    # Pendência: chance por estágio, tipo sorteado pelos pesos
+    has_pendencia = rng.random(num_deals) < _rate_by_stage(stage_code, stage_suffix, PENDENCIA_RATE)
+    pendencia_names = np.array([""] + list(PENDENCIA_WEIGHTS), dtype=object)
+    pendencia_code = np.where(
+        has_pendencia,
+        1 + rng.choice(len(PENDENCIA_WEIGHTS), size=num_deals, p=list(PENDENCIA_WEIGHTS.values())),
+        0
+    )
+
+    # Data marcada: até SCHEDULE_DAYS à frente, em horário comercial de 15 em 15 minutos
+    has_data_marcada = rng.random(num_deals) < _rate_by_stage(stage_code, stage_suffix, DATA_MARCADA_RATE)
+    days_ahead = rng.integers(1, SCHEDULE_DAYS + 1, size=num_deals) * 86400
+    slot = rng.integers(8 * 4, 18 * 4, size=num_deals) * 900
+    data_marcada = reference + (days_ahead + slot).astype("timedelta64[s]")
+    data_marcada = np.where(has_data_marcada, data_marcada, np.datetime64("NaT"))
+
+    deals = pd.DataFrame({
+        "ID": ids,
+        "TITLE": "Negócio " + pd.Series(ids).astype(str),
+        "CATEGORY_ID": category,
+        "STAGE_ID": pd.Categorical.from_codes(stage_code, categories=stage_names),
+        "DATE_CREATE": np.asarray(date_create, dtype="datetime64[ns]"),
+        "DATE_MODIFY": np.asarray(date_modify, dtype="datetime64[ns]"),
+    })
+    uf = pd.DataFrame({
+        "DEAL_ID": ids,
+        "UF_CRM_PENDENCIAS": pd.Categorical.from_codes(pendencia_code, categories=pendencia_names),
+        "UF_CRM_DATA_MARCADA": data_marcada.astype("datetime64[ns]"),
+    })
+    return apply_deal_schema(deals), apply_deal_schema(uf)
+
+def _rate_by_stage(stage_code, stage_suffix, rates):
+    """
+    Converte o código de estágio de cada negócio na probabilidade do seu sufixo
+    """
+    return np.array([rates[suffix] for suffix in stage_suffix])[stage_code]
+
+def simulated_deals(num_deals, seed=DEFAULT_SEED, now=None):
+    """
+    Negócios sintéticos já unidos aos campos personalizados, no formato de
+    um snapshot carregado (com TEM_PENDENCIA e TIPO_PENDENCIA)
+
+    Args:
+        num_deals (int): Número de negócios
+        seed (int): Semente do gerador aleatório
+        now (pd.Timestamp): Data de referência (None para o início do dia atual)
+
+    Returns:
+        pandas.DataFrame: Negócios simulados
+    """
+    deals, uf = generate_deals(num_deals, seed=seed, now=now)
+    return add_pendencia_columns(DealUfJoin().build(deals, uf))
+
+def write_parquet(directory, num_deals, seed=DEFAULT_SEED, now=None):
+    """
+    Gera negócios sintéticos e grava crm_deal.parquet e crm_deal_uf.parquet
+
+    Args:
+        directory (str): Diretório de saída
+        num_deals (int): Número de negócios
+        seed (int): Semente do gerador aleatório
+        now (pd.Timestamp): Data de referência (None para o início do dia atual)
+
+    Returns:
+        dict: Tabela -> caminho do arquivo gravado
+    """
+    os.makedirs(directory, exist_ok=True)
+    deals, uf = generate_deals(num_deals, seed=seed, now=now)
+    paths = {}
+    for table, data in (("crm_deal", deals), ("crm_deal_uf", uf)):
+        paths[table] = os.path.join(directory, f"{table}.parquet")
+        data.to_parquet(paths[table], index=False)
+    return paths
@@ -0,0 +1,97 @@
+import threading
+import time
+from app.utils.bitrix_api import warm_deal_snapshot, deal_snapshot_key
+from app.utils.snapshot_cache import DEFAULT_SNAPSHOT_TTL
+from app.utils.request_scheduler import request_priority, PRIORITY_BACKGROUND
+
+# Projeção usada pelas páginas de pendências; com as mesmas colunas o
+# pré-carregamento preenche o mesmo snapshot que elas vão ler
+WARMUP_COLUMNS = ['ID', 'TITLE', 'CATEGORY_ID', 'STAGE_ID', 'UF_CRM_PENDENCIAS', 'UF_CRM_DATA_MARCADA']
+
+# Etapas do pré-carregamento: (descrição, progresso ao entrar na etapa)
+PHASES = {
+    "pending": ("Aguardando", 0.0),
+    "restore": ("Lendo snapshot salvo em disco", 0.1),
+    "download": ("Buscando negócios no Bitrix24", 0.3),
+    "done": ("Dados prontos", 1.0),
+    "error": ("Falha ao carregar", 1.0),
+}
+
+class Warmup:
+    """
+    Estado de um pré-carregamento de negócios em segundo plano
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.phase = "pending"
+        self.started_at = time.time()
+        self.finished_at = None
+        self.snapshot = None
+        self.error = None
+
+    @property
+    def running(self):
+        return self.finished_at is None
+
+    @property
+    def elapsed(self):
+        return (self.finished_at or time.time()) - self.started_at
+
+    @property
+    def label(self):
+        return PHASES[self.phase][0]
+
+    @property
+    def progress(self):
+        return PHASES[self.phase][1]
+
+# Pré-carregamentos por snapshot, compartilhados por todas as sessões
+_warmups = {}
+_lock = threading.Lock()
+
+def start_warmup(config, columns=WARMUP_COLUMNS, ttl=DEFAULT_SNAPSHOT_TTL):
+    """
+    Inicia o pré-carregamento do snapshot de negócios em uma thread
+
+    Se já houver um pré-carregamento em andamento, ou um concluído há
+    menos de ttl segundos, ele é devolvido sem iniciar outro.
+
+    Args:
+        config (dict): Configuração de conexão (com "urls")
+        columns (list): Colunas do snapshot
+        ttl (int): Idade a partir da qual o snapshot é recarregado
+
+    Returns:
+        Warmup: Estado do pré-carregamento
+    """
+    key = deal_snapshot_key(config, columns)
+    with _lock:
+        current = _warmups.get(key)
+        if current is not None and (current.running or (
+                current.error is None and time.time() - current.finished_at < ttl)):
+            return current
+        warmup = _warmups[key] = Warmup(key)
+
+    def run():
+        def on_phase(phase):
+            warmup.phase = phase
+        try:
+            # Pré-carregamento não deve atrasar as páginas que o usuário abrir
+            with request_priority(PRIORITY_BACKGROUND):
+                warmup.snapshot = warm_deal_snapshot(config, columns, ttl=ttl, on_phase=on_phase)
+            warmup.phase = "done"
+        except Exception as e:
+            warmup.error = e
+            warmup.phase = "error"
+        finally:
+            warmup.finished_at = time.time()
+
+    threading.Thread(target=run, name="deal-warmup", daemon=True).start()
+    return warmup
+
+def get_warmup(config, columns=WARMUP_COLUMNS):
+    """
+    Retorna o último pré-carregamento do snapshot (ou None)
+    """
+    return _warmups.get(deal_snapshot_key(config, columns))
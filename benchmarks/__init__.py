@@ -0,0 +1 @@
+# Este arquivo permite que a pasta seja reconhecida como um pacote Python 
\ No newline at end of file
@@ -0,0 +1,221 @@
+# Benchmark de ponta a ponta da ingestão de negócios, usando o stand-in
+# local do Bitrix24 (benchmarks/bitrix_standin.py).
+#
+# Para cada tamanho e tipo de API faz uma carga fria de load_deals (o
+# caminho usado pelas páginas) e mede as etapas:
+#     fetch      download (REST: páginas via batch, com o JSON de cada uma;
+#                BI: abertura das tabelas)
+#     parse      leitura das tabelas (BI: em streaming, com a rede), montagem
+#                do DataFrame e esquema de tipos (spans parse e build)
+#     join       junção crm_deal x crm_deal_uf (span merge; apenas BI Connector)
+#     filter     construção do índice de filtros e seleção de cada funil/estágio
+#     aggregate  agregados da página de pendências para cada filtro
+#
+# Cada medida é a mediana de --repeat execuções.
+#
+# Uso:
+#     python -m benchmarks.bench_ingest                      # 1k, 10k, 100k e 1M
+#     python -m benchmarks.bench_ingest --sizes 1000 10000 --compare benchmarks/results/baseline.json
+#     python -m benchmarks.bench_ingest --save benchmarks/results/baseline.json
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from contextlib import contextmanager
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.utils.bitrix_api import load_deals
+from app.utils.portal_registry import configure_portal
+from app.utils.schema import clear_deal_fields_cache
+from app.utils.pendencias import HAS_PENDENCIA_COLUMN, PENDENCIA_TYPE_COLUMN
+from app.utils.filter_index import FilterIndex
+from app.utils.perf import start_trace, finish_trace
+from app.utils.warmup import WARMUP_COLUMNS
+from benchmarks.bitrix_standin import start_standin
+
+DEFAULT_SIZES = [1000, 10000, 100000, 1000000]
+API_TYPES = ["rest", "biconnector"]
+STAGES = ["fetch", "parse", "join", "filter", "aggregate"]
+
+# Aumento relativo de tempo considerado regressão na comparação com a baseline
+REGRESSION_THRESHOLD = 0.25
+
+# Etapas mais rápidas que isso (segundos) não entram na comparação (ruído)
+MIN_COMPARABLE_SECONDS = 0.2
+
+# Execuções por tamanho e tipo de API; vale a mediana de cada etapa
+DEFAULT_REPEAT = 3
+
+# Spans de app/utils/perf somados em cada etapa do benchmark
+PERF_STAGES = {"parse": ["parse", "build"], "join": ["merge"]}
+
+@contextmanager
+def _timed(result, stage):
+    started = time.perf_counter()
+    yield
+    result[stage] = round(time.perf_counter() - started, 4)
+
+def bench_ingest(server, api_type, result):
+    """
+    Mede uma carga fria de load_deals, o mesmo caminho das páginas
+
+    O portal é recriado (snapshots e armazenamentos incrementais vazios) e
+    os metadados de campos são descartados antes da carga. Os tempos de
+    parse e join vêm dos spans de app/utils/perf; o download é o restante
+    do tempo da carga, porque as páginas buscadas em paralelo ficam fora
+    do trace da thread principal.
+    """
+    config = server.config(api_type)
+    # Mede o cliente, não o limite do portal: o escalonador não segura as requisições
+    configure_portal(config["urls"]["crm_deal"], rate=None)
+    clear_deal_fields_cache()
+
+    trace = start_trace(f"bench_ingest:{api_type}")
+    try:
+        data = load_deals(config, WARMUP_COLUMNS)
+    finally:
+        finish_trace()
+
+    self_seconds = {}
+    for entry in trace.breakdown():
+        self_seconds[entry["stage"]] = entry["self_seconds"]
+    for stage, perf_stages in PERF_STAGES.items():
+        measured = [self_seconds[name] for name in perf_stages if name in self_seconds]
+        result[stage] = round(sum(measured), 4) if measured else None
+    result["fetch"] = round(trace.elapsed - (result["parse"] or 0) - (result["join"] or 0), 4)
+    return data
+
+def bench_queries(data, result):
+    with _timed(result, "filter"):
+        index = FilterIndex(data)
+        selections = [index.select(data)]
+        for category in index.category_options:
+            selections.append(index.select(data, category))
+            for stage in index.stage_options.get(category, []):
+                selections.append(index.select(data, category, stage))
+
+    with _timed(result, "aggregate"):
+        for filtered in selections:
+            filtered[HAS_PENDENCIA_COLUMN].sum()
+            filtered[PENDENCIA_TYPE_COLUMN].value_counts()
+            filtered["CATEGORY_ID"].value_counts()
+
+def run(sizes, api_types, latency=0.0, repeat=DEFAULT_REPEAT):
+    """
+    Executa o benchmark para cada tamanho e tipo de API
+
+    Returns:
+        dict: Resultados por tamanho e tipo de API, com a mediana dos tempos
+            por etapa, requisições, bytes e linhas
+    """
+    results = {}
+    for size in sizes:
+        server = start_standin(num_deals=size, latency=latency)
+        try:
+            for api_type in api_types:
+                runs = [_run_once(server, api_type) for _ in range(max(1, repeat))]
+                result = _median(runs)
+                results.setdefault(str(size), {})[api_type] = result
+                _print_row(size, api_type, result)
+        finally:
+            server.stop()
+    return results
+
+def _run_once(server, api_type):
+    """
+    Uma execução completa (carga fria e consultas) para um tipo de API
+    """
+    result = {}
+    before = dict(server.stats)
+    started = time.perf_counter()
+    data = bench_ingest(server, api_type, result)
+    bench_queries(data, result)
+    result["total"] = round(time.perf_counter() - started, 4)
+    result["rows"] = len(data)
+    result["requests"] = server.stats["requests"] - before["requests"]
+    result["bytes"] = server.stats["bytes"] - before["bytes"]
+    return result
+
+def _median(runs):
+    """
+    Mediana de cada etapa entre as execuções (contadores da primeira execução)
+    """
+    result = dict(runs[0])
+    for stage in STAGES + ["total"]:
+        values = [run[stage] for run in runs if run.get(stage) is not None]
+        result[stage] = round(statistics.median(values), 4) if values else None
+    return result
+
+def compare(results, baseline):
+    """
+    Compara os resultados com uma baseline salva
+
+    Returns:
+        list: Regressões (tamanho, API, etapa, tempo da baseline, tempo atual)
+    """
+    regressions = []
+    for size, apis in results.items():
+        for api_type, result in apis.items():
+            reference = baseline.get("results", {}).get(size, {}).get(api_type)
+            if not reference:
+                continue
+            for stage in STAGES + ["total"]:
+                old, new = reference.get(stage), result.get(stage)
+                if old is None or new is None or max(old, new) < MIN_COMPARABLE_SECONDS:
+                    continue
+                if new > old * (1 + REGRESSION_THRESHOLD):
+                    regressions.append((size, api_type, stage, old, new))
+    return regressions
+
+def _print_row(size, api_type, result):
+    stages = "  ".join(
+        f"{stage}={result[stage]:.3f}s" if result.get(stage) is not None else f"{stage}=-"
+        for stage in STAGES
+    )
+    print(f"{size:>8} {api_type:<12} {stages}  total={result['total']:.3f}s  "
+          f"requests={result['requests']}  MB={result['bytes'] / 1e6:.1f}", flush=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da ingestão de negócios com o stand-in do Bitrix24")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--api", choices=API_TYPES, nargs="+", default=API_TYPES)
+    parser.add_argument("--latency", type=float, default=0.0, help="Atraso do stand-in por requisição (s)")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Execuções por medida (vale a mediana)")
+    parser.add_argument("--save", help="Arquivo JSON onde gravar os resultados")
+    parser.add_argument("--compare", help="Baseline JSON para detectar regressões")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.api, latency=args.latency, repeat=args.repeat)
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.save) or ".", exist_ok=True)
+        with open(args.save, "w") as f:
+            json.dump({
+                "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "python": platform.python_version(),
+                "pandas": pd.__version__,
+                "machine": platform.machine(),
+                "latency": args.latency,
+                "repeat": args.repeat,
+                "results": results,
+            }, f, indent=2)
+        print(f"Resultados gravados em {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline)
+        for size, api_type, stage, old, new in regressions:
+            print(f"REGRESSÃO {size} {api_type} {stage}: {old:.3f}s -> {new:.3f}s")
+        if regressions:
+            sys.exit(1)
+        print("Sem regressões em relação à baseline")
+
+if __name__ == "__main__":
+    main()
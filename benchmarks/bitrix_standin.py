@@ -0,0 +1,559 @@
+# Servidor local que imita a API do Bitrix24 (REST e BI Connector) com
+# dados sintéticos, para testar e medir a ingestão sem um portal real.
+#
+# Uso:
+#     python -m benchmarks.bitrix_standin --deals 10000 --port 8765
+#
+# URLs atendidas (TOKEN é qualquer texto):
+#     /rest/TOKEN/crm.deal.list     páginas de 50 negócios (start, select[], filter[...])
+#     /rest/TOKEN/batch             até 50 comandos por chamada
+#     /rest/TOKEN/crm.deal.fields   metadados dos campos
+#     /rest/TOKEN/crm.status.list   estágios dos funis (DEAL_STAGE, DEAL_STAGE_N)
+#     /rest/TOKEN/profile           perfil do usuário (teste de conexão)
+#     /rest/TOKEN/event.bind        cadastra um manipulador de eventos ONCRMDEAL*
+#     /bitrix/tools/biconnector/pbi.php?token=TOKEN&table=crm_deal|crm_deal_uf|b_user
+
+import argparse
+import json
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl, urlencode
+from urllib.request import Request, urlopen
+import pandas as pd
+from app.utils.synthetic import generate_deals, DEFAULT_SEED, STAGE_WEIGHTS, DEAL_COLUMNS, UF_COLUMNS
+from app.utils.deal_join import DealUfJoin
+
+PAGE_SIZE = 50
+BATCH_LIMIT = 50
+
+# Fuso dos portais brasileiros; as datas sintéticas estão no horário local do portal
+PORTAL_TZ = timezone(timedelta(hours=-3))
+REST_DATE_FORMAT = "%Y-%m-%dT%H:%M:%S-03:00"
+BI_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Linhas formatadas por vez ao enviar uma tabela do BI Connector
+TABLE_CHUNK_ROWS = 20000
+
+DEAL_FIELDS = {
+    "ID": {"type": "integer", "isMultiple": False},
+    "TITLE": {"type": "string", "isMultiple": False},
+    "CATEGORY_ID": {"type": "crm_category", "isMultiple": False},
+    "STAGE_ID": {"type": "crm_status", "isMultiple": False},
+    "DATE_CREATE": {"type": "datetime", "isMultiple": False},
+    "DATE_MODIFY": {"type": "datetime", "isMultiple": False},
+    "UF_CRM_PENDENCIAS": {"type": "string", "isMultiple": False},
+    "UF_CRM_DATA_MARCADA": {"type": "datetime", "isMultiple": False},
+}
+
+# Estágios dos funis no formato de crm.status.list (o funil 0 usa ENTITY_ID DEAL_STAGE)
+DEAL_STATUSES = [
+    {"ENTITY_ID": "DEAL_STAGE" if category == 0 else f"DEAL_STAGE_{category}",
+     "STATUS_ID": stage, "NAME": stage, "SORT": str((position + 1) * 10), "CATEGORY_ID": str(category)}
+    for category, stages in STAGE_WEIGHTS.items()
+    for position, stage in enumerate(stages)
+]
+
+class StandinPortal:
+    """
+    Portal sintético: negócios e campos personalizados de app.utils.synthetic
+
+    Os dados ficam com tipos nativos; os textos enviados pela API (IDs,
+    datas) são formatados só na hora de responder, bloco a bloco.
+    """
+
+    def __init__(self, num_deals, seed=DEFAULT_SEED, now=None):
+        # Início do dia no fuso do portal, para que as alterações feitas
+        # depois tenham DATE_MODIFY maior que o de todos os dados gerados
+        if now is None:
+            now = pd.Timestamp.now(tz=PORTAL_TZ).tz_localize(None).normalize()
+        deals, uf = generate_deals(num_deals, seed=seed, now=now)
+        self.deals = DealUfJoin().build(deals, uf)
+        self._filtered = {}
+        self._lock = threading.Lock()
+
+    # Alterações usadas em testes (ex: eventos de webhook)
+
+    def update_deal(self, deal_id, title=None, stage_id=None, pendencia=None):
+        """
+        Altera (ou cria) um negócio e atualiza seu DATE_MODIFY
+
+        Returns:
+            bool: True se o negócio foi criado
+        """
+        now = pd.Timestamp.now(tz=PORTAL_TZ).tz_localize(None).floor("s")
+        with self._lock:
+            deals = self.deals
+            created = not (deals["ID"] == deal_id).any()
+            if created:
+                category = list(STAGE_WEIGHTS)[-1]
+                new = deals.iloc[:1].copy()
+                new["ID"] = deal_id
+                new["TITLE"] = f"Negócio {deal_id}"
+                new["CATEGORY_ID"] = category
+                new["STAGE_ID"] = list(STAGE_WEIGHTS[category])[0]
+                new["DATE_CREATE"] = now
+                new["UF_CRM_PENDENCIAS"] = ""
+                new["UF_CRM_DATA_MARCADA"] = pd.NaT
+                deals = pd.concat([deals, new], ignore_index=True)
+            else:
+                deals = deals.copy()
+            row = deals["ID"] == deal_id
+            if title is not None:
+                deals.loc[row, "TITLE"] = title
+            if stage_id is not None:
+                deals.loc[row, "STAGE_ID"] = stage_id
+            if pendencia is not None:
+                deals.loc[row, "UF_CRM_PENDENCIAS"] = pendencia
+            deals.loc[row, "DATE_MODIFY"] = now
+            self.deals = deals
+            self._filtered = {}
+        return created
+
+    def delete_deal(self, deal_id):
+        """
+        Remove um negócio
+        """
+        with self._lock:
+            self.deals = self.deals[self.deals["ID"] != deal_id].reset_index(drop=True)
+            self._filtered = {}
+
+    # Consultas
+
+    def select_deals(self, filters):
+        """
+        Retorna as linhas que atendem aos filtros no formato filter[...] do Bitrix24
+
+        Args:
+            filters (dict): Campo (com operador opcional) -> valor ou lista
+
+        Returns:
+            pandas.DataFrame: Negócios filtrados, ordenados por ID
+        """
+        # Cada página repete o mesmo filtro; o resultado é guardado até a próxima alteração
+        key = tuple(sorted((k, tuple(v) if isinstance(v, list) else v) for k, v in filters.items()))
+        filtered = self._filtered
+        if key not in filtered:
+            if len(filtered) >= 32:
+                filtered.clear()
+            filtered[key] = self._filter(self.deals, filters)
+        return filtered[key]
+
+    def _filter(self, deals, filters):
+        mask = pd.Series(True, index=deals.index)
+        for key, value in filters.items():
+            op, field = re.match(r"^([<>=!@]*)(.+)$", key).groups()
+            if field not in deals.columns:
+                continue
+            values = value if isinstance(value, list) else [value]
+            column = deals[field]
+            if field in ("ID", "CATEGORY_ID"):
+                column = column.astype("int64")
+                targets = [int(v) for v in values]
+            elif pd.api.types.is_datetime64_any_dtype(column.dtype):
+                targets = [_parse_date(v) for v in values]
+            else:
+                column = column.astype(object)
+                targets = values
+
+            if op == ">=":
+                mask &= column >= targets[0]
+            elif op == ">":
+                mask &= column > targets[0]
+            elif op == "<=":
+                mask &= column <= targets[0]
+            elif op == "<":
+                mask &= column < targets[0]
+            elif op in ("!", "!="):
+                mask &= ~column.isin(targets)
+            else:
+                mask &= column.isin(targets)
+        return deals[mask].sort_values("ID")
+
+    def rest_records(self, deals, select):
+        """
+        Formata negócios como registros da REST API (tudo texto)
+        """
+        columns = select or DEAL_COLUMNS
+        if "*" in columns:
+            columns = DEAL_COLUMNS + [c for c in columns if c != "*"]
+        columns = [c for c in dict.fromkeys(columns) if c in deals.columns]
+        # Uma página tem só 50 linhas: formatar valor a valor sai mais barato que por coluna
+        rows = deals[columns].astype(object).values.tolist()
+        return [{c: _text(v, REST_DATE_FORMAT) for c, v in zip(columns, row)} for row in rows]
+
+    def table_chunks(self, table, chunk_rows=TABLE_CHUNK_ROWS):
+        """
+        Gera as linhas de uma tabela do BI Connector em blocos (o primeiro
+        bloco é o cabeçalho)
+        """
+        deals = self.deals
+        if table == "crm_deal":
+            data = deals[DEAL_COLUMNS]
+        elif table == "crm_deal_uf":
+            data = deals[["ID"] + UF_COLUMNS[1:]].rename(columns={"ID": "DEAL_ID"})
+        elif table == "b_user":
+            data = pd.DataFrame({"ID": ["1"], "NAME": ["Admin"], "LAST_NAME": ["Standin"]})
+        else:
+            raise KeyError(table)
+
+        yield [list(data.columns)]
+        for start in range(0, len(data), chunk_rows):
+            yield _format(data.iloc[start:start + chunk_rows], BI_DATE_FORMAT).values.tolist()
+
+def _text(value, date_format):
+    """
+    Converte um valor em texto, como a API envia (nulos viram "")
+    """
+    if value is None or value is pd.NA or value is pd.NaT:
+        return ""
+    if isinstance(value, pd.Timestamp):
+        return value.strftime(date_format)
+    return str(value)
+
+def _format(frame, date_format):
+    """
+    Converte as colunas em texto, como a API envia (nulos viram "")
+    """
+    formatted = {}
+    for column in frame.columns:
+        values = frame[column]
+        if pd.api.types.is_datetime64_any_dtype(values.dtype):
+            formatted[column] = values.dt.strftime(date_format).fillna("")
+        else:
+            formatted[column] = values.astype("string").fillna("").astype(object)
+    return pd.DataFrame(formatted, index=frame.index)
+
+class RateLimiter:
+    """
+    Balde furado no estilo do Bitrix24: burst requisições imediatas e
+    depois rate por segundo; acima disso responde QUERY_LIMIT_EXCEEDED
+    """
+
+    def __init__(self, rate=None, burst=50):
+        self.rate = rate
+        self.burst = burst
+        self.level = 0.0
+        self.updated = time.monotonic()
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        if not self.rate:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self.level = max(0.0, self.level - (now - self.updated) * self.rate)
+            self.updated = now
+            if self.level + 1 > self.burst:
+                self.rejected += 1
+                return False
+            self.level += 1
+            return True
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        # Sem log por requisição (atrapalharia os benchmarks)
+        pass
+
+    def do_GET(self):
+        self._handle(parse_qsl(urlsplit(self.path).query, keep_blank_values=True))
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length).decode() if length else ""
+        params = parse_qsl(urlsplit(self.path).query, keep_blank_values=True)
+        if "json" in self.headers.get("Content-Type", "") and body:
+            params += _flatten_json(json.loads(body))
+        else:
+            params += parse_qsl(body, keep_blank_values=True)
+        self._handle(params)
+
+    def _handle(self, params):
+        server = self.server
+        server.stats["requests"] += 1
+        if server.latency:
+            time.sleep(server.latency)
+        if not server.limiter.allow():
+            self._send_json({"error": "QUERY_LIMIT_EXCEEDED", "error_description": "Too many requests"}, 503)
+            return
+
+        path = urlsplit(self.path).path
+        rest = re.match(r"^/rest/(.+)/([a-z.]+)/?$", path)
+        try:
+            if rest:
+                self._send_json(server.call(rest.group(2), params))
+            elif path.endswith("/bitrix/tools/biconnector/pbi.php"):
+                self._send_table(dict(params).get("table", ""))
+            else:
+                self._send_json({"error": "NOT_FOUND"}, 404)
+        except KeyError as e:
+            self._send_json({"error": "ERROR_METHOD_NOT_FOUND", "error_description": str(e)}, 404)
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload, ensure_ascii=False).encode()
+        self.server.stats["bytes"] += len(body)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_table(self, table):
+        chunks = self.server.portal.table_chunks(table)
+        header = next(chunks)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        # Envia a tabela em blocos, como um download grande de verdade
+        self._write_chunk(b"[" + json.dumps(header[0], ensure_ascii=False).encode())
+        for rows in chunks:
+            # Cada bloco é um array JSON sem os colchetes externos
+            self._write_chunk(b"," + json.dumps(rows, ensure_ascii=False)[1:-1].encode())
+        self._write_chunk(b"]")
+        self._write_chunk(b"")
+
+    def _write_chunk(self, data):
+        self.server.stats["bytes"] += len(data)
+        self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+
+class StandinServer(ThreadingHTTPServer):
+    """
+    Servidor HTTP do stand-in, com o portal sintético e as métricas
+    """
+
+    daemon_threads = True
+
+    def __init__(self, portal, host="127.0.0.1", port=0, latency=0.0, rate=None, burst=50):
+        super().__init__((host, port), StandinHandler)
+        self.portal = portal
+        self.latency = latency
+        self.limiter = RateLimiter(rate, burst)
+        self.stats = {"requests": 0, "bytes": 0}
+        self.handlers = {}
+        self.application_token = "standin-app"
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def config(self, api_type="rest", token="standin"):
+        """
+        Configuração de conexão (no formato de load_connection_config) apontando para o stand-in
+        """
+        if api_type == "rest":
+            base_url = f"{self.url}/rest/1/{token}"
+            urls = {
+                "crm_deal": f"{base_url}/crm.deal.list",
+                "crm_deal_fields": f"{base_url}/crm.deal.fields",
+                "crm_status": f"{base_url}/crm.status.list",
+            }
+        else:
+            base_url = f"{self.url}/bitrix/tools/biconnector/pbi.php?token={token}"
+            urls = {
+                "crm_deal": f"{base_url}&table=crm_deal",
+                "crm_deal_uf": f"{base_url}&table=crm_deal_uf",
+            }
+        return {"account_name": "standin", "token": token, "api_type": api_type, "urls": urls}
+
+    # Alterações que disparam eventos de saída (como um usuário no Bitrix24)
+
+    def update_deal(self, deal_id, **changes):
+        """
+        Altera (ou cria) um negócio e envia ONCRMDEALUPDATE (ou ONCRMDEALADD)
+        """
+        created = self.portal.update_deal(deal_id, **changes)
+        self.emit("ONCRMDEALADD" if created else "ONCRMDEALUPDATE", deal_id)
+
+    def delete_deal(self, deal_id):
+        """
+        Remove um negócio e envia ONCRMDEALDELETE
+        """
+        self.portal.delete_deal(deal_id)
+        self.emit("ONCRMDEALDELETE", deal_id)
+
+    def emit(self, event, deal_id):
+        """
+        Envia um evento de saída para os manipuladores cadastrados com event.bind
+        """
+        body = urlencode({
+            "event": event,
+            "data[FIELDS][ID]": deal_id,
+            "ts": int(time.time()),
+            "auth[domain]": self.server_address[0],
+            "auth[application_token]": self.application_token,
+        }).encode()
+        for handler in self.handlers.get(event, []):
+            threading.Thread(target=_post_event, args=(handler, body), daemon=True).start()
+
+    def handle_error(self, request, client_address):
+        # Clientes que fecham a conexão keep-alive não são erro do stand-in
+        if isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            return
+        super().handle_error(request, client_address)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="bitrix-standin", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    # Métodos da REST API
+
+    def call(self, method, params):
+        if method == "batch":
+            return self._batch(params)
+        if method == "crm.deal.list":
+            return self._deal_list(params)
+        if method == "crm.deal.fields":
+            return {"result": DEAL_FIELDS}
+        if method == "crm.status.list":
+            start = int(dict(params).get("start", 0))
+            total = len(DEAL_STATUSES)
+            payload = {"result": DEAL_STATUSES[start:start + PAGE_SIZE], "total": total}
+            if start + PAGE_SIZE < total:
+                payload["next"] = start + PAGE_SIZE
+            return payload
+        if method == "profile":
+            return {"result": {"ID": "1", "ADMIN": True, "NAME": "Admin", "LAST_NAME": "Standin"}}
+        if method == "event.bind":
+            fields = dict(params)
+            self.handlers.setdefault(fields["event"].upper(), []).append(fields["handler"])
+            return {"result": True}
+        if method == "server.time":
+            return {"result": datetime.now(PORTAL_TZ).isoformat(timespec="seconds")}
+        raise KeyError(method)
+
+    def _deal_list(self, params):
+        start = 0
+        select = []
+        filters = {}
+        for key, value in params:
+            if key == "start":
+                start = int(value)
+            elif key.startswith("select["):
+                select.append(value)
+            elif key.startswith("filter["):
+                # filter[CAMPO]=v ou filter[CAMPO][n]=v (lista)
+                field = re.match(r"^filter\[([^\]]+)\]", key).group(1)
+                if key.endswith("]") and key.count("[") > 1:
+                    filters.setdefault(field, [])
+                    if isinstance(filters[field], list):
+                        filters[field].append(value)
+                else:
+                    filters[field] = value
+
+        deals = self.portal.select_deals(filters)
+        total = len(deals)
+        page = deals.iloc[start:start + PAGE_SIZE]
+        payload = {"result": self.portal.rest_records(page, select), "total": total}
+        if start + PAGE_SIZE < total:
+            payload["next"] = start + PAGE_SIZE
+        return payload
+
+    def _batch(self, params):
+        commands = [(re.match(r"^cmd\[(.+)\]$", key).group(1), value) for key, value in params if key.startswith("cmd[")]
+        if len(commands) > BATCH_LIMIT:
+            return {"error": "MAX_BATCH_LENGTH_EXCEEDED"}
+        result, errors, totals, nexts = {}, {}, {}, {}
+        for name, command in commands:
+            method, _, query = command.partition("?")
+            try:
+                payload = self.call(method, parse_qsl(query, keep_blank_values=True))
+            except KeyError as e:
+                errors[name] = {"error": "ERROR_METHOD_NOT_FOUND", "error_description": str(e)}
+                continue
+            result[name] = payload.get("result")
+            if "total" in payload:
+                totals[name] = payload["total"]
+            if "next" in payload:
+                nexts[name] = payload["next"]
+        return {"result": {"result": result, "result_error": errors or [],
+                           "result_total": totals, "result_next": nexts, "result_time": {}}}
+
+def _post_event(handler, body):
+    try:
+        request = Request(handler, data=body, headers={"Content-Type": "application/x-www-form-urlencoded"})
+        urlopen(request, timeout=5).close()
+    except OSError:
+        # Como no Bitrix24, um manipulador fora do ar apenas perde o evento
+        pass
+
+def _flatten_json(payload, prefix=""):
+    """
+    Converte um corpo JSON em pares no formato de query string (a[b][]=c)
+    """
+    pairs = []
+    if isinstance(payload, dict):
+        for key, value in payload.items():
+            pairs += _flatten_json(value, f"{prefix}[{key}]" if prefix else str(key))
+    elif isinstance(payload, list):
+        for index, value in enumerate(payload):
+            pairs += _flatten_json(value, f"{prefix}[{index}]")
+    else:
+        pairs.append((prefix, str(payload)))
+    return pairs
+
+def _parse_date(value):
+    """
+    Converte a data de um filtro no horário local do portal, sem fuso
+    """
+    parsed = pd.Timestamp(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.tz_convert(PORTAL_TZ).tz_localize(None)
+    return parsed
+
+def start_standin(num_deals=1000, seed=DEFAULT_SEED, port=0, latency=0.0, rate=None, burst=50):
+    """
+    Cria e inicia um stand-in em uma thread
+
+    Args:
+        num_deals (int): Número de negócios sintéticos
+        seed (int): Semente dos dados
+        port (int): Porta (0 para escolher uma livre)
+        latency (float): Atraso artificial por requisição, em segundos
+        rate (float): Requisições por segundo permitidas (None sem limite)
+        burst (int): Requisições permitidas de uma vez antes do limite
+
+    Returns:
+        StandinServer: Servidor em execução (use .config() e .stop())
+    """
+    portal = StandinPortal(num_deals, seed=seed)
+    return StandinServer(portal, port=port, latency=latency, rate=rate, burst=burst).start()
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in local da API do Bitrix24")
+    parser.add_argument("--deals", type=int, default=10000, help="Número de negócios sintéticos")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Atraso por requisição (s)")
+    parser.add_argument("--rate", type=float, default=None, help="Limite de requisições por segundo")
+    parser.add_argument("--burst", type=int, default=50)
+    args = parser.parse_args()
+
+    server = StandinServer(StandinPortal(args.deals, seed=args.seed), port=args.port,
+                           latency=args.latency, rate=args.rate, burst=args.burst)
+    print(f"Stand-in do Bitrix24 em {server.url} ({args.deals} negócios)")
+    print(f"REST:         {server.config('rest')['urls']['crm_deal']}")
+    print(f"BI Connector: {server.config('biconnector')['urls']['crm_deal']}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
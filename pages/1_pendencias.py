@@ -10,26 +10,47 @@ import sys
 
 # Adicionar o diretório raiz ao path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from app.utils.bitrix_api import get_bitrix_data, load_connection_config, is_streamlit_cloud
+from app.utils.bitrix_api import get_deal_slice, get_deal_filter_options, get_fetch_stats, load_connection_config, is_streamlit_cloud, account_portal
+from app.utils.pendencias import add_pendencia_columns, pendencia_mask, HAS_PENDENCIA_COLUMN, PENDENCIA_TYPE_COLUMN
+from app.utils.filter_index import FilterIndex, get_filter_index, ALL_OPTION
+from app.utils.synthetic import simulated_deals
+from app.utils.query_cache import query_key, cached_query
+from app.components.snapshot_status import show_snapshot_status
+from app.components.data_table import show_data_table
+from app.components.perf_panel import show_perf_panel
+from app.utils.perf import start_trace, finish_trace, span
+
+# Medição das etapas deste rerun (exibida no modo de depuração)
+start_trace("pendencias")
 
 # Título da página
 st.title("Pendências")
 st.write("Visualização de pendências e datas marcadas do Bitrix24")
 
-# Função para gerar dados simulados
-def generate_simulated_data(num_rows=100):
-    df = pd.DataFrame({
-        'ID': [str(i) for i in range(1, num_rows + 1)],
-        'TITLE': [f"Negócio {i}" for i in range(1, num_rows + 1)],
-        'CATEGORY_ID': [str(x) for x in np.random.choice([0, 2], size=num_rows)],
-        'STAGE_ID': np.random.choice(['C2:PREPARATION', 'C2:NEW', 'C0:NEW'], size=num_rows),
-        'UF_CRM_PENDENCIAS': np.random.choice(["", "Pendência documento", "Pendência pagamento", "Pendência contrato", "Pendência assinatura"], size=num_rows, p=[0.5, 0.15, 0.15, 0.1, 0.1]),
-        'UF_CRM_DATA_MARCADA': np.random.choice(["", "2023-05-10 10:00", "2023-05-15 14:30", "2023-05-20 09:15"], size=num_rows, p=[0.7, 0.1, 0.1, 0.1])
-    })
-    return df
+# Colunas usadas pela página (projeção enviada à API)
+PAGE_COLUMNS = ['ID', 'TITLE', 'CATEGORY_ID', 'STAGE_ID', 'UF_CRM_PENDENCIAS', 'UF_CRM_DATA_MARCADA']
+
+# Chaves dos filtros na sessão; o valor escolhido já está lá no início do
+# rerun, antes de os dados serem carregados
+CATEGORY_KEY = "pendencias_categoria"
+STAGE_KEY = "pendencias_estagio"
+
+# Número de negócios simulados (gerados com semente fixa por app.utils.synthetic)
+SIMULATED_DEALS = 1000
+
+# Função para gerar dados simulados (gerados uma vez por número de linhas)
+@st.cache_data
+def generate_simulated_data(num_rows=SIMULATED_DEALS):
+    return simulated_deals(num_rows)[PAGE_COLUMNS + [HAS_PENDENCIA_COLUMN, PENDENCIA_TYPE_COLUMN]]
+
+# Índice de filtros dos dados simulados; as linhas vêm sempre na mesma ordem
+@st.cache_resource
+def simulated_filter_index(num_rows=SIMULATED_DEALS):
+    return FilterIndex(generate_simulated_data(num_rows))
 
 # Carregar configuração usando a função importada
 config = load_connection_config()
+snapshot = None
 
 # Inicializar variáveis de depuração
 debug_mode = False  # Desativar depuração por padrão
@@ -45,112 +66,146 @@ with st.sidebar:
 if not config:
     st.error("Configuração não encontrada. Configure a conexão na página principal.")
     # Mostrar dados simulados mesmo sem configuração
-    data = generate_simulated_data(50)
+    data = generate_simulated_data()
     st.info("Exibindo dados simulados para visualização")
     is_simulated = True
 else:
     # Carregar os dados
     if use_simulated_data:
-        data = generate_simulated_data(100)
+        data = generate_simulated_data()
         is_simulated = True
     else:
         try:
             with st.spinner("Carregando dados do Bitrix24..."):
-                # Carregar dados do CRM Deal
-                crm_deal_url = config["urls"]["crm_deal"]
-                data = get_bitrix_data(crm_deal_url)
+                # Snapshot compartilhado entre sessões; se estiver vencido, é
+                # devolvido na hora e atualizado em segundo plano. Com um
+                # funil selecionado, só ele é buscado no Bitrix24
+                selected_category = st.session_state.get(CATEGORY_KEY, ALL_OPTION)
+                selected_stage = st.session_state.get(STAGE_KEY, ALL_OPTION) if selected_category == 2 else ALL_OPTION
+                snapshot = get_deal_slice(config, PAGE_COLUMNS, selected_category, selected_stage)
+                data = snapshot.data if snapshot is not None else None
                 
-                if data is None or data.empty:
+                # Um funil/estágio sem negócios é um resultado válido
+                if data is None or (data.empty and selected_category == ALL_OPTION):
                     st.error("Não foi possível obter dados do CRM Deal")
-                    data = generate_simulated_data(50)
+                    data = generate_simulated_data()
                     is_simulated = True
                 else:
                     is_simulated = False
+                    show_snapshot_status(snapshot)
                     
                     # Adicionar colunas simuladas para pendências e data marcada
+                    # assign cria um novo DataFrame, sem alterar o snapshot compartilhado
                     if not 'UF_CRM_PENDENCIAS' in data.columns:
-                        data['UF_CRM_PENDENCIAS'] = ""
+                        data = data.assign(UF_CRM_PENDENCIAS="")
                         if debug_mode:
                             st.warning("A coluna UF_CRM_PENDENCIAS não está disponível nos dados. Usando coluna vazia.")
                     
                     if not 'UF_CRM_DATA_MARCADA' in data.columns:
-                        data['UF_CRM_DATA_MARCADA'] = ""
+                        data = data.assign(UF_CRM_DATA_MARCADA="")
                         if debug_mode:
                             st.warning("A coluna UF_CRM_DATA_MARCADA não está disponível nos dados. Usando coluna vazia.")
+                    
+                    # Colunas derivadas ausentes quando o campo veio vazio acima
+                    if HAS_PENDENCIA_COLUMN not in data.columns:
+                        data = add_pendencia_columns(data)
         except Exception as e:
             if debug_mode:
                 st.error(f"Erro ao carregar dados: {str(e)}")
                 st.error(traceback.format_exc())
-            data = generate_simulated_data(50)
+            data = generate_simulated_data()
             is_simulated = True
 
 # Verificar se data existe e não está vazio
-if data is not None and not data.empty:
+if data is not None and (not data.empty or snapshot is not None):
     # FILTRO DE FUNIL (CATEGORY_ID)
     st.write("### Filtro de Funil")
     
     # Configurar colunas para filtros
     filter_col1, filter_col2 = st.columns(2)
     
+    # Opções e posições de cada funil/estágio, pré-calculadas por snapshot
+    # (dados simulados ou completados na página não têm snapshot)
+    from_snapshot = snapshot is not None and data is snapshot.data
+    with span("filter"):
+        if from_snapshot:
+            filter_index = get_filter_index(snapshot)
+        elif is_simulated:
+            filter_index = simulated_filter_index()
+        else:
+            filter_index = FilterIndex(data)
+    
+    # Opções de todos os funis, mesmo quando o snapshot traz só o selecionado
+    if snapshot is not None and not is_simulated:
+        filter_options = get_deal_filter_options(config, PAGE_COLUMNS)
+    else:
+        filter_options = filter_index.options()
+    
     with filter_col1:
         # Filtro de categoria
         category_options = ["Todos"]
-        if 'CATEGORY_ID' in data.columns:
-            category_values = data['CATEGORY_ID'].dropna().unique()
-            category_options.extend(sorted([str(v) for v in category_values if pd.notna(v) and str(v).strip() != ""]))
+        category_options.extend(filter_options)
         
         selected_category = st.selectbox(
             "Categoria",
             options=category_options,
-            format_func=lambda x: "COMERCIAL" if x == "0" else "TRÂMITES ADMINISTRATIVO" if x == "2" else str(x)
+            format_func=lambda x: "COMERCIAL" if x == 0 else "TRÂMITES ADMINISTRATIVO" if x == 2 else str(x),
+            key=CATEGORY_KEY
         )
     
     with filter_col2:
         # Filtro de estágio
-        if selected_category == "2" and 'STAGE_ID' in data.columns:
+        if selected_category == 2 and 'STAGE_ID' in data.columns:
             stage_options = ["Todos"]
-            
-            # Filtrar por categoria
-            data_cat = data[data['CATEGORY_ID'].astype(str) == "2"]
-            stage_values = data_cat['STAGE_ID'].dropna().unique()
-            stage_options.extend(sorted([str(v) for v in stage_values if pd.notna(v) and str(v).strip() != ""]))
+            stage_options.extend(filter_options.get(2, []))
             
             selected_stage = st.selectbox(
                 "Estágio",
                 options=stage_options,
-                format_func=lambda x: "PENDENTE DOCUMENTOS" if x == "C2:PREPARATION" else str(x)
+                format_func=lambda x: "PENDENTE DOCUMENTOS" if x == "C2:PREPARATION" else str(x),
+                key=STAGE_KEY
             )
         else:
             selected_stage = "Todos"
     
-    # Aplicar filtros
-    filtered_data = data.copy()
+    # Aplicar filtros pelo índice (o snapshot é compartilhado e não é alterado)
+    with span("filter") as info:
+        filtered_data = filter_index.select(data, selected_category, selected_stage)
+        info["rows"] = len(filtered_data)
     
-    if selected_category != "Todos" and 'CATEGORY_ID' in filtered_data.columns:
-        # Converter para string para comparação
-        filtered_data['CATEGORY_ID'] = filtered_data['CATEGORY_ID'].astype(str)
-        filtered_data = filtered_data[filtered_data['CATEGORY_ID'] == selected_category]
-    
-    if selected_stage != "Todos" and selected_category == "2" and 'STAGE_ID' in filtered_data.columns:
-        filtered_data = filtered_data[filtered_data['STAGE_ID'] == selected_stage]
+    # Agregados calculados uma vez por (versão do snapshot, filtros); os dados
+    # simulados nunca mudam e usam uma chave própria
+    if from_snapshot:
+        cache_key = query_key(snapshot, selected_category, selected_stage)
+    elif is_simulated:
+        cache_key = (f"simulados:{SIMULATED_DEALS}", selected_category, selected_stage)
+    else:
+        cache_key = None
     
     # Exibir contagem total de pendências
     st.markdown("---")
     
     # Indicador grande de total de pendências
-    pendencias_count = 0
-    if 'UF_CRM_PENDENCIAS' in filtered_data.columns:
-        pendencias_count = filtered_data['UF_CRM_PENDENCIAS'].astype(str).apply(lambda x: x.strip() != "").sum()
+    # Máscara vetorizada, pré-calculada na carga do snapshot
+    with span("aggregate", rows=len(filtered_data)):
+        has_pendencia = pendencia_mask(filtered_data)
+        pendencias_count = cached_query(cache_key, "pendencias_count", lambda: int(has_pendencia.sum()))
     
-    st.metric("Total de Pendências", pendencias_count)
+    with span("render"):
+        st.metric("Total de Pendências", pendencias_count)
     
     # Exibir tipos de pendências
     st.markdown("---")
     st.write("### Tipos de Pendências")
     
     if 'UF_CRM_PENDENCIAS' in filtered_data.columns:
-        # Obter tipos únicos de pendências
-        tipos_pendencias = filtered_data[filtered_data['UF_CRM_PENDENCIAS'].astype(str).apply(lambda x: x.strip() != "")]['UF_CRM_PENDENCIAS'].value_counts()
+        # Obter tipos únicos de pendências (categórico normalizado na carga)
+        def count_tipos_pendencias():
+            tipos = filtered_data.loc[has_pendencia, PENDENCIA_TYPE_COLUMN].value_counts()
+            return tipos[tipos > 0]
+        
+        with span("aggregate", rows=len(filtered_data)):
+            tipos_pendencias = cached_query(cache_key, "tipos_pendencias", count_tipos_pendencias)
         
         if not tipos_pendencias.empty:
             # Criar dataframe para exibição
@@ -158,7 +213,8 @@ if data is not None and not data.empty:
                 'Tipo de Pendência': tipos_pendencias.index,
                 'Quantidade': tipos_pendencias.values
             })
-            st.dataframe(tipos_df, use_container_width=True)
+            with span("render", rows=len(tipos_df)):
+                st.dataframe(tipos_df, use_container_width=True)
         else:
             st.info("Não foram encontradas pendências.")
     
@@ -167,7 +223,9 @@ if data is not None and not data.empty:
     st.write("### Pendências Detalhadas")
     
     # Filtrar apenas registros com pendências
-    pendencias_df = filtered_data[filtered_data['UF_CRM_PENDENCIAS'].astype(str).apply(lambda x: x.strip() != "")].copy()
+    with span("filter") as info:
+        pendencias_df = filtered_data[has_pendencia]
+        info["rows"] = len(pendencias_df)
     
     if not pendencias_df.empty:
         # Selecionar apenas as colunas ID, Pendência e Data Marcada
@@ -190,7 +248,6 @@ if data is not None and not data.empty:
             display_cols.append('UF_CRM_DATA_MARCADA')
             
         # Renomear colunas para melhor legibilidade
-        pendencias_display = pendencias_df[display_cols].copy()
         column_names = {
             'ID': 'ID',
             'TITLE': 'Título',
@@ -198,16 +255,22 @@ if data is not None and not data.empty:
             'UF_CRM_PENDENCIAS': 'Pendência',
             'UF_CRM_DATA_MARCADA': 'Hora Marcada'
         }
-        pendencias_display = pendencias_display.rename(columns={col: column_names.get(col, col) for col in display_cols})
         
-        # Exibir a tabela com as pendências
-        st.dataframe(pendencias_display, use_container_width=True)
+        # Exibir a tabela com as pendências (só a página visível é enviada ao navegador)
+        show_data_table(pendencias_df, "pendencias_detalhe", columns=display_cols,
+                        column_labels=column_names, cache_key=cache_key)
     else:
         st.info("Não foram encontradas pendências nesta seleção.")
         
     # Mostrar aviso se estiver usando dados simulados
     if is_simulated:
         st.sidebar.warning("⚠️ Os dados exibidos são simulados e não refletem informações reais do Bitrix24")
+    
+    # Buscas ao Bitrix24 economizadas pela deduplicação entre sessões
+    if debug_mode:
+        fetch_stats = get_fetch_stats()
+        st.sidebar.write(f"Buscas ao Bitrix24: {fetch_stats['executions']} "
+                         f"(economizadas: {fetch_stats['shared']}, em andamento: {fetch_stats['in_flight']})")
         
 else:
     st.warning("Não foi possível carregar dados. Verifique a conexão com o Bitrix24.")
@@ -216,4 +279,9 @@ else:
     if st.button("Ir para configuração"):
         if os.path.exists("app/data/connection_config.json"):
             os.remove("app/data/connection_config.json")
-            st.rerun() 
\ No newline at end of file
+            st.rerun()
+
+# Tempo de cada etapa deste rerun (também gravado no log de desempenho)
+perf_trace = finish_trace()
+if debug_mode:
+    show_perf_panel(perf_trace, account_portal(config) if config and "urls" in config else None)